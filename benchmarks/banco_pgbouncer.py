@@ -0,0 +1,75 @@
+"""
+Benchmark do AsyncpgManager conectado direto ao Postgres e através do PgBouncer
+em transaction pooling.
+
+Executa consultas de cobrança por id com concorrência fixa e mede consultas por
+segundo em cada modo, além dos backends do Postgres ocupados ao final. Precisa de
+um banco com as migrações aplicadas; o modo PgBouncer só roda com ``--pgbouncer``.
+
+    python -m benchmarks.banco_pgbouncer --direto postgresql://u:s@localhost:5432/db \\
+        --pgbouncer postgresql://u:s@localhost:6432/db --consultas 20000 --concorrencia 50
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("MP_ACCESS_TOKEN", "BENCHMARK")
+
+import asyncpg
+
+from functions.database.asyncpg_manager import AsyncpgManager
+
+
+async def contar_backends(dsn_direto: str) -> int:
+    connection = await asyncpg.connect(dsn=dsn_direto)
+    try:
+        return await connection.fetchval("SELECT count(*) FROM pg_stat_activity WHERE datname = current_database();")
+    finally:
+        await connection.close()
+
+
+async def medir(manager: AsyncpgManager, dsn_direto: str, consultas: int, concorrencia: int) -> tuple[float, int]:
+    await manager.connect()
+    ids = iter(range(1, consultas + 1))
+
+    async def cliente():
+        for cobranca_id in ids:
+            resultado = await manager.get_cobranca_by_id(cobranca_id)
+            assert "Erro" not in resultado.get("mensagem", ""), resultado
+
+    try:
+        inicio = time.perf_counter()
+        await asyncio.gather(*(cliente() for _ in range(concorrencia)))
+        decorrido = time.perf_counter() - inicio
+
+        backends = await contar_backends(dsn_direto)
+    finally:
+        await manager.disconnect()
+
+    return consultas / decorrido, backends
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--direto", required=True, help="DSN do Postgres")
+    parser.add_argument("--pgbouncer", help="DSN do PgBouncer em transaction pooling")
+    parser.add_argument("--consultas", type=int, default=20000)
+    parser.add_argument("--concorrencia", type=int, default=50)
+    args = parser.parse_args()
+
+    modos = [
+        ("direto, statements preparados", AsyncpgManager(dsn=args.direto)),
+        ("direto, modo PgBouncer", AsyncpgManager(dsn=args.direto, pgbouncer=True)),
+    ]
+    if args.pgbouncer:
+        modos.append(("via PgBouncer", AsyncpgManager(dsn=args.pgbouncer, pgbouncer=True)))
+
+    print(f"consultas: {args.consultas}  concorrência: {args.concorrencia}")
+    for nome, manager in modos:
+        taxa, backends = await medir(manager, args.direto, args.consultas, args.concorrencia)
+        print(f"{nome:32s} {taxa:10.1f} consultas/s  backends no Postgres: {backends}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,151 @@
+"""
+Benchmark do envio de emails: envio unitário (uma sessão SMTP por email, como o
+FastMail faz) contra o envio em lote pelo pool de sessões.
+
+Sobe um servidor SMTP local com aiosmtpd, que só descarta as mensagens, e mede
+mensagens por segundo de cada caminho. Com ``--limites`` também sobe um servidor
+por limite e mede o lote distribuído entre eles, que deve se aproximar da soma
+dos limites.
+
+    pip install -r requirements-test.txt
+    python -m benchmarks.email_lote --mensagens 500 --latencia 0.002
+    python -m benchmarks.email_lote --mensagens 300 --limites 50,30
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("MP_ACCESS_TOKEN", "BENCHMARK")
+os.environ.setdefault("MAIL_USERNAME", "benchmark@localhost")
+os.environ.setdefault("MAIL_PASSWORD", "benchmark")
+os.environ.setdefault("MAIL_FROM", "benchmark@example.com")
+os.environ.setdefault("MAIL_SERVER", "127.0.0.1")
+
+from aiosmtpd.controller import Controller
+from fastapi_mail import ConnectionConfig, FastMail, MessageSchema, MessageType
+from pydantic import SecretStr
+
+from functions.email.email_manager import EmailManager
+from functions.email.smtp_pool import SMTPPool
+
+
+class HandlerDescarte:
+    def __init__(self, latencia: float):
+        self.latencia = latencia
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        # Simula o custo de ida e volta do handshake de um servidor remoto
+        await asyncio.sleep(self.latencia)
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(self.latencia)
+        return "250 OK"
+
+
+def criar_config(porta: int) -> ConnectionConfig:
+    return ConnectionConfig(
+        MAIL_USERNAME="benchmark@localhost",
+        MAIL_PASSWORD=SecretStr("benchmark"),
+        MAIL_FROM="benchmark@example.com",
+        MAIL_PORT=porta,
+        MAIL_SERVER="127.0.0.1",
+        MAIL_STARTTLS=False,
+        MAIL_SSL_TLS=False,
+        USE_CREDENTIALS=False,
+        VALIDATE_CERTS=False,
+    )
+
+
+def criar_emails(quantidade: int) -> list[dict]:
+    return [
+        {"email": f"ciclista{i}@example.com", "assunto": "Extrato mensal", "mensagem": f"<p>Extrato {i}</p>"}
+        for i in range(quantidade)
+    ]
+
+
+async def medir_unitario(config: ConnectionConfig, emails: list[dict]) -> float:
+    fm = FastMail(config)
+    inicio = time.perf_counter()
+
+    for email in emails:
+        await fm.send_message(MessageSchema(subject=email["assunto"], recipients=[email["email"]],
+                                            body=email["mensagem"], subtype=MessageType.html))
+
+    return len(emails) / (time.perf_counter() - inicio)
+
+
+async def medir_lote(config: ConnectionConfig, emails: list[dict], sessoes: int) -> float:
+    email_manager = EmailManager()
+    email_manager.config = config
+    email_manager.smtp_pools = [SMTPPool(config, max_size=sessoes, max_mensagens=len(emails))]
+
+    inicio = time.perf_counter()
+    response = await email_manager.send_emails(emails)
+    decorrido = time.perf_counter() - inicio
+
+    await email_manager.disconnect()
+    assert response["data"]["falhas"] == 0, response
+    return len(emails) / decorrido
+
+
+async def medir_limitado(portas: list[int], limites: list[float], emails: list[dict], sessoes: int) -> float:
+    email_manager = EmailManager()
+    email_manager.smtp_pools = [
+        SMTPPool(criar_config(porta), max_size=sessoes, max_mensagens=len(emails), limite_por_segundo=limite, rajada=1)
+        for porta, limite in zip(portas, limites)
+    ]
+
+    inicio = time.perf_counter()
+    response = await email_manager.send_emails(emails)
+    decorrido = time.perf_counter() - inicio
+
+    await email_manager.disconnect()
+    assert response["data"]["falhas"] == 0, response
+    return len(emails) / decorrido
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mensagens", type=int, default=500)
+    parser.add_argument("--sessoes", type=int, default=4)
+    parser.add_argument("--porta", type=int, default=8025)
+    parser.add_argument("--latencia", type=float, default=0.002, help="latência simulada por comando SMTP, em segundos")
+    parser.add_argument("--limites", help="limites em msg/s separados por vírgula, um servidor por limite")
+    args = parser.parse_args()
+
+    controller = Controller(HandlerDescarte(args.latencia), hostname="127.0.0.1", port=args.porta)
+    controller.start()
+
+    try:
+        config = criar_config(args.porta)
+        emails = criar_emails(args.mensagens)
+
+        unitario = await medir_unitario(config, emails)
+        lote = await medir_lote(config, emails, args.sessoes)
+
+        print(f"mensagens: {args.mensagens}  sessões no lote: {args.sessoes}  latência simulada: {args.latencia * 1000:.1f} ms")
+        print(f"envio unitário: {unitario:10.1f} msg/s")
+        print(f"envio em lote:  {lote:10.1f} msg/s  ({lote / unitario:.1f}x)")
+    finally:
+        controller.stop()
+
+    if args.limites:
+        limites = [float(limite) for limite in args.limites.split(",")]
+        portas = [args.porta + 1 + i for i in range(len(limites))]
+        controllers = [Controller(HandlerDescarte(args.latencia), hostname="127.0.0.1", port=porta) for porta in portas]
+        for servidor in controllers:
+            servidor.start()
+
+        try:
+            limitado = await medir_limitado(portas, limites, criar_emails(args.mensagens), args.sessoes)
+            print(f"lote com limites {args.limites}: {limitado:10.1f} msg/s  (soma dos limites: {sum(limites):.1f} msg/s)")
+        finally:
+            for servidor in controllers:
+                servidor.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,76 @@
+"""
+Benchmark do enfileiramento de cobranças: um INSERT por cobrança (como a rota
+``/filaCobranca`` faz) contra o lote com ``copy_records_to_table``.
+
+Os cartões dos ciclistas são colocados no cache antes da medição, então o serviço
+de ciclistas não é chamado e só o custo do banco entra na conta. Precisa de um
+banco com as migrações aplicadas; as cobranças criadas ficam em ``fila_cobrancas``.
+
+    python -m benchmarks.fila_cobrancas_copy --dsn postgresql://u:s@localhost:5432/db \\
+        --cobrancas 20000 --ciclistas 500
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("MP_ACCESS_TOKEN", "BENCHMARK")
+
+from functions.cache.cache_manager import cartao_cache_instance
+from functions.database.asyncpg_manager import AsyncpgManager
+
+
+def criar_cobrancas(quantidade: int, ciclistas: int) -> list[dict]:
+    return [{"valor": round(1 + i % 100 * 0.37, 2), "ciclista": i % ciclistas + 1} for i in range(quantidade)]
+
+
+def preencher_cartoes(ciclistas: int):
+    cartao = {"status": True, "data": {"nomeTitular": "APRO", "numero": "4509953566233704", "validade": "2030-12-01", "cvv": "123"}}
+    for ciclista in range(1, ciclistas + 1):
+        cartao_cache_instance.set(ciclista, cartao, None)
+
+
+async def medir_unitario(manager: AsyncpgManager, cobrancas: list[dict]) -> float:
+    inicio = time.perf_counter()
+
+    for cobranca in cobrancas:
+        resultado = await manager.colocar_cobranca_na_fila(cobranca)
+        assert resultado["status"], resultado
+
+    return len(cobrancas) / (time.perf_counter() - inicio)
+
+
+async def medir_copy(manager: AsyncpgManager, cobrancas: list[dict]) -> float:
+    inicio = time.perf_counter()
+    resultado = await manager.colocar_cobrancas_na_fila(cobrancas)
+    decorrido = time.perf_counter() - inicio
+
+    assert resultado["status"] and not resultado["data"]["rejeitadas"], resultado
+    return len(cobrancas) / decorrido
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dsn", required=True, help="DSN do Postgres")
+    parser.add_argument("--cobrancas", type=int, default=20000)
+    parser.add_argument("--ciclistas", type=int, default=500)
+    parser.add_argument("--unitario", type=int, default=2000, help="cobranças enfileiradas uma a uma")
+    args = parser.parse_args()
+
+    preencher_cartoes(args.ciclistas)
+    manager = AsyncpgManager(dsn=args.dsn)
+    await manager.connect()
+
+    try:
+        unitario = await medir_unitario(manager, criar_cobrancas(args.unitario, args.ciclistas))
+        lote = await medir_copy(manager, criar_cobrancas(args.cobrancas, args.ciclistas))
+    finally:
+        await manager.disconnect()
+
+    print(f"cobranças: {args.cobrancas}  ciclistas distintos: {args.ciclistas}")
+    print(f"INSERT por cobrança: {unitario:10.1f} cobranças/s")
+    print(f"COPY em lote:        {lote:10.1f} cobranças/s  ({lote / unitario:.1f}x)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
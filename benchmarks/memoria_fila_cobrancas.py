@@ -0,0 +1,103 @@
+"""
+Benchmark de memória da drenagem da fila de cobranças: o resultado de cada cobrança
+processada como dict convertido em Python (``{**row}`` com datas em ISO e valor em
+float, como era feito) contra o ``Cobranca`` com slots montado direto do registro, com
+o JSON pronto vindo do banco.
+
+As linhas chegam em lotes de ``FILA_COBRANCAS_LOTE``, como na drenagem real, e só o
+resultado de cada cobrança fica retido. Cada modo roda num processo próprio para o
+pico de RSS de um não contaminar o outro.
+
+    python -m benchmarks.memoria_fila_cobrancas --cobrancas 200000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+os.environ.setdefault("MP_ACCESS_TOKEN", "BENCHMARK")
+
+from entities.cobranca.cobranca import Cobranca
+from functions.database.asyncpg_manager import FILA_COBRANCAS_LOTE
+
+INICIO = datetime(2024, 1, 1, 10, 0, 0, 123456)
+
+
+def lote_colunas(inicio: int, tamanho: int) -> list[dict]:
+    # Registro de cobrança concluída com as colunas separadas
+    return [{"id": i, "status": "FINALIZADA", "hora_solicitacao": INICIO + timedelta(seconds=i),
+             "hora_finalizacao": INICIO + timedelta(seconds=i + 5), "valor": Decimal("15.50"), "ciclista": i % 50}
+            for i in range(inicio, inicio + tamanho)]
+
+
+def lote_json(inicio: int, tamanho: int) -> list[dict]:
+    # Registro de cobrança concluída com o JSON montado pelo banco
+    return [{"id": i, "status": "FINALIZADA",
+             "json": json.dumps({"id": i, "status": "FINALIZADA", "hora_solicitacao": (INICIO + timedelta(seconds=i)).isoformat(),
+                                 "hora_finalizacao": (INICIO + timedelta(seconds=i + 5)).isoformat(), "valor": 15.5,
+                                 "ciclista": i % 50}, separators=(",", ":")).encode()}
+            for i in range(inicio, inicio + tamanho)]
+
+
+def drenar_dict(quantidade: int) -> list:
+    processadas = []
+    for inicio in range(0, quantidade, FILA_COBRANCAS_LOTE):
+        for row in lote_colunas(inicio, min(FILA_COBRANCAS_LOTE, quantidade - inicio)):
+            processadas.append({**row, "hora_solicitacao": row["hora_solicitacao"].isoformat() if row["hora_solicitacao"] else None,
+                                "hora_finalizacao": row["hora_finalizacao"].isoformat() if row["hora_finalizacao"] else None,
+                                "valor": float(row["valor"])})
+    return processadas
+
+
+def drenar_cobranca(quantidade: int) -> list:
+    processadas = []
+    for inicio in range(0, quantidade, FILA_COBRANCAS_LOTE):
+        for row in lote_json(inicio, min(FILA_COBRANCAS_LOTE, quantidade - inicio)):
+            processadas.append(Cobranca.de_registro(row))
+    return processadas
+
+
+MODOS = {"dict": drenar_dict, "cobranca": drenar_cobranca}
+
+
+def medir(modo: str, quantidade: int):
+    tracemalloc.start()
+    processadas = MODOS[modo](quantidade)
+    retida, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # ru_maxrss vem em KiB no Linux
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"retida": retida / len(processadas), "pico": pico, "rss": rss}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cobrancas", type=int, default=200000)
+    parser.add_argument("--modo", choices=MODOS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.modo:
+        medir(args.modo, args.cobrancas)
+        return
+
+    resultados = {}
+    for modo in MODOS:
+        saida = subprocess.run([sys.executable, "-m", "benchmarks.memoria_fila_cobrancas", "--cobrancas", str(args.cobrancas),
+                                "--modo", modo], capture_output=True, text=True, check=True).stdout
+        resultados[modo] = json.loads(saida.splitlines()[-1])
+
+    print(f"cobranças drenadas: {args.cobrancas}  lote: {FILA_COBRANCAS_LOTE}")
+    for modo, nome in (("dict", "dict convertido"), ("cobranca", "Cobranca (slots)")):
+        resultado = resultados[modo]
+        print(f"{nome:18s} {resultado['retida']:7.0f} B/cobrança  pico tracemalloc {resultado['pico'] / 2**20:7.1f} MiB"
+              f"  pico RSS {resultado['rss'] / 1024:7.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark da serialização de uma página de cobranças na aplicação.
+
+Compara o caminho antigo (Record para dict, ``isoformat`` nas datas, ``float`` no
+valor e ``JSONResponse`` serializando tudo de novo) com o atual, em que o Postgres
+entrega o JSON de cada linha pronto e a aplicação só junta os bytes. Mede apenas a
+CPU da aplicação por linha; o custo do ``json_build_object`` fica no banco.
+
+    python -m benchmarks.serializacao_cobrancas --linhas 500 --repeticoes 200
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from starlette.responses import JSONResponse
+
+
+def criar_linhas(quantidade: int) -> list[dict]:
+    inicio = datetime(2024, 1, 1, 10, 0, 0, 123456)
+    return [{"id": i, "status": "FINALIZADA", "hora_solicitacao": inicio + timedelta(seconds=i),
+             "hora_finalizacao": inicio + timedelta(seconds=i + 5), "valor": Decimal("15.50"), "ciclista": i % 50}
+            for i in range(quantidade)]
+
+
+def linhas_json(linhas: list[dict]) -> list[dict]:
+    # O que o banco devolve no caminho atual: id, status e o texto do JSON
+    return [{"id": linha["id"], "status": linha["status"],
+             "json": json.dumps({**linha, "hora_solicitacao": linha["hora_solicitacao"].isoformat(),
+                                 "hora_finalizacao": linha["hora_finalizacao"].isoformat(),
+                                 "valor": float(linha["valor"])}, separators=(",", ":"))}
+            for linha in linhas]
+
+
+def serializar_em_python(linhas: list[dict]) -> bytes:
+    cobrancas = [{**linha, "hora_solicitacao": linha["hora_solicitacao"].isoformat() if linha["hora_solicitacao"] else None,
+                  "hora_finalizacao": linha["hora_finalizacao"].isoformat() if linha["hora_finalizacao"] else None,
+                  "valor": float(linha["valor"])} for linha in linhas]
+    return JSONResponse(content={"cobrancas": cobrancas, "proximo": None}).body
+
+
+def juntar_json_do_banco(linhas: list[dict]) -> bytes:
+    cobrancas = [linha["json"].encode() for linha in linhas]
+    return b'{"cobrancas":[' + b",".join(cobrancas) + b'],"proximo":null}'
+
+
+def medir(funcao, linhas: list[dict], repeticoes: int) -> float:
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao(linhas)
+    return (time.perf_counter() - inicio) / (repeticoes * len(linhas))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--linhas", type=int, default=500)
+    parser.add_argument("--repeticoes", type=int, default=200)
+    args = parser.parse_args()
+
+    linhas = criar_linhas(args.linhas)
+    prontas = linhas_json(linhas)
+    assert json.loads(serializar_em_python(linhas)) == json.loads(juntar_json_do_banco(prontas))
+
+    python = medir(serializar_em_python, linhas, args.repeticoes)
+    banco = medir(juntar_json_do_banco, prontas, args.repeticoes)
+
+    print(f"linhas por página: {args.linhas}  repetições: {args.repeticoes}")
+    print(f"serialização em Python: {python * 1e6:8.2f} µs/linha")
+    print(f"JSON montado no banco:  {banco * 1e6:8.2f} µs/linha  ({python / banco:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
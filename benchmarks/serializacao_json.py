@@ -0,0 +1,67 @@
+"""
+Benchmark do serializador JSON da aplicação: ``JSONResponse`` do Starlette (json da
+stdlib, com datas e Decimal convertidos antes em Python) contra ``OrjsonResponse``,
+que codifica datetime e Decimal direto.
+
+Mede o tempo de codificação de uma cobrança e de uma lista de cobranças.
+
+    python -m benchmarks.serializacao_json --lista 10000 --repeticoes 20
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from starlette.responses import JSONResponse
+
+from functions.serializacao.serializador import OrjsonResponse
+
+
+def criar_cobrancas(quantidade: int) -> list[dict]:
+    inicio = datetime(2024, 1, 1, 10, 0, 0, 123456)
+    return [{"id": i, "status": "FINALIZADA", "hora_solicitacao": inicio + timedelta(seconds=i),
+             "hora_finalizacao": inicio + timedelta(seconds=i + 5), "valor": Decimal("15.50"), "ciclista": i % 50}
+            for i in range(quantidade)]
+
+
+def converter(cobranca: dict) -> dict:
+    # A conversão que cada método fazia antes de entregar a cobrança ao JSONResponse
+    return {**cobranca, "hora_solicitacao": cobranca["hora_solicitacao"].isoformat() if cobranca["hora_solicitacao"] else None,
+            "hora_finalizacao": cobranca["hora_finalizacao"].isoformat() if cobranca["hora_finalizacao"] else None,
+            "valor": float(cobranca["valor"])}
+
+
+def stdlib(cobrancas: list[dict]) -> bytes:
+    return JSONResponse(content=[converter(cobranca) for cobranca in cobrancas]).body
+
+
+def orjson(cobrancas: list[dict]) -> bytes:
+    return OrjsonResponse(content=cobrancas).body
+
+
+def medir(funcao, cobrancas: list[dict], repeticoes: int) -> float:
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao(cobrancas)
+    return (time.perf_counter() - inicio) / repeticoes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lista", type=int, default=10000)
+    parser.add_argument("--repeticoes", type=int, default=20)
+    args = parser.parse_args()
+
+    lista = criar_cobrancas(args.lista)
+    unica = lista[:1]
+    assert stdlib(lista) == orjson(lista)
+
+    print(f"{'':24s} {'stdlib':>12s} {'orjson':>12s}")
+    antes, depois = medir(stdlib, unica, args.repeticoes * 1000), medir(orjson, unica, args.repeticoes * 1000)
+    print(f"{'uma cobrança':24s} {antes * 1e6:9.2f} µs {depois * 1e6:9.2f} µs  ({antes / depois:.1f}x)")
+    antes, depois = medir(stdlib, lista, args.repeticoes), medir(orjson, lista, args.repeticoes)
+    print(f"{f'lista de {args.lista}':24s} {antes * 1e3:9.2f} ms {depois * 1e3:9.2f} ms  ({antes / depois:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Benchmark da renderização de templates de email.
+
+Mede o tempo por mensagem renderizando um template já compilado com variáveis
+diferentes para cada destinatário, e o caminho do lote quando todos os
+destinatários compartilham as mesmas variáveis.
+
+    python -m benchmarks.templates_email --mensagens 10000
+"""
+import argparse
+import time
+
+from functions.email.template_manager import TemplateManager
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mensagens", type=int, default=10000)
+    args = parser.parse_args()
+
+    template_manager = TemplateManager()
+
+    inicio = time.perf_counter()
+    template_manager.carregar()
+    compilacao = time.perf_counter() - inicio
+
+    emails = [
+        {"email": f"ciclista{i}@example.com", "template": "cobranca_confirmada",
+         "variaveis": {"nome": f"Ciclista {i}", "valor": 10 + i / 100, "cobranca_id": i}}
+        for i in range(args.mensagens)
+    ]
+
+    inicio = time.perf_counter()
+    for email in emails:
+        template_manager.aplicar(email)
+    individual = (time.perf_counter() - inicio) / args.mensagens
+
+    compartilhado = [{**email, "variaveis": {"valor": 15.5}} for email in emails]
+    inicio = time.perf_counter()
+    template_manager.aplicar_lote(compartilhado)
+    lote = (time.perf_counter() - inicio) / args.mensagens
+
+    print(f"compilação dos templates: {compilacao * 1000:8.2f} ms")
+    print(f"variáveis por destinatário: {individual * 1e6:8.2f} µs/mensagem")
+    print(f"lote com variáveis comuns:  {lote * 1e6:8.2f} µs/mensagem")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,34 @@
+from dataclasses import dataclass
+from enum import Enum
+
 from pydantic import BaseModel
 
 
+class StatusCobranca(str, Enum):
+    PENDENTE = "PENDENTE"
+    EM_FILA = "EM_FILA"
+    FINALIZADA = "FINALIZADA"
+    FALHA = "FALHA"
+
+
 class CobrancaRequest(BaseModel):
     valor: float
-    ciclista: int
\ No newline at end of file
+    ciclista: int
+
+
+@dataclass(slots=True)
+class Cobranca:
+    """
+    Cobrança como sai do banco: ``id`` e ``status`` para as decisões da aplicação e o
+    corpo JSON já montado pelo Postgres.
+
+    Criada direto dos campos do Record, sem dict intermediário: os três atributos
+    apontam para os mesmos objetos que o asyncpg decodificou.
+    """
+    id: int
+    status: str
+    json: bytes
+
+    @classmethod
+    def de_registro(cls, registro) -> "Cobranca":
+        return cls(registro["id"], registro["status"], registro["json"])
@@ -1,4 +1,14 @@
-from pydantic import BaseModel, EmailStr
+from enum import Enum
+from typing import Optional
+
+from pydantic import BaseModel, EmailStr, model_validator
+
+
+class TemplateEmail(str, Enum):
+    COBRANCA_CONFIRMADA = "cobranca_confirmada"
+    COBRANCA_FALHA = "cobranca_falha"
+    CARTAO_VALIDADO = "cartao_validado"
+    RESUMO_COBRANCAS = "resumo_cobrancas"
 
 
 class Email(BaseModel):
@@ -9,5 +19,13 @@ class Email(BaseModel):
 
 class EmailRequest(BaseModel):
     email: EmailStr
-    assunto: str
-    mensagem: str
\ No newline at end of file
+    assunto: Optional[str] = None
+    mensagem: Optional[str] = None
+    template: Optional[TemplateEmail] = None
+    variaveis: Optional[dict] = None
+
+    @model_validator(mode="after")
+    def valida_conteudo(self):
+        if self.template is None and (self.assunto is None or self.mensagem is None):
+            raise ValueError("Informe assunto e mensagem ou um template")
+        return self
@@ -0,0 +1,132 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Hashable, Iterator, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CACHE_MAX_ITENS = int(os.getenv("CACHE_MAX_ITENS", 10000))
+COBRANCA_CACHE_TTL = float(os.getenv("COBRANCA_CACHE_TTL", 2))
+# Desligado por padrão: um cartão trocado só sai do cache antes do TTL se o serviço de
+# ciclistas chamar /invalidarCartao
+CARTAO_CACHE_TTL = float(os.getenv("CARTAO_CACHE_TTL", 0))
+
+# Cobranças nesses estados não mudam mais e podem ficar em cache sem expiração. FALHA fica
+# de fora: uma cobrança paga depois de descartada ainda passa de FALHA a FINALIZADA
+ESTADOS_FINAIS = ("FINALIZADA",)
+
+
+class CacheManager:
+    """
+    Cache em memória, LRU, com TTL por item e coalescência de misses.
+
+    ``obter`` devolve o valor em cache ou chama ``carregar``, que retorna
+    ``(valor, ttl)``: ``ttl`` ``None`` guarda sem expiração e ``0`` não guarda.
+    Chamadas concorrentes para a mesma chave durante um miss aguardam o mesmo
+    carregamento em vez de repetir a consulta.
+
+    Um valor lido antes de uma invalidação da mesma chave não é guardado: a leitura pode
+    ter visto o estado anterior à escrita (ou uma réplica atrasada). ``leitura`` marca o
+    início de uma consulta feita fora de ``obter``, e ``set(..., marca=...)`` descarta o
+    valor se a chave foi invalidada desde a marca.
+    """
+
+    def __init__(self, max_itens: int = CACHE_MAX_ITENS):
+        self.max_itens = max_itens
+        self._itens: OrderedDict[Hashable, tuple[Any, Optional[float]]] = OrderedDict()
+        self._carregando: dict[Hashable, asyncio.Future] = {}
+        # Contador de invalidações; chave -> contador na última invalidação, mantido só
+        # enquanto houver leituras em andamento
+        self._geracao = 0
+        self._limpo_em = 0
+        self._invalidadas: dict[Hashable, int] = {}
+        self._leituras = 0
+
+    def get(self, chave: Hashable) -> Optional[Any]:
+        item = self._itens.get(chave)
+        if item is None:
+            return None
+
+        valor, expira = item
+        if expira is not None and expira <= time.monotonic():
+            del self._itens[chave]
+            return None
+
+        self._itens.move_to_end(chave)
+        return valor
+
+    def set(self, chave: Hashable, valor: Any, ttl: Optional[float] = None, marca: Optional[int] = None):
+        if ttl == 0:
+            return
+
+        if marca is not None and (self._limpo_em > marca or self._invalidadas.get(chave, 0) > marca):
+            return
+
+        self._itens[chave] = (valor, time.monotonic() + ttl if ttl is not None else None)
+        self._itens.move_to_end(chave)
+
+        while len(self._itens) > self.max_itens:
+            self._itens.popitem(last=False)
+
+    def invalidar(self, chave: Hashable):
+        self._itens.pop(chave, None)
+        # Quem chegar depois não aguarda um carregamento que pode ter lido o estado anterior
+        self._carregando.pop(chave, None)
+        self._geracao += 1
+        if self._leituras:
+            self._invalidadas[chave] = self._geracao
+
+    def limpar(self):
+        self._itens.clear()
+        self._carregando.clear()
+        self._geracao += 1
+        self._limpo_em = self._geracao
+
+    @contextmanager
+    def leitura(self) -> Iterator[int]:
+        self._leituras += 1
+        try:
+            yield self._geracao
+        finally:
+            self._leituras -= 1
+            if not self._leituras:
+                self._invalidadas.clear()
+
+    async def obter(self, chave: Hashable, carregar: Callable[[], Awaitable[tuple[Any, Optional[float]]]]) -> Any:
+        valor = self.get(chave)
+        if valor is not None:
+            return valor
+
+        futuro = self._carregando.get(chave)
+        if futuro is not None:
+            return await asyncio.shield(futuro)
+
+        futuro = asyncio.get_running_loop().create_future()
+        self._carregando[chave] = futuro
+
+        try:
+            with self.leitura() as marca:
+                valor, ttl = await carregar()
+                self.set(chave, valor, ttl, marca)
+        except Exception as e:
+            futuro.set_exception(e)
+            # Evita o aviso de exceção não recuperada quando ninguém mais aguardava
+            futuro.exception()
+            raise
+        except BaseException:
+            futuro.cancel()
+            raise
+        else:
+            futuro.set_result(valor)
+            return valor
+        finally:
+            if self._carregando.get(chave) is futuro:
+                del self._carregando[chave]
+
+
+cobranca_cache_instance = CacheManager()
+cartao_cache_instance = CacheManager()
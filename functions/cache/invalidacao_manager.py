@@ -0,0 +1,116 @@
+import asyncio
+import os
+from typing import Iterable, Optional
+
+import asyncpg
+from dotenv import load_dotenv
+
+from functions.cache.cache_manager import CacheManager, cobranca_cache_instance, cartao_cache_instance
+
+load_dotenv()
+
+# LISTEN precisa de sessão própria; com PgBouncer em transaction pooling use a conexão direta
+DB_DIRETO_URL = os.getenv("DB_DIRETO_URL") or os.getenv("DB_URL")
+CACHE_INVALIDACAO = os.getenv("CACHE_INVALIDACAO", "true").lower() == "true"
+CACHE_INVALIDACAO_CANAL = os.getenv("CACHE_INVALIDACAO_CANAL", "invalidacao_cache")
+CACHE_INVALIDACAO_RECONEXAO = float(os.getenv("CACHE_INVALIDACAO_RECONEXAO", 5))
+
+# O payload do NOTIFY é limitado a 8000 bytes; chaves são agrupadas em mensagens menores
+MAX_CHAVES_POR_NOTIFY = 500
+
+TODAS = "*"
+
+
+class InvalidacaoManager:
+    """
+    Coerência dos caches em memória entre réplicas via LISTEN/NOTIFY do Postgres.
+
+    Quem altera uma entidade chama ``publicar``, que remove as chaves do cache local e
+    emite ``NOTIFY <canal>, '<cache>:<chave>,<chave>...'``. Cada réplica mantém uma
+    conexão escutando o canal e remove as mesmas chaves do seu cache. ``*`` como chave
+    esvazia o cache inteiro. Publicado na conexão de uma transação, o aviso só sai no
+    commit.
+    """
+
+    def __init__(self, dsn: Optional[str] = DB_DIRETO_URL, canal: str = CACHE_INVALIDACAO_CANAL):
+        self.dsn = dsn
+        self.canal = canal
+        self.caches: dict[str, CacheManager] = {
+            "cobranca": cobranca_cache_instance,
+            "cartao": cartao_cache_instance,
+        }
+        self.pool: Optional[asyncpg.pool.Pool] = None
+        self._tarefa: Optional[asyncio.Task] = None
+
+    def _invalidar_local(self, cache: str, chaves: Iterable[str]):
+        cache_manager = self.caches.get(cache)
+        if cache_manager is None:
+            return
+
+        for chave in chaves:
+            if chave == TODAS:
+                cache_manager.limpar()
+            else:
+                cache_manager.invalidar(int(chave) if chave.isdigit() else chave)
+
+    def _ao_notificar(self, connection, pid, canal, payload: str):
+        cache, _, chaves = payload.partition(":")
+        self._invalidar_local(cache, chaves.split(","))
+
+    async def publicar(self, cache: str, chaves: Iterable, connection=None):
+        chaves = [str(chave) for chave in chaves]
+        if not chaves:
+            return
+
+        self._invalidar_local(cache, chaves)
+
+        if connection is None:
+            if self.pool is None:
+                return
+            async with self.pool.acquire() as connection:
+                await self._notificar(connection, cache, chaves)
+        else:
+            await self._notificar(connection, cache, chaves)
+
+    async def _notificar(self, connection, cache: str, chaves: list[str]):
+        for inicio in range(0, len(chaves), MAX_CHAVES_POR_NOTIFY):
+            payload = f"{cache}:{','.join(chaves[inicio:inicio + MAX_CHAVES_POR_NOTIFY])}"
+            await connection.fetchval("SELECT pg_notify($1, $2);", self.canal, payload)
+
+    async def _escutar(self):
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(dsn=self.dsn)
+                perdida = asyncio.Event()
+                connection.add_termination_listener(lambda _: perdida.set())
+                await connection.add_listener(self.canal, self._ao_notificar)
+
+                # Avisos perdidos enquanto estávamos desconectados não voltam
+                for cache_manager in self.caches.values():
+                    cache_manager.limpar()
+
+                await perdida.wait()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Falha na escuta de invalidação de cache: {e}")
+            finally:
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+
+            await asyncio.sleep(CACHE_INVALIDACAO_RECONEXAO)
+
+    async def start(self, pool: Optional[asyncpg.pool.Pool] = None):
+        self.pool = pool
+        if CACHE_INVALIDACAO and self._tarefa is None:
+            self._tarefa = asyncio.create_task(self._escutar())
+
+    async def stop(self):
+        if self._tarefa is not None:
+            self._tarefa.cancel()
+            await asyncio.gather(self._tarefa, return_exceptions=True)
+            self._tarefa = None
+
+
+invalidacao_instance = InvalidacaoManager()
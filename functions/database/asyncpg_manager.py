@@ -1,168 +1,830 @@
+import asyncio
 import os
-from typing import Optional
+import time
+from collections import OrderedDict
+from contextlib import aclosing, asynccontextmanager, nullcontext
+from datetime import datetime
+from decimal import Decimal
+from typing import AsyncIterator, Awaitable, Callable, Optional
 
 import asyncpg
 from dotenv import load_dotenv
 
+from entities.cobranca.cobranca import Cobranca
+from functions.cache.cache_manager import cobranca_cache_instance
+from functions.cache.invalidacao_manager import invalidacao_instance
 from functions.integration.ciclista_manager import ciclista_instance
 from functions.mercado_pago.mercado_pago_manager import mercado_pago_instance
 
 load_dotenv()
 
 DB_URL = os.getenv("DB_URL")
+NOTIFICAR_COBRANCAS = os.getenv("NOTIFICAR_COBRANCAS", "false").lower() == "true"
+FILA_COBRANCAS_LOTE = int(os.getenv("FILA_COBRANCAS_LOTE", 100))
+FILA_COBRANCAS_LEASE = float(os.getenv("FILA_COBRANCAS_LEASE", 300))
+FILA_COBRANCAS_MAX_TENTATIVAS = int(os.getenv("FILA_COBRANCAS_MAX_TENTATIVAS", 5))
+FILA_COBRANCAS_ATRASO_RETENTATIVA = float(os.getenv("FILA_COBRANCAS_ATRASO_RETENTATIVA", 60))
+FILA_COBRANCAS_ATRASO_MAX = float(os.getenv("FILA_COBRANCAS_ATRASO_MAX", 3600))
+# Cobranças a partir deste valor entram na fila como prioritárias (0 desliga)
+FILA_COBRANCAS_VALOR_PRIORITARIO = float(os.getenv("FILA_COBRANCAS_VALOR_PRIORITARIO", 0))
+# Cada cobrança prioritária de um ciclista conta como 1/peso de uma normal na divisão do lote
+FILA_COBRANCAS_PESO_PRIORIDADE = float(os.getenv("FILA_COBRANCAS_PESO_PRIORIDADE", 4))
+# Cobranças vencidas lidas por ciclista e classe de prioridade a cada reivindicação
+FILA_COBRANCAS_JANELA = int(os.getenv("FILA_COBRANCAS_JANELA", 10))
+
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 10))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 10))
+DB_POOL_MAX_QUERIES = int(os.getenv("DB_POOL_MAX_QUERIES", 50000))
+DB_POOL_MAX_INACTIVE_LIFETIME = float(os.getenv("DB_POOL_MAX_INACTIVE_LIFETIME", 300))
+DB_COMMAND_TIMEOUT = float(os.getenv("DB_COMMAND_TIMEOUT", 0)) or None
+DB_STATEMENT_TIMEOUT = int(os.getenv("DB_STATEMENT_TIMEOUT", 0))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 100))
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "false").lower() == "true"
+CICLISTA_CONCORRENCIA = int(os.getenv("CICLISTA_CONCORRENCIA", 20))
+
+EXPORTACAO_PREFETCH = int(os.getenv("EXPORTACAO_PREFETCH", 1000))
+EXPORTACAO_BUFFER = int(os.getenv("EXPORTACAO_BUFFER", 16))
+# Exportações simultâneas lendo do primário; cada uma prende uma conexão do pool das cobranças
+# durante todo o download
+EXPORTACAO_CONCORRENCIA = int(os.getenv("EXPORTACAO_CONCORRENCIA", 2))
+
+DB_READ_URL = os.getenv("DB_READ_URL")
+DB_READ_FALLBACK = os.getenv("DB_READ_FALLBACK", "true").lower() == "true"
+DB_READ_YOUR_WRITES = float(os.getenv("DB_READ_YOUR_WRITES", 5))
+
+# Falhas que indicam réplica indisponível, não erro da consulta
+ERROS_REPLICA = (OSError, asyncio.TimeoutError, asyncpg.PostgresConnectionError,
+                 asyncpg.CannotConnectNowError, asyncpg.TooManyConnectionsError, asyncpg.InterfaceError)
+
+# JSON da cobrança montado pelo Postgres, com os campos na ordem da API. Sai como bytea
+# (UTF-8) para o asyncpg entregar bytes prontos para o corpo da resposta, sem decodificar
+# para str e codificar de novo
+COBRANCA_JSON = """convert_to(json_build_object('id', id, 'status', status, 'hora_solicitacao', hora_solicitacao,
+                             'hora_finalizacao', hora_finalizacao, 'valor', valor::float8, 'ciclista', ciclista)::text, 'UTF8') AS json"""
+
+FILA_COBRANCA_JSON = """convert_to(json_build_object('id', id, 'status', 'EM_FILA', 'hora_solicitacao', enfileirada_em,
+                             'hora_finalizacao', NULL, 'valor', valor::float8, 'ciclista', ciclista)::text, 'UTF8') AS json"""
+
+QUERY_COBRANCA_PENDENTE = """
+    INSERT INTO cobrancas(status, hora_solicitacao, hora_finalizacao, valor, ciclista)
+        VALUES(
+              'PENDENTE',
+            NOW(),
+            NULL,
+            $1,
+            $2
+        ) RETURNING id;
+"""
+
+QUERY_COBRANCA_FINALIZADA = f"""
+    UPDATE cobrancas
+        SET status = 'FINALIZADA',
+            hora_finalizacao = NOW()
+        WHERE id = $1
+        RETURNING id, status, {COBRANCA_JSON};
+"""
+
+QUERY_COBRANCA_FALHA = """
+    UPDATE cobrancas
+        SET status           = 'FALHA',
+            hora_finalizacao = NOW()
+        WHERE id = $1;
+"""
+
+QUERY_COBRANCA_POR_ID = f"""
+    SELECT id, status, {COBRANCA_JSON}
+    FROM cobrancas
+    WHERE id = $1
+    UNION ALL
+    SELECT id, 'EM_FILA', {FILA_COBRANCA_JSON}
+    FROM fila_cobrancas
+    WHERE id = $1
+    LIMIT 1;
+"""
+
+QUERY_COBRANCAS_POR_IDS = f"""
+    SELECT id, status, {COBRANCA_JSON}
+    FROM cobrancas
+    WHERE id = ANY($1::int[])
+    UNION ALL
+    SELECT id, 'EM_FILA', {FILA_COBRANCA_JSON}
+    FROM fila_cobrancas
+    WHERE id = ANY($1::int[]);
+"""
+
+QUERY_ENFILEIRAR_COBRANCA = f"""
+    INSERT INTO fila_cobrancas(ciclista, valor, enfileirada_em, prioridade)
+        VALUES($2, $1, NOW(), $3)
+        RETURNING id, 'EM_FILA' AS status, {FILA_COBRANCA_JSON};
+"""
+
+# Reserva os ids (da sequência de cobrancas) e o horário de um lote antes do COPY
+QUERY_RESERVAR_IDS_FILA = """
+    SELECT nextval('cobrancas_id_seq') AS id, LOCALTIMESTAMP AS enfileirada_em
+    FROM generate_series(1, $1);
+"""
+
+# Classes de prioridade da fila
+PRIORIDADE_NORMAL = 0
+PRIORIDADE_ALTA = 1
+
+# Próximo ciclista de uma classe (prioridade) depois de {depois}, em ordem de id, voltando ao
+# menor quando passa do último: uma busca no índice (prioridade, ciclista, ...) por passo
+_PROXIMO_CICLISTA = """COALESCE(
+                (SELECT ciclista FROM fila_cobrancas WHERE prioridade = {prioridade} AND ciclista > {depois}
+                 ORDER BY ciclista LIMIT 1),
+                (SELECT ciclista FROM fila_cobrancas WHERE prioridade = {prioridade} ORDER BY ciclista LIMIT 1))"""
+
+# Cobrança que um worker pode reivindicar: vencida, sem lease vigente e com recusas restantes
+_DISPONIVEL = """proxima_tentativa <= NOW()
+              AND (lease_ate IS NULL OR lease_ate < NOW())
+              AND recusas < $3"""
+
+# Varredura solta (loose index scan) dos ciclistas de uma classe: salta de ciclista em ciclista
+# pelo índice, a partir do cursor $6, e para depois de $1 ciclistas com cobrança disponível ou ao
+# voltar ao primeiro. O custo é por ciclista visitado, não por cobrança na fila
+_CICLISTAS_DA_CLASSE = """
+    {nome}(ciclista, inicio, disponivel, n) AS (
+        SELECT ciclista, ciclista, disponivel, disponivel::int
+        FROM (SELECT primeiro.ciclista,
+                     EXISTS (SELECT 1 FROM fila_cobrancas
+                             WHERE prioridade = {prioridade} AND ciclista = primeiro.ciclista AND {disponivel}) AS disponivel
+              FROM (SELECT {primeiro} AS ciclista) AS primeiro
+              WHERE primeiro.ciclista IS NOT NULL) AS inicial
+        UNION ALL
+        SELECT proximo.ciclista, anterior.inicio, proximo.disponivel, anterior.n + proximo.disponivel::int
+        FROM {nome} AS anterior
+        CROSS JOIN LATERAL (
+            SELECT seguinte.ciclista,
+                   EXISTS (SELECT 1 FROM fila_cobrancas
+                           WHERE prioridade = {prioridade} AND ciclista = seguinte.ciclista AND {disponivel}) AS disponivel
+            FROM (SELECT {seguinte} AS ciclista) AS seguinte
+        ) AS proximo
+        WHERE anterior.n < $1 AND proximo.ciclista <> anterior.inicio
+    )"""
+
+
+def _ciclistas_da_classe(nome: str, prioridade: int) -> str:
+    return _CICLISTAS_DA_CLASSE.format(
+        nome=nome, prioridade=prioridade, disponivel=_DISPONIVEL,
+        primeiro=_PROXIMO_CICLISTA.format(prioridade=prioridade, depois="$6::int"),
+        seguinte=_PROXIMO_CICLISTA.format(prioridade=prioridade, depois="anterior.ciclista"))
+
+
+# Reivindica um lote das cobranças vencidas pelo lease. Escolhe até $1 ciclistas com cobranças
+# disponíveis, primeiro os com cobranças prioritárias, em rodízio pelo id a partir do cursor $6
+# (o último ciclista atendido), e lê de cada um, pelo índice (prioridade, ciclista,
+# proxima_tentativa, id), no máximo $4 cobranças por classe. A n-ésima cobrança de um ciclista
+# entra no lote na posição n, ou n / $5 se for prioritária, então um ciclista com milhares de
+# cobranças não passa na frente dos outros. A leitura não trava nada; só as cobranças
+# escolhidas são travadas, e as que outro worker pegou nesse meio tempo ficam de fora.
+# Cobranças com lease vigente estão com outro worker.
+QUERY_REIVINDICAR_COBRANCAS = f"""
+    WITH RECURSIVE {_ciclistas_da_classe("altas", PRIORIDADE_ALTA)},
+    {_ciclistas_da_classe("normais", PRIORIDADE_NORMAL).lstrip()},
+    ciclistas AS (
+        (SELECT {PRIORIDADE_ALTA} AS prioridade, ciclista FROM altas WHERE disponivel)
+        UNION ALL
+        (SELECT {PRIORIDADE_NORMAL} AS prioridade, ciclista FROM normais WHERE disponivel)
+        LIMIT $1::int
+    ),
+    candidatas AS (
+        SELECT candidata.id, candidata.ciclista, candidata.prioridade, candidata.proxima_tentativa
+        FROM ciclistas
+        CROSS JOIN LATERAL (
+            SELECT id, ciclista, prioridade, proxima_tentativa
+            FROM fila_cobrancas
+            WHERE prioridade = ciclistas.prioridade
+              AND ciclista = ciclistas.ciclista
+              AND {_DISPONIVEL}
+            ORDER BY proxima_tentativa, id
+            LIMIT $4::int
+        ) AS candidata
+    ),
+    escolhidas AS (
+        SELECT id
+        FROM candidatas
+        ORDER BY ROW_NUMBER() OVER (PARTITION BY ciclista ORDER BY prioridade DESC, proxima_tentativa, id)
+                     / power($5::float8, prioridade),
+                 proxima_tentativa, id
+        LIMIT $1::int
+    ),
+    travadas AS (
+        SELECT fila_cobrancas.id
+        FROM fila_cobrancas
+        JOIN escolhidas ON escolhidas.id = fila_cobrancas.id
+        WHERE {_DISPONIVEL}
+        FOR UPDATE OF fila_cobrancas SKIP LOCKED
+    )
+    UPDATE fila_cobrancas
+        SET lease_ate = NOW() + make_interval(secs => $2),
+            tentativas = tentativas + 1
+        FROM travadas
+        WHERE fila_cobrancas.id = travadas.id
+        RETURNING fila_cobrancas.id, valor, ciclista, enfileirada_em, tentativas;
+"""
+
+# Estende o lease antes de pagar cada cobrança do lote; não devolve nada se o lease já expirou
+# ou se a cobrança foi reivindicada de novo (outra tentativa), e aí ela é de outro worker
+QUERY_RENOVAR_LEASE = """
+    UPDATE fila_cobrancas
+        SET lease_ate = NOW() + make_interval(secs => $2)
+        WHERE id = $1 AND tentativas = $3 AND lease_ate > NOW()
+        RETURNING id;
+"""
+
+# A cobrança paga sai da fila e entra no histórico com o mesmo id. Com $2 a notificação é
+# registrada no mesmo comando: uma queda depois da mudança não a perde
+QUERY_CONCLUIR_COBRANCA = f"""
+    WITH concluida AS (
+        DELETE FROM fila_cobrancas
+            WHERE id = $1
+            RETURNING id, ciclista, valor, enfileirada_em
+    ),
+    notificacao AS (
+        INSERT INTO notificacoes_cobranca(ciclista, cobranca_id, status, valor, hora_registro)
+            SELECT ciclista, id, 'FINALIZADA', valor, NOW()
+            FROM concluida
+            WHERE $2::boolean
+    )
+    INSERT INTO cobrancas(id, status, hora_solicitacao, hora_finalizacao, valor, ciclista)
+        SELECT id, 'FINALIZADA', enfileirada_em, NOW(), valor, ciclista
+        FROM concluida
+        RETURNING id, status, {COBRANCA_JSON};
+"""
+
+# Backoff exponencial com jitter (metade fixa, metade aleatória) limitado a $3 segundos, pelas
+# tentativas (inclusive as sem resposta do gateway). $5 é 1 quando o gateway recusou o
+# pagamento; não devolve nada quando essa recusa esgota as $4 permitidas
+QUERY_REAGENDAR_COBRANCA = """
+    UPDATE fila_cobrancas
+        SET lease_ate = NULL,
+            recusas = recusas + $5,
+            proxima_tentativa = NOW() + make_interval(
+                secs => LEAST($2 * power(2, LEAST(tentativas - 1, 30)), $3) * (0.5 + random() * 0.5))
+        WHERE id = $1 AND recusas + $5 < $4
+        RETURNING id;
+"""
+
+# Cobrança que esgotou as recusas sai da fila e entra no histórico como FALHA, com o mesmo id
+# e, com $2, a notificação registrada no mesmo comando
+QUERY_DESCARTAR_COBRANCA = """
+    WITH descartada AS (
+        DELETE FROM fila_cobrancas
+            WHERE id = $1
+            RETURNING id, ciclista, valor, enfileirada_em
+    ),
+    notificacao AS (
+        INSERT INTO notificacoes_cobranca(ciclista, cobranca_id, status, valor, hora_registro)
+            SELECT ciclista, id, 'FALHA', valor, NOW()
+            FROM descartada
+            WHERE $2::boolean
+    )
+    INSERT INTO cobrancas(id, status, hora_solicitacao, hora_finalizacao, valor, ciclista)
+        SELECT id, 'FALHA', enfileirada_em, NOW(), valor, ciclista
+        FROM descartada
+        RETURNING id;
+"""
+
+QUERY_NOTIFICACAO_COBRANCA = """
+    INSERT INTO notificacoes_cobranca(ciclista, cobranca_id, status, valor, hora_registro)
+        VALUES($1, $2, $3, $4, NOW());
+"""
+
+# Namespace do advisory lock por ciclista (a segunda chave é o id do ciclista); o lock é de
+# transação para funcionar também atrás do PgBouncer em transaction pooling
+COBRANCA_LOCK = 7_310_033
+
+QUERY_TRAVAR_CICLISTA = """
+    SELECT pg_advisory_xact_lock($1, $2);
+"""
+
+QUERY_RESTAURAR_BANCO = """
+    TRUNCATE TABLE cobrancas, fila_cobrancas RESTART IDENTITY CASCADE;
+"""
+
+
+
+def referencia_pagamento(cobranca_id: int) -> str:
+    """Referência externa do pagamento de uma cobrança no gateway, a mesma em todas as tentativas."""
+    return f"cobranca-{cobranca_id}"
+
+
+def recusa_definitiva(pagamento: dict) -> bool:
+    """
+    Se um pagamento que não foi aprovado foi recusado de fato. Pagamento em análise e erros
+    transitórios (código 5xx: gateway, consulta ou serviço de ciclistas fora do ar) não são
+    recusas: o pagamento pode ter sido ou ainda ser aprovado.
+    """
+    return not pagamento.get("pendente") and (pagamento.get("codigo") or 400) < 500
 
 
 class AsyncpgManager:
-    def __init__(self):
+    def __init__(self, dsn: Optional[str] = DB_URL, pgbouncer: bool = DB_PGBOUNCER, read_dsn: Optional[str] = DB_READ_URL):
+        self.dsn = dsn
+        self.pgbouncer = pgbouncer
+        self.read_dsn = read_dsn
         self.pool: Optional[asyncpg.pool.Pool] = None
+        self.read_pool: Optional[asyncpg.pool.Pool] = None
+        # id -> instante até o qual leituras desse id vão para o primário
+        self._escritas_recentes: OrderedDict[int, float] = OrderedDict()
+        # ciclista -> (lock, requisições usando ou aguardando o lock)
+        self._travas_ciclistas: dict[int, tuple[asyncio.Lock, int]] = {}
+        self._exportacoes_primario = asyncio.Semaphore(EXPORTACAO_CONCORRENCIA)
+        # Último ciclista atendido pela fila; a próxima reivindicação começa depois dele
+        self._cursor_fila: Optional[int] = None
+
+    def _opcoes_pool(self, dsn: str) -> dict:
+        opcoes = {
+            "dsn": dsn,
+            "min_size": DB_POOL_MIN_SIZE,
+            "max_size": DB_POOL_MAX_SIZE,
+            "max_queries": DB_POOL_MAX_QUERIES,
+            "max_inactive_connection_lifetime": DB_POOL_MAX_INACTIVE_LIFETIME,
+            "command_timeout": DB_COMMAND_TIMEOUT,
+        }
+
+        if self.pgbouncer:
+            # Em transaction pooling cada transação pode cair num backend diferente, então
+            # statements nomeados somem entre uma consulta e outra. Sem cache o asyncpg usa
+            # apenas statements sem nome, que vivem dentro do próprio comando. O PgBouncer
+            # também recusa parâmetros de inicialização desconhecidos, como statement_timeout.
+            return {**opcoes, "statement_cache_size": 0}
+
+        # create_pool só retorna depois de abrir as min_size conexões, então a primeira
+        # requisição não paga a conexão; cada consulta é preparada no primeiro uso e fica no
+        # cache de statements da conexão
+        return {
+            **opcoes,
+            "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+            "server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT)} if DB_STATEMENT_TIMEOUT else None,
+        }
 
     async def connect(self):
         if self.pool is None:
-            self.pool = await asyncpg.create_pool(dsn=DB_URL)
+            self.pool = await asyncpg.create_pool(**self._opcoes_pool(self.dsn))
+
+        if self.read_dsn and self.read_pool is None:
+            try:
+                self.read_pool = await asyncpg.create_pool(**self._opcoes_pool(self.read_dsn))
+            except ERROS_REPLICA as e:
+                if not DB_READ_FALLBACK:
+                    raise
+                print(f"Réplica de leitura indisponível, lendo do primário: {e}")
 
     async def disconnect(self):
         if self.pool is not None:
             await self.pool.close()
+        if self.read_pool is not None:
+            await self.read_pool.close()
+            self.read_pool = None
 
-    async def realizar_cobranca(self, cobranca: dict) -> dict:
-        cobranca_pendente_query = """
-            INSERT INTO cobrancas(status, hora_solicitacao, hora_finalizacao, valor, ciclista)
-                VALUES(
-                      'PENDENTE',
-                    NOW(),
-                    NULL,
-                    $1,
-                    $2
-                ) RETURNING id;
-        """
+    def _registrar_escrita(self, cobranca_id: int):
+        cobranca_cache_instance.invalidar(cobranca_id)
+
+        if not DB_READ_YOUR_WRITES:
+            return
+
+        agora = time.monotonic()
+        # A janela é fixa, então as entradas expiram na ordem de inserção
+        while self._escritas_recentes and next(iter(self._escritas_recentes.values())) <= agora:
+            self._escritas_recentes.popitem(last=False)
+
+        self._escritas_recentes.pop(cobranca_id, None)
+        self._escritas_recentes[cobranca_id] = agora + DB_READ_YOUR_WRITES
 
-        cobranca_finalizada_query = """
-            UPDATE cobrancas
-                SET status = 'FINALIZADA',
-                    hora_finalizacao = NOW()
-                WHERE id = $1
-                RETURNING status, hora_solicitacao, hora_finalizacao, valor, ciclista, id;
+    def _escrita_recente(self, cobranca_id: int) -> bool:
+        expira = self._escritas_recentes.get(cobranca_id)
+        return expira is not None and expira > time.monotonic()
+
+    async def _fetchrow_leitura(self, query: str, *args, cobranca_id: Optional[int] = None):
         """
+        Executa uma leitura na réplica quando houver uma, ou no primário.
 
-        cobranca_falha_query = """
-            UPDATE cobrancas
-                SET status           = 'FALHA', 
-                    hora_finalizacao = NOW()
-                WHERE id = $1; 
+        Vão para o primário as leituras de cobranças escritas nos últimos
+        ``DB_READ_YOUR_WRITES`` segundos, e com ``DB_READ_FALLBACK`` também as leituras
+        feitas enquanto a réplica está inacessível. Um registro não encontrado na
+        réplica é confirmado no primário, para que o atraso de replicação não vire 404.
         """
+        if self.read_pool is not None and not (cobranca_id is not None and self._escrita_recente(cobranca_id)):
+            try:
+                async with self.read_pool.acquire() as connection:
+                    registro = await connection.fetchrow(query, *args)
+                if registro is not None:
+                    return registro
+            except ERROS_REPLICA as e:
+                if not DB_READ_FALLBACK:
+                    raise
+                print(f"Falha na réplica de leitura, usando o primário: {e}")
+
+        async with self.pool.acquire() as connection:
+            return await connection.fetchrow(query, *args)
+
+    async def _fetch_leitura(self, query: str, *args) -> list:
+        if self.read_pool is not None:
+            try:
+                async with self.read_pool.acquire() as connection:
+                    return await connection.fetch(query, *args)
+            except ERROS_REPLICA as e:
+                if not DB_READ_FALLBACK:
+                    raise
+                print(f"Falha na réplica de leitura, usando o primário: {e}")
+
+        async with self.pool.acquire() as connection:
+            return await connection.fetch(query, *args)
+
+    @asynccontextmanager
+    async def _travar_ciclista(self, ciclista: int):
+        # Cobranças concorrentes do mesmo ciclista nesta réplica esperam aqui, sem ocupar
+        # uma conexão do pool bloqueada no advisory lock; ciclistas diferentes não se bloqueiam
+        trava, usos = self._travas_ciclistas.get(ciclista, (asyncio.Lock(), 0))
+        self._travas_ciclistas[ciclista] = (trava, usos + 1)
 
+        try:
+            async with trava:
+                yield
+        finally:
+            trava, usos = self._travas_ciclistas[ciclista]
+            if usos == 1:
+                del self._travas_ciclistas[ciclista]
+            else:
+                self._travas_ciclistas[ciclista] = (trava, usos - 1)
+
+    async def realizar_cobranca(self, cobranca: dict, chave_idempotencia: Optional[str] = None) -> dict:
         cobranca_pendente_id = None
+        # Depois da aprovação no gateway a cobrança só pode terminar FINALIZADA, mesmo se o commit falhar
+        aprovada = False
 
         try:
+            async with self._travar_ciclista(cobranca["ciclista"]):
+                cartao = await ciclista_instance.obter_cartao(cobranca["ciclista"])
+                if not cartao["status"]:
+                    return {"status": False, "codigo": cartao.get("codigo"), "mensagem": cartao["mensagem"]}
 
-            cartao = await ciclista_instance.obter_cartao(cobranca["ciclista"])
-            if not cartao["status"]:
-                return {"status": False, "mensagem": cartao["mensagem"]}
+                async with self.pool.acquire() as connection:
+                    # A cobrança pendente é gravada antes do lock: se o processo cair durante o
+                    # pagamento, ela continua registrada
+                    cobranca_pendente_id = await connection.fetchval(QUERY_COBRANCA_PENDENTE, cobranca["valor"], cobranca["ciclista"])
+                    self._registrar_escrita(cobranca_pendente_id)
 
-            async with self.pool.acquire() as connection:
-                cobranca_pendente_id = await connection.fetchval(cobranca_pendente_query, cobranca["valor"], cobranca["ciclista"])
+                    # Serializa o pagamento com as cobranças do mesmo ciclista nas outras réplicas
+                    async with connection.transaction():
+                        await connection.execute(QUERY_TRAVAR_CICLISTA, COBRANCA_LOCK, cobranca["ciclista"])
 
-                pagamento = await mercado_pago_instance.realiza_pagamento(cartao["data"], cobranca["valor"])
+                        pagamento = await mercado_pago_instance.realiza_pagamento(cartao["data"], cobranca["valor"], chave_idempotencia,
+                                                                                  referencia_pagamento(cobranca_pendente_id))
+                        aprovada = pagamento["status"]
 
-                if pagamento["status"]:
-                    cobranca_finalizada = await connection.fetchrow(cobranca_finalizada_query, cobranca_pendente_id)
-                    return {"status": True, "data": {**cobranca_finalizada, "hora_solicitacao": cobranca_finalizada["hora_solicitacao"].isoformat() if cobranca_finalizada["hora_solicitacao"] else None,
-                                                     "hora_finalizacao": cobranca_finalizada["hora_finalizacao"].isoformat() if cobranca_finalizada["hora_finalizacao"] else None,
-                                                     "valor": float(cobranca_finalizada["valor"])}}
-                else:
-                    await connection.execute(cobranca_falha_query, cobranca_pendente_id)
-                    return {"status": False, "mensagem": pagamento["mensagem"]}
+                        if aprovada:
+                            cobranca_finalizada = await connection.fetchrow(QUERY_COBRANCA_FINALIZADA, cobranca_pendente_id)
+                        else:
+                            await connection.execute(QUERY_COBRANCA_FALHA, cobranca_pendente_id)
+
+                    # Cache e NOTIFY só depois do commit, para nenhuma réplica ler o estado anterior
+                    self._registrar_escrita(cobranca_pendente_id)
+                    await invalidacao_instance.publicar("cobranca", [cobranca_pendente_id], connection)
+
+            if aprovada:
+                return {"status": True, "data": Cobranca.de_registro(cobranca_finalizada)}
+            return {"status": False, "codigo": pagamento.get("codigo"), "mensagem": pagamento["mensagem"]}
 
         except Exception as e:
             print(e)
             if cobranca_pendente_id:
                 async with self.pool.acquire() as connection:
-                    await connection.execute(cobranca_falha_query, cobranca_pendente_id)
-            return {"status": False, "mensagem": "Erro ao processar a cobrança"}
+                    if aprovada:
+                        cobranca_finalizada = await connection.fetchrow(QUERY_COBRANCA_FINALIZADA, cobranca_pendente_id)
+                    else:
+                        await connection.execute(QUERY_COBRANCA_FALHA, cobranca_pendente_id)
+                    self._registrar_escrita(cobranca_pendente_id)
+                    await invalidacao_instance.publicar("cobranca", [cobranca_pendente_id], connection)
+
+                if aprovada:
+                    return {"status": True, "data": Cobranca.de_registro(cobranca_finalizada)}
+
+            # Erro transitório: 5xx para que o cliente possa repetir com a mesma Idempotency-Key
+            return {"status": False, "codigo": 500, "mensagem": "Erro ao processar a cobrança"}
 
     async def get_cobranca_by_id(self, cobranca_id: int) -> dict:
-        query = """
-            SELECT id, status, hora_solicitacao, hora_finalizacao, valor, ciclista
+        try:
+            cobranca = await self._fetchrow_leitura(QUERY_COBRANCA_POR_ID, cobranca_id, cobranca_id=cobranca_id)
+
+            if cobranca:
+                return {"status": True, "data": Cobranca.de_registro(cobranca)}
+            else:
+                return {"status": False, "mensagem": "Cobrança não encontrada"}
+
+        except Exception as e:
+            print(e)
+            return {"status": False, "mensagem": "Erro ao buscar a cobrança"}
+
+    async def get_cobrancas_by_ids(self, cobranca_ids: list[int]) -> dict:
+        # Mesmas regras da consulta por id: recém-escritas e ausentes na réplica vêm do primário
+        recentes = [cobranca_id for cobranca_id in cobranca_ids if self._escrita_recente(cobranca_id)]
+        demais = [cobranca_id for cobranca_id in cobranca_ids if not self._escrita_recente(cobranca_id)]
+
+        try:
+            rows = list(await self._fetch_leitura(QUERY_COBRANCAS_POR_IDS, demais)) if demais else []
+
+            if self.read_pool is not None:
+                encontradas = {row["id"] for row in rows}
+                recentes += [cobranca_id for cobranca_id in demais if cobranca_id not in encontradas]
+
+            if recentes:
+                async with self.pool.acquire() as connection:
+                    rows += await connection.fetch(QUERY_COBRANCAS_POR_IDS, recentes)
+
+            return {"status": True, "data": [Cobranca.de_registro(row) for row in rows]}
+
+        except Exception as e:
+            print(e)
+            return {"status": False, "mensagem": "Erro ao buscar as cobranças"}
+
+    def _query_listagem(self, ciclista: Optional[int], status: Optional[str], desde: Optional[datetime],
+                        ate: Optional[datetime], after_id: Optional[int], limite: int) -> tuple[str, list]:
+        # Só entram na consulta os filtros informados, para cada combinação ter um plano
+        # próprio que use o índice certo (um "$1 IS NULL OR ..." genérico impediria isso)
+        args = []
+
+        def parametro(valor) -> str:
+            args.append(valor)
+            return f"${len(args)}"
+
+        condicoes = []
+        if ciclista is not None:
+            condicoes.append(f"ciclista = {parametro(ciclista)}")
+        if desde is not None:
+            condicoes.append(f"{{hora}} >= {parametro(desde)}")
+        if ate is not None:
+            condicoes.append(f"{{hora}} < {parametro(ate)}")
+        if after_id is not None:
+            condicoes.append(f"id < {parametro(after_id)}")
+        limite_param = parametro(limite + 1)
+
+        def where(hora: str, extra: Optional[str] = None) -> str:
+            todas = [condicao.format(hora=hora) for condicao in condicoes] + ([extra] if extra else [])
+            return f"WHERE {' AND '.join(todas)}" if todas else ""
+
+        historico = f"""
+            SELECT id, {COBRANCA_JSON}
             FROM cobrancas
-            WHERE id = $1;
+            {where("hora_solicitacao", f"status = {parametro(status)}" if status not in (None, "EM_FILA") else None)}
+            ORDER BY id DESC
+            LIMIT {limite_param}
+        """
+
+        fila = f"""
+            SELECT id, {FILA_COBRANCA_JSON}
+            FROM fila_cobrancas
+            {where("enfileirada_em")}
+            ORDER BY id DESC
+            LIMIT {limite_param}
+        """
+
+        if status == "EM_FILA":
+            return fila, args
+        if status is not None:
+            return historico, args
+
+        return f"SELECT * FROM (({historico}) UNION ALL ({fila})) AS cobrancas ORDER BY id DESC LIMIT {limite_param};", args
+
+    async def listar_cobrancas(self, ciclista: Optional[int] = None, status: Optional[str] = None, desde: Optional[datetime] = None,
+                               ate: Optional[datetime] = None, after_id: Optional[int] = None, limite: int = 50) -> dict:
         """
+        Lista cobranças das mais recentes para as mais antigas, paginando por id.
+
+        ``after_id`` é o cursor devolvido pela página anterior; a consulta parte dele pelo
+        índice em vez de pular linhas com OFFSET, então qualquer página custa o mesmo que a primeira.
+        """
+        query, args = self._query_listagem(ciclista, status, desde, ate, after_id, limite)
 
         try:
-            async with self.pool.acquire() as connection:
-                cobranca = await connection.fetchrow(query, cobranca_id)
+            rows = await self._fetch_leitura(query, *args)
 
-                if cobranca:
-                    return {"status": True, "data": {**cobranca, "hora_solicitacao": cobranca["hora_solicitacao"].isoformat() if cobranca["hora_solicitacao"] else None,
-                                                     "hora_finalizacao": cobranca["hora_finalizacao"].isoformat() if cobranca["hora_finalizacao"] else None,
-                                                     "valor": float(cobranca["valor"])}}
-                else:
-                    return {"status": False, "mensagem": "Cobrança não encontrada"}
+            cobrancas = [row["json"] for row in rows[:limite]]
+            proximo = rows[limite - 1]["id"] if len(rows) > limite else None
+
+            return {"status": True, "data": {"cobrancas": cobrancas, "proximo": proximo}}
 
         except Exception as e:
             print(e)
-            return {"status": False, "mensagem": "Erro ao buscar a cobrança"}
-
-    async def colocar_cobranca_na_fila(self, cobranca: dict) -> dict:
-        query = """
-            INSERT INTO cobrancas(status, hora_solicitacao, hora_finalizacao, valor, ciclista)
-                VALUES(
-                      'EM_FILA',
-                    NOW(),
-                    NULL,
-                    $1,
-                    $2
-                ) RETURNING id, status, hora_solicitacao, hora_finalizacao, valor, ciclista;
+            return {"status": False, "mensagem": "Erro ao listar as cobranças"}
+
+    def _query_exportacao(self, formato: str, ciclista: Optional[int], status: Optional[str], desde: Optional[datetime],
+                          ate: Optional[datetime]) -> tuple[str, list]:
+        args = []
+
+        def parametro(valor) -> str:
+            args.append(valor)
+            return f"${len(args)}"
+
+        hora = "enfileirada_em" if status == "EM_FILA" else "hora_solicitacao"
+        condicoes = []
+        if ciclista is not None:
+            condicoes.append(f"ciclista = {parametro(ciclista)}")
+        if status not in (None, "EM_FILA"):
+            condicoes.append(f"status = {parametro(status)}")
+        if desde is not None:
+            condicoes.append(f"{hora} >= {parametro(desde)}")
+        if ate is not None:
+            condicoes.append(f"{hora} < {parametro(ate)}")
+        where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+
+        # O NDJSON já sai do banco com uma linha de JSON por cobrança
+        if status == "EM_FILA":
+            colunas = FILA_COBRANCA_JSON if formato == "ndjson" else \
+                "id, 'EM_FILA' AS status, enfileirada_em AS hora_solicitacao, NULL::timestamp AS hora_finalizacao, valor, ciclista"
+            query = f"""
+                SELECT {colunas}
+                FROM fila_cobrancas
+                {where}
+                ORDER BY id
+            """
+        else:
+            colunas = COBRANCA_JSON if formato == "ndjson" else "id, status, hora_solicitacao, hora_finalizacao, valor, ciclista"
+            query = f"""
+                SELECT {colunas}
+                FROM cobrancas
+                {where}
+                ORDER BY id
+            """
+
+        return query, args
+
+    async def _exportar_csv(self, connection, query: str, args: list) -> AsyncIterator[bytes]:
+        # O COPY escreve numa fila limitada: se o cliente lê devagar, o COPY espera em vez
+        # de acumular o resultado em memória
+        fila = asyncio.Queue(maxsize=EXPORTACAO_BUFFER)
+
+        async def escrever(dados: bytes):
+            await fila.put(bytes(dados))
+
+        async def copiar():
+            try:
+                await connection.copy_from_query(query, *args, output=escrever, format="csv", header=True)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                await fila.put(None)
+                raise
+            await fila.put(None)
+
+        tarefa = asyncio.create_task(copiar())
+        try:
+            while (dados := await fila.get()) is not None:
+                yield dados
+            await tarefa
+        finally:
+            if not tarefa.done():
+                tarefa.cancel()
+                await asyncio.gather(tarefa, return_exceptions=True)
+
+    async def _exportar_ndjson(self, connection, query: str, args: list) -> AsyncIterator[bytes]:
+        linhas = []
+        async with connection.transaction(readonly=True):
+            async for row in connection.cursor(query, *args, prefetch=EXPORTACAO_PREFETCH):
+                linhas.append(row["json"])
+                if len(linhas) >= EXPORTACAO_PREFETCH:
+                    yield b"\n".join(linhas) + b"\n"
+                    linhas = []
+
+        if linhas:
+            yield b"\n".join(linhas) + b"\n"
+
+    async def exportar_cobrancas(self, formato: str, ciclista: Optional[int] = None, status: Optional[str] = None,
+                                 desde: Optional[datetime] = None, ate: Optional[datetime] = None) -> AsyncIterator[bytes]:
+        """
+        Exporta cobranças em ordem de id como CSV (``COPY ... TO STDOUT``) ou NDJSON
+        (cursor no servidor), em pedaços de bytes.
+
+        Só um pedaço por vez fica em memória, qualquer que seja o período exportado. Sem
+        ``status`` o histórico (``cobrancas``) é exportado; ``EM_FILA`` exporta a fila.
+        A leitura vai para a réplica quando houver uma; no primário, no máximo
+        ``EXPORTACAO_CONCORRENCIA`` exportações ocupam conexões ao mesmo tempo e as demais
+        esperam a vez, para que downloads lentos não esgotem o pool das cobranças.
+        """
+        query, args = self._query_exportacao(formato, ciclista, status, desde, ate)
+        pool = self.read_pool if self.read_pool is not None else self.pool
+        limite = self._exportacoes_primario if pool is self.pool else nullcontext()
+
+        async with limite, pool.acquire() as connection:
+            pedacos = self._exportar_csv(connection, query, args) if formato == "csv" else self._exportar_ndjson(connection, query, args)
+            # Fecha a exportação antes de devolver a conexão, mesmo se o cliente desconectar
+            async with aclosing(pedacos):
+                async for pedaco in pedacos:
+                    yield pedaco
+
+    def _prioridade(self, valor: float) -> int:
+        if FILA_COBRANCAS_VALOR_PRIORITARIO and valor >= FILA_COBRANCAS_VALOR_PRIORITARIO:
+            return PRIORIDADE_ALTA
+        return PRIORIDADE_NORMAL
+
+    async def colocar_cobranca_na_fila(self, cobranca: dict,
+                                       ao_enfileirar: Optional[Callable[[asyncpg.Connection, Cobranca], Awaitable]] = None) -> dict:
         """
+        Enfileira uma cobrança.
 
+        ``ao_enfileirar`` roda na mesma transação do INSERT, com a cobrança já enfileirada:
+        o que ele gravar só fica no banco junto com a cobrança.
+        """
         try:
 
             cartao = await ciclista_instance.obter_cartao(cobranca["ciclista"])
             if not cartao["status"]:
-                return {"status": False, "mensagem": cartao["mensagem"]}
+                return {"status": False, "codigo": cartao.get("codigo"), "mensagem": cartao["mensagem"]}
 
             async with self.pool.acquire() as connection:
-                cobranca = await connection.fetchrow(query, cobranca["valor"], cobranca["ciclista"])
-                return {"status": True, "data": {**cobranca, "hora_solicitacao": cobranca["hora_solicitacao"].isoformat() if cobranca["hora_solicitacao"] else None,
-                                                 "hora_finalizacao": cobranca["hora_finalizacao"].isoformat() if cobranca["hora_finalizacao"] else None,
-                                                 "valor": float(cobranca["valor"])}}
+                async with connection.transaction():
+                    registro = await connection.fetchrow(QUERY_ENFILEIRAR_COBRANCA, cobranca["valor"], cobranca["ciclista"],
+                                                         self._prioridade(cobranca["valor"]))
+                    enfileirada = Cobranca.de_registro(registro)
+                    if ao_enfileirar is not None:
+                        await ao_enfileirar(connection, enfileirada)
+
+                self._registrar_escrita(enfileirada.id)
+                return {"status": True, "data": enfileirada}
 
         except Exception as e:
             print(e)
-            return {"status": False, "mensagem": "Erro ao colocar a cobrança na fila"}
+            return {"status": False, "codigo": 500, "mensagem": "Erro ao colocar a cobrança na fila"}
 
-    async def processar_fila_cobrancas(self):
-        query_select = """
-            SELECT id, valor, ciclista
-            FROM cobrancas
-            WHERE status = 'EM_FILA'
-            ORDER BY hora_solicitacao;
-        """
+    async def _obter_cartoes(self, ciclistas: list[int]) -> dict[int, dict]:
+        semaforo = asyncio.Semaphore(CICLISTA_CONCORRENCIA)
+
+        async def obter(ciclista: int) -> dict:
+            async with semaforo:
+                return await ciclista_instance.obter_cartao(ciclista)
+
+        cartoes = await asyncio.gather(*(obter(ciclista) for ciclista in ciclistas))
+        return dict(zip(ciclistas, cartoes))
 
-        query_update = """
-            UPDATE cobrancas
-                SET status = 'FINALIZADA',
-                    hora_finalizacao = NOW()
-                WHERE id = $1
-                RETURNING status, hora_solicitacao, hora_finalizacao, valor, ciclista, id;
+    async def colocar_cobrancas_na_fila(self, cobrancas: list[dict]) -> dict:
         """
+        Enfileira várias cobranças com um único COPY.
 
+        O cartão de cada ciclista distinto é verificado uma vez, em paralelo; cobranças
+        de ciclistas sem cartão são devolvidas em ``rejeitadas`` e as demais entram na fila.
+        """
         try:
-            async with self.pool.acquire() as connection:
-                rows = await connection.fetch(query_select)
+            cartoes = await self._obter_cartoes(list(dict.fromkeys(cobranca["ciclista"] for cobranca in cobrancas)))
+
+            aceitas = []
+            rejeitadas = []
+            for indice, cobranca in enumerate(cobrancas):
+                cartao = cartoes[cobranca["ciclista"]]
+                if cartao["status"]:
+                    aceitas.append(cobranca)
+                else:
+                    rejeitadas.append({"indice": indice, "ciclista": cobranca["ciclista"], "mensagem": cartao["mensagem"]})
 
-                lista_cobrancas = [{**row} for row in rows]
-                processadas = []
+            registros = []
+            if aceitas:
+                async with self.pool.acquire() as connection:
+                    async with connection.transaction():
+                        reservas = await connection.fetch(QUERY_RESERVAR_IDS_FILA, len(aceitas))
+                        registros = [(reserva["id"], cobranca["ciclista"], Decimal(str(cobranca["valor"])), reserva["enfileirada_em"],
+                                      self._prioridade(cobranca["valor"]))
+                                     for reserva, cobranca in zip(reservas, aceitas)]
+                        await connection.copy_records_to_table("fila_cobrancas", records=registros,
+                                                               columns=["id", "ciclista", "valor", "enfileirada_em", "prioridade"])
+
+                for registro in registros:
+                    self._registrar_escrita(registro[0])
+
+            enfileiradas = [{"id": id_, "status": "EM_FILA", "hora_solicitacao": enfileirada_em, "hora_finalizacao": None,
+                             "valor": valor, "ciclista": ciclista} for id_, ciclista, valor, enfileirada_em, _ in registros]
+
+            return {"status": True, "data": {"enfileiradas": enfileiradas, "rejeitadas": rejeitadas}}
+
+        except Exception as e:
+            print(e)
+            return {"status": False, "mensagem": "Erro ao colocar as cobranças na fila"}
 
-                for cobranca in lista_cobrancas:
-                    cartao = await ciclista_instance.obter_cartao(cobranca["ciclista"])
+    async def processar_fila_cobrancas(self, notificar: Optional[bool] = None):
+        if notificar is None:
+            notificar = NOTIFICAR_COBRANCAS
 
-                    pagamento = await mercado_pago_instance.realiza_pagamento(cartao["data"], cobranca["valor"])
+        try:
+            async with self.pool.acquire() as connection:
+                processadas = []
 
-                    if pagamento["status"]:
-                        cobranca_finalizada = await connection.fetchrow(query_update, cobranca["id"])
-                        processadas.append({**cobranca_finalizada, "hora_solicitacao": cobranca_finalizada["hora_solicitacao"].isoformat() if cobranca_finalizada["hora_solicitacao"] else None,
-                                            "hora_finalizacao": cobranca_finalizada["hora_finalizacao"].isoformat() if cobranca_finalizada["hora_finalizacao"] else None,
-                                            "valor": float(cobranca_finalizada["valor"])})
+                # Cobranças recusadas são reagendadas para depois do backoff, então cada rodada
+                # deste laço pega cobranças diferentes
+                while rows := await connection.fetch(QUERY_REIVINDICAR_COBRANCAS, FILA_COBRANCAS_LOTE, FILA_COBRANCAS_LEASE,
+                                                        FILA_COBRANCAS_MAX_TENTATIVAS, FILA_COBRANCAS_JANELA,
+                                                        FILA_COBRANCAS_PESO_PRIORIDADE, self._cursor_fila):
+                    # O rodízio segue do ciclista atendido mais adiante na ordem da reivindicação
+                    cursor = self._cursor_fila
+                    self._cursor_fila = max((row["ciclista"] for row in rows),
+                                            key=lambda ciclista: (cursor is not None and ciclista <= cursor, ciclista))
+
+                    alteradas = []
+                    try:
+                        await self._processar_lote(connection, rows, notificar, processadas, alteradas)
+                    finally:
+                        # Publicado a cada lote, inclusive quando ele é interrompido: as cobranças já
+                        # movidas não ficam com a versão antiga no cache das outras réplicas
+                        await invalidacao_instance.publicar("cobranca", alteradas, connection)
 
                 return {"status": True, "data": processadas}
 
@@ -170,14 +832,67 @@ class AsyncpgManager:
             print(e)
             return {"status": False, "mensagem": "Erro ao processar a fila de cobranças"}
 
-    async def restaurar_banco(self) -> dict:
-        query = """
-            TRUNCATE TABLE cobrancas RESTART IDENTITY CASCADE;
-        """
+    async def _processar_lote(self, connection, rows: list, notificar: bool, processadas: list, alteradas: list):
+        """Paga as cobranças de um lote reivindicado, anotando em ``alteradas`` as que saíram da fila."""
+        for cobranca in rows:
+            renovada = await connection.fetchval(QUERY_RENOVAR_LEASE, cobranca["id"], FILA_COBRANCAS_LEASE,
+                                                 cobranca["tentativas"])
+            if renovada is None:
+                continue
+
+            referencia = referencia_pagamento(cobranca["id"])
+            pagamento = None
+
+            # Uma tentativa anterior pode ter sido aprovada sem a resposta chegar aqui
+            if cobranca["tentativas"] > 1:
+                anterior = await mercado_pago_instance.consultar_pagamento(referencia)
+                if not anterior["status"]:
+                    pagamento = anterior
+                elif anterior["data"] == "aprovado":
+                    pagamento = {"status": True}
+                elif anterior["data"] == "pendente":
+                    pagamento = {"status": False, "pendente": True, "mensagem": "Pagamento anterior em análise"}
+
+            if pagamento is None:
+                cartao = await ciclista_instance.obter_cartao(cobranca["ciclista"])
+
+                if cartao["status"]:
+                    # Chave por tentativa: repetir a mesma tentativa não cobra duas vezes
+                    pagamento = await mercado_pago_instance.realiza_pagamento(
+                        cartao["data"], cobranca["valor"], f"fila-{cobranca['id']}-{cobranca['tentativas']}", referencia)
+                else:
+                    pagamento = {"status": False, "codigo": cartao.get("codigo"), "mensagem": cartao["mensagem"]}
+
+            if pagamento["status"]:
+                cobranca_finalizada = await connection.fetchrow(QUERY_CONCLUIR_COBRANCA, cobranca["id"], notificar)
+                if cobranca_finalizada is None:
+                    # O lease expirou durante o pagamento e a varredura já a moveu para o histórico como FALHA
+                    async with connection.transaction():
+                        cobranca_finalizada = await connection.fetchrow(QUERY_COBRANCA_FINALIZADA, cobranca["id"])
+                        if notificar:
+                            await connection.execute(QUERY_NOTIFICACAO_COBRANCA, cobranca["ciclista"], cobranca["id"],
+                                                     "FINALIZADA", cobranca["valor"])
+
+                self._registrar_escrita(cobranca["id"])
+                alteradas.append(cobranca["id"])
+                processadas.append(Cobranca.de_registro(cobranca_finalizada))
+            else:
+                recusada = recusa_definitiva(pagamento)
+                reagendada = await connection.fetchval(QUERY_REAGENDAR_COBRANCA, cobranca["id"], FILA_COBRANCAS_ATRASO_RETENTATIVA,
+                                                       FILA_COBRANCAS_ATRASO_MAX, FILA_COBRANCAS_MAX_TENTATIVAS, int(recusada))
+                # Só uma recusa do gateway descarta a cobrança: sem resposta definitiva o
+                # pagamento pode ter sido aprovado, e ela continua na fila
+                if reagendada is None and recusada:
+                    await connection.execute(QUERY_DESCARTAR_COBRANCA, cobranca["id"], notificar)
+                    self._registrar_escrita(cobranca["id"])
+                    alteradas.append(cobranca["id"])
 
+    async def restaurar_banco(self) -> dict:
         try:
             async with self.pool.acquire() as connection:
-                await connection.execute(query)
+                await connection.execute(QUERY_RESTAURAR_BANCO)
+                # Os ids recomeçam do 1; nada do cache continua valendo em nenhuma réplica
+                await invalidacao_instance.publicar("cobranca", ["*"], connection)
                 return {"status": True, "mensagem": "Banco de dados restaurado com sucesso"}
 
         except Exception as e:
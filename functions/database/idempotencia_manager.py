@@ -0,0 +1,204 @@
+import asyncio
+import hashlib
+import os
+from typing import Awaitable, Callable, Optional
+
+from dotenv import load_dotenv
+from starlette.responses import Response
+
+from functions.database.asyncpg_manager import asyncpg_manager
+from functions.serializacao.serializador import serializar
+
+load_dotenv()
+
+IDEMPOTENCIA_TTL = float(os.getenv("IDEMPOTENCIA_TTL", 86400))
+IDEMPOTENCIA_LEASE = float(os.getenv("IDEMPOTENCIA_LEASE", 60))
+IDEMPOTENCIA_ESPERA = float(os.getenv("IDEMPOTENCIA_ESPERA", 30))
+IDEMPOTENCIA_INTERVALO = float(os.getenv("IDEMPOTENCIA_INTERVALO", 0.2))
+
+# Reserva a chave; uma resposta expirada ou uma reserva abandonada (réplica que caiu
+# no meio da requisição) é tomada pela nova requisição
+QUERY_RESERVAR_CHAVE = """
+    INSERT INTO idempotencia(rota, chave, impressao, criada_em)
+        VALUES($1, $2, $3, NOW())
+        ON CONFLICT (rota, chave) DO UPDATE
+            SET impressao = EXCLUDED.impressao, status_code = NULL, corpo = NULL, criada_em = NOW()
+            WHERE idempotencia.criada_em < NOW() - make_interval(secs => CASE WHEN idempotencia.status_code IS NULL
+                                                                             THEN $4::float8 ELSE $5::float8 END)
+        RETURNING chave;
+"""
+
+QUERY_BUSCAR_CHAVE = """
+    SELECT impressao, status_code, corpo
+    FROM idempotencia
+    WHERE rota = $1 AND chave = $2;
+"""
+
+# Só conclui uma reserva em andamento: a resposta já gravada na transação da própria
+# operação (como em /filaCobranca) não é sobrescrita
+QUERY_CONCLUIR_CHAVE = """
+    UPDATE idempotencia
+        SET status_code = $3, corpo = $4
+        WHERE rota = $1 AND chave = $2 AND status_code IS NULL;
+"""
+
+QUERY_RENOVAR_CHAVE = """
+    UPDATE idempotencia
+        SET criada_em = NOW()
+        WHERE rota = $1 AND chave = $2 AND status_code IS NULL;
+"""
+
+QUERY_LIBERAR_CHAVE = """
+    DELETE FROM idempotencia
+        WHERE rota = $1 AND chave = $2 AND status_code IS NULL;
+"""
+
+
+class IdempotenciaManager:
+    """
+    Respostas idempotentes pelo header ``Idempotency-Key``.
+
+    A primeira requisição com uma chave a reserva em ``idempotencia``, executa e grava
+    o status e o corpo da resposta; as repetições recebem a resposta gravada, com o
+    header ``Idempotent-Replayed``. Duplicadas concorrentes na mesma réplica aguardam o
+    mesmo resultado em memória; em outra réplica, consultam a tabela até a reserva ser
+    concluída. Enquanto a requisição executa, a reserva é renovada a cada terço de
+    ``IDEMPOTENCIA_LEASE``: só a reserva de uma réplica que caiu é retomada. Respostas
+    5xx não são gravadas: a reserva é liberada e o cliente pode repetir. Reusar a chave
+    com outro corpo de requisição devolve 422.
+    """
+
+    def __init__(self):
+        self._em_andamento: dict[tuple[str, str], tuple[str, asyncio.Future]] = {}
+
+    def _impressao(self, requisicao) -> str:
+        return hashlib.sha256(serializar(requisicao)).hexdigest()
+
+    def chave_externa(self, rota: str, chave: Optional[str], requisicao) -> Optional[str]:
+        """
+        Chave de idempotência para repassar a serviços externos, como o gateway.
+
+        Inclui a rota e a impressão da requisição: a mesma ``Idempotency-Key`` reusada com
+        outro corpo depois de ``IDEMPOTENCIA_TTL`` não devolve o pagamento anterior.
+        """
+        if chave is None:
+            return None
+
+        return hashlib.sha256(f"{rota}:{chave}:{self._impressao(requisicao)}".encode()).hexdigest()
+
+    def _resposta(self, status_code: int, corpo: bytes, repetida: bool) -> Response:
+        headers = {"Idempotent-Replayed": "true"} if repetida else None
+        return Response(status_code=status_code, content=corpo, media_type="application/json", headers=headers)
+
+    def _conflito(self, status_code: int, mensagem: str) -> tuple[int, bytes, bool]:
+        return status_code, serializar({"mensagem": mensagem}), False
+
+    async def executar(self, rota: str, chave: Optional[str], requisicao,
+                       executar: Callable[[], Awaitable[Response]]) -> Response:
+        if chave is None:
+            return await executar()
+
+        impressao = self._impressao(requisicao)
+        identificador = (rota, chave)
+
+        em_andamento = self._em_andamento.get(identificador)
+        if em_andamento is not None:
+            impressao_original, futuro = em_andamento
+            if impressao_original != impressao:
+                return self._resposta(*self._conflito(422, "Chave de idempotência já usada com outra requisição"))
+
+            status_code, corpo, _ = await asyncio.shield(futuro)
+            return self._resposta(status_code, corpo, True)
+
+        futuro = asyncio.get_running_loop().create_future()
+        self._em_andamento[identificador] = (impressao, futuro)
+
+        try:
+            resultado = await self._executar(rota, chave, impressao, executar)
+        except Exception as e:
+            futuro.set_exception(e)
+            # Evita o aviso de exceção não recuperada quando ninguém mais aguardava
+            futuro.exception()
+            raise
+        except BaseException:
+            futuro.cancel()
+            raise
+        else:
+            futuro.set_result(resultado)
+            return self._resposta(*resultado)
+        finally:
+            del self._em_andamento[identificador]
+
+    async def _executar(self, rota: str, chave: str, impressao: str,
+                        executar: Callable[[], Awaitable[Response]]) -> tuple[int, bytes, bool]:
+        prazo = asyncio.get_running_loop().time() + IDEMPOTENCIA_ESPERA
+
+        while True:
+            async with asyncpg_manager.pool.acquire() as connection:
+                reservada = await connection.fetchval(QUERY_RESERVAR_CHAVE, rota, chave, impressao,
+                                                      IDEMPOTENCIA_LEASE, IDEMPOTENCIA_TTL)
+                registro = None if reservada else await connection.fetchrow(QUERY_BUSCAR_CHAVE, rota, chave)
+
+            if reservada:
+                return await self._executar_reservada(rota, chave, executar)
+
+            # Sem registro a reserva acabou de ser liberada: tenta reservar de novo
+            if registro is not None:
+                if registro["impressao"] != impressao:
+                    return self._conflito(422, "Chave de idempotência já usada com outra requisição")
+
+                if registro["status_code"] is not None:
+                    return registro["status_code"], registro["corpo"], True
+
+            if asyncio.get_running_loop().time() >= prazo:
+                return self._conflito(409, "Requisição com a mesma chave de idempotência em andamento")
+
+            await asyncio.sleep(IDEMPOTENCIA_INTERVALO)
+
+    async def _executar_reservada(self, rota: str, chave: str,
+                                  executar: Callable[[], Awaitable[Response]]) -> tuple[int, bytes, bool]:
+        renovacao = asyncio.create_task(self._renovar(rota, chave))
+        try:
+            resposta = await executar()
+        except BaseException:
+            renovacao.cancel()
+            await self._liberar(rota, chave)
+            raise
+
+        renovacao.cancel()
+        if resposta.status_code >= 500:
+            await self._liberar(rota, chave)
+        else:
+            async with asyncpg_manager.pool.acquire() as connection:
+                await connection.execute(QUERY_CONCLUIR_CHAVE, rota, chave, resposta.status_code, resposta.body)
+
+        return resposta.status_code, resposta.body, False
+
+    async def concluir(self, connection, rota: str, chave: Optional[str], status_code: int, corpo: bytes):
+        """
+        Grava a resposta da chave pela conexão da própria operação.
+
+        Chamado dentro da transação que faz a escrita, a resposta só fica gravada junto
+        com ela: uma queda entre as duas não deixa a escrita feita com a chave reservada,
+        que seria repetida quando a reserva fosse retomada.
+        """
+        if chave is None:
+            return
+
+        await connection.execute(QUERY_CONCLUIR_CHAVE, rota, chave, status_code, corpo)
+
+    async def _renovar(self, rota: str, chave: str):
+        while True:
+            await asyncio.sleep(IDEMPOTENCIA_LEASE / 3)
+            try:
+                async with asyncpg_manager.pool.acquire() as connection:
+                    await connection.execute(QUERY_RENOVAR_CHAVE, rota, chave)
+            except Exception as e:
+                print(e)
+
+    async def _liberar(self, rota: str, chave: str):
+        async with asyncpg_manager.pool.acquire() as connection:
+            await connection.execute(QUERY_LIBERAR_CHAVE, rota, chave)
+
+
+idempotencia_instance = IdempotenciaManager()
@@ -0,0 +1,132 @@
+import asyncio
+import os
+import re
+from pathlib import Path
+
+import asyncpg
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# O advisory lock é de sessão e não sobrevive ao transaction pooling do PgBouncer;
+# com PgBouncer aponte DB_DIRETO_URL para o Postgres
+DB_DIRETO_URL = os.getenv("DB_DIRETO_URL") or os.getenv("DB_URL")
+DB_MIGRAR_NA_INICIALIZACAO = os.getenv("DB_MIGRAR_NA_INICIALIZACAO", "false").lower() == "true"
+MIGRACAO_INTERVALO = float(os.getenv("MIGRACAO_INTERVALO", 1))
+
+MIGRACOES_DIR = Path(__file__).parent / "migracoes"
+
+# Chave do advisory lock que serializa réplicas migrando ao mesmo tempo
+MIGRACAO_LOCK = 7_310_032
+
+MARCADOR_SEM_TRANSACAO = "-- migracao: sem-transacao"
+
+CRIAR_INDICE_CONCORRENTE = re.compile(r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)", re.IGNORECASE)
+
+# Um CREATE INDEX CONCURRENTLY interrompido deixa o índice INVALID, que o IF NOT EXISTS pularia
+QUERY_INDICE_INVALIDO = """
+    SELECT NOT indice.indisvalid
+    FROM pg_index AS indice
+    JOIN pg_class AS classe ON classe.oid = indice.indexrelid
+    WHERE classe.relname = $1 AND pg_table_is_visible(classe.oid);
+"""
+
+
+class MigracaoManager:
+    """
+    Aplica as migrações SQL versionadas de ``functions/database/migracoes``.
+
+    Cada arquivo ``NNNN_nome.sql`` é aplicado uma única vez, em ordem de versão, e
+    registrado em ``schema_migrations``. Migrações que começam com
+    ``-- migracao: sem-transacao`` (necessário para ``CREATE INDEX CONCURRENTLY``)
+    rodam comando a comando fora de transação; as demais rodam numa transação só. Um
+    índice deixado INVALID por um ``CREATE INDEX CONCURRENTLY`` interrompido é removido
+    antes de ser criado de novo.
+    """
+
+    def __init__(self, diretorio: Path = MIGRACOES_DIR):
+        self.diretorio = diretorio
+
+    def listar(self) -> list[tuple[int, str, str]]:
+        migracoes = []
+        for arquivo in sorted(self.diretorio.glob("*.sql")):
+            versao, _, nome = arquivo.stem.partition("_")
+            migracoes.append((int(versao), nome, arquivo.read_text(encoding="utf-8")))
+
+        return migracoes
+
+    def _comandos(self, sql: str) -> list[str]:
+        sem_comentarios = "\n".join(linha for linha in sql.splitlines() if not linha.lstrip().startswith("--"))
+        return [comando.strip() for comando in re.split(r";\s*(?:\n|$)", sem_comentarios) if comando.strip()]
+
+    async def aplicadas(self, connection) -> set[int]:
+        await connection.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                versao INTEGER PRIMARY KEY,
+                nome TEXT NOT NULL,
+                aplicada_em TIMESTAMP NOT NULL DEFAULT NOW()
+            );
+        """)
+
+        rows = await connection.fetch("SELECT versao FROM schema_migrations;")
+        return {row["versao"] for row in rows}
+
+    async def _aplicar(self, connection, versao: int, nome: str, sql: str):
+        query_registro = """
+            INSERT INTO schema_migrations(versao, nome) VALUES($1, $2);
+        """
+
+        if sql.lstrip().startswith(MARCADOR_SEM_TRANSACAO):
+            for comando in self._comandos(sql):
+                indice = CRIAR_INDICE_CONCORRENTE.match(comando)
+                if indice and await connection.fetchval(QUERY_INDICE_INVALIDO, indice.group(1)):
+                    print(f"Removendo índice inválido {indice.group(1)}")
+                    await connection.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {indice.group(1)};")
+                await connection.execute(comando)
+            await connection.execute(query_registro, versao, nome)
+        else:
+            async with connection.transaction():
+                await connection.execute(sql)
+                await connection.execute(query_registro, versao, nome)
+
+    async def _travar(self, connection):
+        # Tenta o lock em vez de esperar por ele dentro de um comando: um comando parado no
+        # pg_advisory_lock segura um snapshot, e o CREATE INDEX CONCURRENTLY da réplica que
+        # está migrando esperaria por esse snapshot, fechando um deadlock entre as duas
+        while not await connection.fetchval("SELECT pg_try_advisory_lock($1);", MIGRACAO_LOCK):
+            await asyncio.sleep(MIGRACAO_INTERVALO)
+
+    async def migrar(self, connection) -> list[int]:
+        await self._travar(connection)
+
+        try:
+            aplicadas = await self.aplicadas(connection)
+            novas = []
+
+            for versao, nome, sql in self.listar():
+                if versao in aplicadas:
+                    continue
+
+                print(f"Aplicando migração {versao:04d}_{nome}")
+                await self._aplicar(connection, versao, nome, sql)
+                novas.append(versao)
+
+            return novas
+
+        finally:
+            await connection.execute("SELECT pg_advisory_unlock($1);", MIGRACAO_LOCK)
+
+    async def migrar_banco(self, dsn: str = DB_DIRETO_URL) -> list[int]:
+        connection = await asyncpg.connect(dsn=dsn)
+        try:
+            return await self.migrar(connection)
+        finally:
+            await connection.close()
+
+
+migracao_instance = MigracaoManager()
+
+
+if __name__ == "__main__":
+    aplicadas = asyncio.run(migracao_instance.migrar_banco())
+    print(f"{len(aplicadas)} migração(ões) aplicada(s)" if aplicadas else "Banco de dados já está atualizado")
@@ -0,0 +1,40 @@
+-- Esquema inicial. Usa IF NOT EXISTS para adotar bancos criados pelo script do README.
+
+CREATE TABLE IF NOT EXISTS cobrancas (
+    id SERIAL PRIMARY KEY,
+    status VARCHAR(20) NOT NULL,
+    hora_solicitacao TIMESTAMP NOT NULL,
+    hora_finalizacao TIMESTAMP,
+    valor DECIMAL(10, 2) NOT NULL,
+    ciclista INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_cobrancas_status ON cobrancas(status);
+CREATE INDEX IF NOT EXISTS idx_cobrancas_ciclista ON cobrancas(ciclista);
+
+CREATE TABLE IF NOT EXISTS fila_emails (
+    id SERIAL PRIMARY KEY,
+    email VARCHAR(255) NOT NULL,
+    assunto TEXT NOT NULL,
+    mensagem TEXT NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    ultimo_erro TEXT,
+    hora_solicitacao TIMESTAMP NOT NULL,
+    hora_envio TIMESTAMP,
+    proxima_tentativa TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_fila_emails_pendentes ON fila_emails(proxima_tentativa)
+    WHERE status IN ('PENDENTE', 'ENVIANDO');
+
+CREATE TABLE IF NOT EXISTS notificacoes_cobranca (
+    id SERIAL PRIMARY KEY,
+    ciclista INTEGER NOT NULL,
+    cobranca_id INTEGER NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    valor DECIMAL(10, 2) NOT NULL,
+    hora_registro TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_notificacoes_cobranca_ciclista ON notificacoes_cobranca(ciclista, hora_registro);
@@ -0,0 +1,17 @@
+-- migracao: sem-transacao
+-- Índices criados com CONCURRENTLY para não bloquear escritas em tabelas grandes.
+
+-- A leitura da fila (status = 'EM_FILA' ORDER BY hora_solicitacao) percorre só as
+-- cobranças enfileiradas, já na ordem de chegada, sem ordenar nem filtrar o resto da tabela.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cobrancas_fila
+    ON cobrancas(hora_solicitacao, id)
+    WHERE status = 'EM_FILA';
+
+-- Histórico por ciclista respondido só pelo índice (index-only scan), mais recentes primeiro.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cobrancas_ciclista_historico
+    ON cobrancas(ciclista, hora_solicitacao DESC)
+    INCLUDE (id, status, valor, hora_finalizacao);
+
+-- Os índices acima cobrem todas as consultas que usavam estes dois.
+DROP INDEX CONCURRENTLY IF EXISTS idx_cobrancas_ciclista;
+DROP INDEX CONCURRENTLY IF EXISTS idx_cobrancas_status;
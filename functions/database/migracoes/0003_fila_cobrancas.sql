@@ -0,0 +1,31 @@
+-- Fila de cobranças em tabela própria: só as cobranças pendentes, fora do histórico.
+-- O id vem da mesma sequência de cobrancas, então a cobrança mantém o id ao sair da fila.
+
+CREATE TABLE IF NOT EXISTS fila_cobrancas (
+    id INTEGER PRIMARY KEY DEFAULT nextval('cobrancas_id_seq'),
+    ciclista INTEGER NOT NULL,
+    valor DECIMAL(10, 2) NOT NULL,
+    enfileirada_em TIMESTAMP NOT NULL,
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    lease_ate TIMESTAMP
+) WITH (
+    -- Espaço livre por página para as atualizações do lease serem HOT
+    fillfactor = 70,
+    -- Tabela pequena com muita rotatividade: vacuum por quantidade de linhas mortas, não por proporção
+    autovacuum_vacuum_scale_factor = 0.0,
+    autovacuum_vacuum_threshold = 1000
+);
+
+CREATE INDEX IF NOT EXISTS idx_fila_cobrancas_enfileirada ON fila_cobrancas(enfileirada_em, id);
+
+-- Move as cobranças que estavam na fila dentro de cobrancas
+INSERT INTO fila_cobrancas(id, ciclista, valor, enfileirada_em)
+    SELECT id, ciclista, valor, hora_solicitacao
+    FROM cobrancas
+    WHERE status = 'EM_FILA'
+    ON CONFLICT (id) DO NOTHING;
+
+DELETE FROM cobrancas WHERE status = 'EM_FILA';
+
+-- Sem cobranças EM_FILA em cobrancas o índice parcial da fila (0002) não indexa mais nada
+DROP INDEX IF EXISTS idx_cobrancas_fila;
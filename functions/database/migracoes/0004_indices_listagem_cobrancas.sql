@@ -0,0 +1,14 @@
+-- migracao: sem-transacao
+-- Índices da listagem paginada por id (GET /cobrancas, mais recentes primeiro).
+
+-- Cobranças de um ciclista já em ordem de id; o INCLUDE permite filtrar por período
+-- e devolver a página sem visitar a tabela
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cobrancas_ciclista_id
+    ON cobrancas(ciclista, id DESC)
+    INCLUDE (status, valor, hora_solicitacao, hora_finalizacao);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cobrancas_status_id
+    ON cobrancas(status, id DESC);
+
+-- O histórico por ciclista passou a ser paginado por id e é coberto pelo índice acima
+DROP INDEX CONCURRENTLY IF EXISTS idx_cobrancas_ciclista_historico;
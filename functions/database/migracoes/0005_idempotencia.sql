@@ -0,0 +1,13 @@
+-- Respostas de POST /cobranca e /filaCobranca guardadas pelo header Idempotency-Key.
+-- Uma linha sem status_code é uma requisição em andamento; a chave primária garante
+-- que só uma réplica reserva cada chave.
+
+CREATE TABLE IF NOT EXISTS idempotencia (
+    rota VARCHAR(64) NOT NULL,
+    chave VARCHAR(255) NOT NULL,
+    impressao CHAR(64) NOT NULL,
+    status_code SMALLINT,
+    corpo BYTEA,
+    criada_em TIMESTAMP NOT NULL,
+    PRIMARY KEY (rota, chave)
+);
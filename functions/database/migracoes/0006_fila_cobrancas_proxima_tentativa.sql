@@ -0,0 +1,10 @@
+-- Retentativas da fila de cobranças com backoff: a cobrança recusada só volta a ser
+-- reivindicada em proxima_tentativa. Cobranças novas entram com proxima_tentativa = NOW(),
+-- então a ordem por proxima_tentativa continua sendo a ordem de chegada.
+
+ALTER TABLE fila_cobrancas ADD COLUMN IF NOT EXISTS proxima_tentativa TIMESTAMP NOT NULL DEFAULT NOW();
+
+-- A reivindicação lê só as cobranças já vencidas, na ordem em que vencem
+CREATE INDEX IF NOT EXISTS idx_fila_cobrancas_proxima_tentativa ON fila_cobrancas(proxima_tentativa, id);
+
+DROP INDEX IF EXISTS idx_fila_cobrancas_enfileirada;
@@ -0,0 +1,8 @@
+-- Classes de prioridade na fila de cobranças (0 = normal, 1 = prioritária). A reivindicação
+-- lê as cobranças vencidas de cada classe separadamente, na ordem em que vencem.
+
+ALTER TABLE fila_cobrancas ADD COLUMN IF NOT EXISTS prioridade SMALLINT NOT NULL DEFAULT 0;
+
+CREATE INDEX IF NOT EXISTS idx_fila_cobrancas_prioridade ON fila_cobrancas(prioridade, proxima_tentativa, id);
+
+DROP INDEX IF EXISTS idx_fila_cobrancas_proxima_tentativa;
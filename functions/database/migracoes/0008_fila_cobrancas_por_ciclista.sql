@@ -0,0 +1,9 @@
+-- migracao: sem-transacao
+-- A reivindicação lê cada ciclista com cobranças vencidas separadamente, na ordem em que as
+-- cobranças dele vencem, para que um ciclista com muitas cobranças não ocupe o lote inteiro.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_fila_cobrancas_ciclista
+    ON fila_cobrancas(prioridade, ciclista, proxima_tentativa, id);
+
+-- Substituído pelo índice acima, que também atende a busca dos ciclistas com cobranças vencidas
+DROP INDEX CONCURRENTLY IF EXISTS idx_fila_cobrancas_prioridade;
@@ -0,0 +1,5 @@
+-- Recusas definitivas do gateway, separadas das tentativas: uma consulta que falhou, um
+-- pagamento em análise ou um serviço fora do ar reagendam a cobrança sem aproximá-la da FALHA.
+-- tentativas continua contando cada reivindicação (dono do lease e chave no gateway).
+
+ALTER TABLE fila_cobrancas ADD COLUMN IF NOT EXISTS recusas INTEGER NOT NULL DEFAULT 0;
@@ -0,0 +1,174 @@
+import asyncio
+import os
+
+from dotenv import load_dotenv
+
+from functions.cache.invalidacao_manager import invalidacao_instance
+from functions.database.asyncpg_manager import (asyncpg_manager, referencia_pagamento, FILA_COBRANCAS_MAX_TENTATIVAS,
+                                                 NOTIFICAR_COBRANCAS, PRIORIDADE_ALTA, PRIORIDADE_NORMAL,
+                                                 QUERY_CONCLUIR_COBRANCA, QUERY_DESCARTAR_COBRANCA)
+from functions.database.idempotencia_manager import IDEMPOTENCIA_TTL
+from functions.mercado_pago.mercado_pago_manager import mercado_pago_instance
+
+load_dotenv()
+
+VARREDURA_INTERVALO = float(os.getenv("VARREDURA_INTERVALO", 60))
+# Maior que a duração de um pagamento, inclusive a espera pelo lock do ciclista
+COBRANCA_PENDENTE_TIMEOUT = float(os.getenv("COBRANCA_PENDENTE_TIMEOUT", 900))
+# Cobranças PENDENTE, e cobranças da fila que esgotaram as recusas, conferidas no gateway por varredura
+VARREDURA_LOTE_PENDENTES = int(os.getenv("VARREDURA_LOTE_PENDENTES", 100))
+# Cobranças vencidas há mais que isso na fila passam a prioritárias (0 desliga)
+FILA_COBRANCAS_ATRASO_PRIORITARIO = float(os.getenv("FILA_COBRANCAS_ATRASO_PRIORITARIO", 0))
+
+QUERY_DEVOLVER_LEASES_EXPIRADOS = """
+    UPDATE fila_cobrancas
+        SET lease_ate = NULL
+        WHERE lease_ate < NOW() AND recusas < $1
+        RETURNING id;
+"""
+
+# Cobranças da fila que esgotaram as recusas e nenhum worker tem: o worker caiu antes de
+# descartá-la, ou o limite de recusas foi reduzido. O pagamento pode ter sido aprovado, então
+# cada uma é conferida no gateway antes de sair da fila
+QUERY_COBRANCAS_ESGOTADAS = """
+    SELECT id, ciclista, valor
+        FROM fila_cobrancas
+        WHERE recusas >= $1 AND (lease_ate IS NULL OR lease_ate < NOW())
+        ORDER BY id
+        LIMIT $2;
+"""
+
+# PENDENTE além do timeout é uma cobrança imediata cujo processo caiu no meio do pagamento;
+# o pagamento pode ter sido aprovado, então cada uma é conferida no gateway antes de encerrar
+QUERY_PENDENTES_ANTIGAS = """
+    SELECT id
+        FROM cobrancas
+        WHERE status = 'PENDENTE' AND hora_solicitacao < NOW() - make_interval(secs => $1)
+        ORDER BY hora_solicitacao
+        LIMIT $2;
+"""
+
+QUERY_ENCERRAR_PENDENTE = """
+    UPDATE cobrancas
+        SET status = $2,
+            hora_finalizacao = NOW()
+        WHERE id = $1 AND status = 'PENDENTE'
+        RETURNING id;
+"""
+
+QUERY_PROMOVER_ATRASADAS = """
+    UPDATE fila_cobrancas
+        SET prioridade = $3
+        WHERE prioridade = $2 AND proxima_tentativa < NOW() - make_interval(secs => $1)
+        RETURNING id;
+"""
+
+QUERY_REMOVER_CHAVES_EXPIRADAS = """
+    DELETE FROM idempotencia
+        WHERE status_code IS NOT NULL AND criada_em < NOW() - make_interval(secs => $1)
+        RETURNING chave;
+"""
+
+
+class VarreduraManager:
+    """
+    Recupera o estado deixado por réplicas que caíram no meio de uma cobrança.
+
+    A cada ``VARREDURA_INTERVALO`` segundos devolve à fila as cobranças com lease expirado,
+    move para o histórico as que esgotaram ``FILA_COBRANCAS_MAX_TENTATIVAS`` recusas e encerra
+    as cobranças ``PENDENTE`` mais antigas que ``COBRANCA_PENDENTE_TIMEOUT``, as duas conforme
+    o pagamento no gateway (``FINALIZADA`` se aprovado, ``FALHA`` se recusado ou inexistente;
+    as que estão em análise ou não puderam ser consultadas ficam para a próxima), promove a
+    prioritárias as cobranças vencidas há mais que
+    ``FILA_COBRANCAS_ATRASO_PRIORITARIO`` e remove as chaves de idempotência expiradas. Cada
+    passo é um comando só, então várias réplicas podem varrer ao mesmo tempo.
+    """
+
+    def __init__(self):
+        self._tarefa = None
+
+    async def varrer(self) -> dict:
+        async with asyncpg_manager.pool.acquire() as connection:
+            esgotadas = await connection.fetch(QUERY_COBRANCAS_ESGOTADAS, FILA_COBRANCAS_MAX_TENTATIVAS,
+                                               VARREDURA_LOTE_PENDENTES)
+            devolvidas = await connection.fetch(QUERY_DEVOLVER_LEASES_EXPIRADOS, FILA_COBRANCAS_MAX_TENTATIVAS)
+            pendentes = await connection.fetch(QUERY_PENDENTES_ANTIGAS, COBRANCA_PENDENTE_TIMEOUT, VARREDURA_LOTE_PENDENTES)
+            chaves = await connection.fetch(QUERY_REMOVER_CHAVES_EXPIRADAS, IDEMPOTENCIA_TTL)
+            promovidas = []
+            if FILA_COBRANCAS_ATRASO_PRIORITARIO:
+                promovidas = await connection.fetch(QUERY_PROMOVER_ATRASADAS, FILA_COBRANCAS_ATRASO_PRIORITARIO,
+                                                    PRIORIDADE_NORMAL, PRIORIDADE_ALTA)
+
+        # O gateway é consultado sem segurar uma conexão do pool
+        situacoes = await self._situacoes(pendentes)
+        situacoes_fila = await self._situacoes(esgotadas)
+
+        encerradas = []
+        finalizadas = []
+        descartadas = []
+        if situacoes or situacoes_fila:
+            async with asyncpg_manager.pool.acquire() as connection:
+                for cobranca_id, status in situacoes.items():
+                    if await connection.fetchval(QUERY_ENCERRAR_PENDENTE, cobranca_id, status) is not None:
+                        encerradas.append(cobranca_id)
+
+                for row in esgotadas:
+                    status = situacoes_fila.get(row["id"])
+                    if status is None:
+                        continue
+
+                    # A notificação é registrada no mesmo comando que move a cobrança
+                    if status == "FINALIZADA":
+                        movida = await connection.fetchrow(QUERY_CONCLUIR_COBRANCA, row["id"], NOTIFICAR_COBRANCAS)
+                    else:
+                        movida = await connection.fetchval(QUERY_DESCARTAR_COBRANCA, row["id"], NOTIFICAR_COBRANCAS)
+                    # Sem linha, outra réplica já a moveu
+                    if movida is None:
+                        continue
+
+                    (finalizadas if status == "FINALIZADA" else descartadas).append(row["id"])
+
+                await invalidacao_instance.publicar("cobranca", encerradas + finalizadas + descartadas, connection)
+
+        return {
+            "devolvidas": len(devolvidas),
+            "finalizadas": len(finalizadas),
+            "descartadas": len(descartadas),
+            "pendentes_encerradas": len(encerradas),
+            "chaves_removidas": len(chaves),
+            "promovidas": len(promovidas),
+        }
+
+    async def _situacoes(self, cobrancas: list) -> dict[int, str]:
+        """Status final de cada cobrança pelo pagamento no gateway; as sem resposta definitiva ficam de fora."""
+        situacoes = {}
+        for row in cobrancas:
+            pagamento = await mercado_pago_instance.consultar_pagamento(referencia_pagamento(row["id"]))
+            if pagamento["status"] and pagamento["data"] != "pendente":
+                situacoes[row["id"]] = "FINALIZADA" if pagamento["data"] == "aprovado" else "FALHA"
+
+        return situacoes
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.varrer()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(e)
+
+            await asyncio.sleep(VARREDURA_INTERVALO)
+
+    async def start(self):
+        if self._tarefa is None:
+            self._tarefa = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._tarefa is not None:
+            self._tarefa.cancel()
+            await asyncio.gather(self._tarefa, return_exceptions=True)
+            self._tarefa = None
+
+
+varredura_instance = VarreduraManager()
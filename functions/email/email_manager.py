@@ -1,5 +1,9 @@
-import random
+import asyncio
+import json
+from collections import deque
+from typing import Optional
 
+import aiosmtplib
 from dotenv import load_dotenv
 from fastapi_mail import ConnectionConfig, MessageSchema, FastMail, MessageType
 import os
@@ -7,8 +11,25 @@ import os
 from pydantic import SecretStr
 from pydantic.v1 import EmailStr
 
+from functions.email.smtp_pool import SMTPPool, SMTP_POOL_MAX_SIZE
+
 load_dotenv()
 
+MAIL_SERVERS = os.getenv("MAIL_SERVERS")
+MAIL_LIMITE_POR_SEGUNDO = float(os.getenv("MAIL_LIMITE_POR_SEGUNDO", 0))
+MAIL_RAJADA = float(os.getenv("MAIL_RAJADA", 0))
+
+# Servidor inacessível ou sem aceitar a sessão; recusas permanentes (5xx) de uma mensagem,
+# como destinatário, remetente ou conteúdo, se repetiriam em qualquer servidor
+ERROS_CONEXAO = (OSError, asyncio.TimeoutError, aiosmtplib.SMTPServerDisconnected,
+                 aiosmtplib.SMTPAuthenticationError, aiosmtplib.SMTPHeloError)
+
+
+def falha_do_servidor(erro: Exception) -> bool:
+    if isinstance(erro, aiosmtplib.SMTPResponseException) and 400 <= erro.code < 500:
+        return True
+    return isinstance(erro, ERROS_CONEXAO)
+
 
 class EmailManager:
     def __init__(self):
@@ -23,6 +44,80 @@ class EmailManager:
             USE_CREDENTIALS=True,
             VALIDATE_CERTS=True,
         )
+        self.servidores = self._carregar_servidores(MAIL_SERVERS)
+        self.smtp_pools: list[SMTPPool] = []
+
+    def _carregar_servidores(self, mail_servers: Optional[str]) -> list[dict]:
+        if not mail_servers:
+            return [{
+                "config": self.config,
+                "limite_por_segundo": MAIL_LIMITE_POR_SEGUNDO or None,
+                "rajada": MAIL_RAJADA or None,
+                "max_conexoes": SMTP_POOL_MAX_SIZE,
+            }]
+
+        servidores = []
+        for servidor in json.loads(mail_servers):
+            config = self.config.model_copy(update={
+                "MAIL_SERVER": servidor["servidor"],
+                "MAIL_PORT": int(servidor.get("porta", self.config.MAIL_PORT)),
+                "MAIL_USERNAME": servidor.get("usuario", self.config.MAIL_USERNAME),
+                "MAIL_PASSWORD": SecretStr(servidor["senha"]) if "senha" in servidor else self.config.MAIL_PASSWORD,
+            })
+            servidores.append({
+                "config": config,
+                "limite_por_segundo": servidor.get("limite_por_segundo"),
+                "rajada": servidor.get("rajada"),
+                "max_conexoes": servidor.get("max_conexoes", SMTP_POOL_MAX_SIZE),
+            })
+
+        return servidores
+
+    def _criar_pools(self) -> list[SMTPPool]:
+        return [
+            SMTPPool(
+                servidor["config"],
+                max_size=servidor["max_conexoes"],
+                limite_por_segundo=servidor["limite_por_segundo"],
+                rajada=servidor["rajada"],
+            )
+            for servidor in self.servidores
+        ]
+
+    async def connect(self):
+        if not self.smtp_pools:
+            self.smtp_pools = self._criar_pools()
+
+    async def disconnect(self):
+        for pool in self.smtp_pools:
+            await pool.close()
+        self.smtp_pools = []
+
+    def _escolher_pool(self, pools: list[SMTPPool], tentados: list[SMTPPool]) -> Optional[SMTPPool]:
+        candidatos = [pool for pool in pools if pool not in tentados]
+        if not candidatos:
+            return None
+
+        # Se todos estiverem em cooldown ainda vale tentar, em vez de recusar o envio
+        saudaveis = [pool for pool in candidatos if pool.saudavel] or candidatos
+        return min(saudaveis, key=lambda pool: pool.carga())
+
+    async def _enviar_com_failover(self, pools: list[SMTPPool], message: MessageSchema):
+        tentados = []
+        erro = None
+
+        while (pool := self._escolher_pool(pools, tentados)) is not None:
+            tentados.append(pool)
+            try:
+                await pool.send_message(message)
+                return
+            except Exception as e:
+                if not falha_do_servidor(e):
+                    raise
+                pool.marcar_falha()
+                erro = e
+
+        raise erro
 
     async def send_email(self, email_data: dict) -> dict:
         try:
@@ -33,11 +128,14 @@ class EmailManager:
                 subtype=MessageType.html,
             )
 
-            fm = FastMail(self.config)
-            await fm.send_message(message)
+            if self.smtp_pools:
+                await self._enviar_com_failover(self.smtp_pools, message)
+            else:
+                fm = FastMail(self.config)
+                await fm.send_message(message)
 
             record = {
-                "id": random.randint(1, 1000),
+                "id": email_data.get("id"),
                 "email": email_data["email"],
                 "assunto": email_data["assunto"],
                 "mensagem": email_data["mensagem"],
@@ -49,5 +147,66 @@ class EmailManager:
             print(e)
             return {"codigo": 404, "mensagem": "Email não encontrado"}
 
+    async def _send_messages(self, pools: list[SMTPPool], messages: list[MessageSchema]) -> list[Optional[Exception]]:
+        fila = deque(enumerate(messages))
+        erros: list[Optional[Exception]] = [None] * len(messages)
+        ativos = [pool for pool in pools if pool.saudavel] or pools
+
+        # Todos os servidores consomem a mesma fila, cada um no ritmo do seu limite
+        resultados = await asyncio.gather(*(pool.consumir_fila(fila, erros) for pool in ativos))
+
+        for pool, erro_conexao in zip(ativos, resultados):
+            if erro_conexao is not None:
+                pool.marcar_falha()
+
+        # O que sobrou na fila ou falhou por problema de servidor vai pelo caminho com failover
+        restantes = [indice for indice, _ in fila]
+        restantes += [indice for indice, erro in enumerate(erros) if erro is not None and falha_do_servidor(erro)]
+
+        for indice in restantes:
+            try:
+                await self._enviar_com_failover(pools, messages[indice])
+                erros[indice] = None
+            except Exception as e:
+                erros[indice] = e
+
+        return erros
+
+    async def send_emails(self, emails: list[dict]) -> dict:
+        pools = self.smtp_pools or self._criar_pools()
+
+        try:
+            messages = [
+                MessageSchema(
+                    subject=email_data["assunto"],
+                    recipients=[email_data["email"]],
+                    body=email_data["mensagem"],
+                    subtype=MessageType.html,
+                )
+                for email_data in emails
+            ]
+
+            erros = await self._send_messages(pools, messages)
+
+            resultados = []
+            for email_data, erro in zip(emails, erros):
+                if erro is None:
+                    resultados.append({"email": email_data["email"], "status": True})
+                else:
+                    print(erro)
+                    resultados.append({"email": email_data["email"], "status": False, "mensagem": "Erro ao enviar o email"})
+
+            enviados = sum(1 for resultado in resultados if resultado["status"])
+            return {"status": True, "data": {"enviados": enviados, "falhas": len(resultados) - enviados, "resultados": resultados}}
+
+        except Exception as e:
+            print(e)
+            return {"status": False, "mensagem": "Erro ao enviar os emails"}
+
+        finally:
+            if pools is not self.smtp_pools:
+                for pool in pools:
+                    await pool.close()
+
 
-email_instance = EmailManager()
\ No newline at end of file
+email_instance = EmailManager()
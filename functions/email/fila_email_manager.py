@@ -0,0 +1,168 @@
+import asyncio
+import os
+
+from dotenv import load_dotenv
+
+from functions.database.asyncpg_manager import asyncpg_manager
+from functions.email.email_manager import email_instance
+
+load_dotenv()
+
+EMAIL_FILA_CONCORRENCIA = int(os.getenv("EMAIL_FILA_CONCORRENCIA", 4))
+EMAIL_FILA_LOTE = int(os.getenv("EMAIL_FILA_LOTE", 10))
+EMAIL_FILA_MAX_TENTATIVAS = int(os.getenv("EMAIL_FILA_MAX_TENTATIVAS", 5))
+EMAIL_FILA_ATRASO_RETENTATIVA = float(os.getenv("EMAIL_FILA_ATRASO_RETENTATIVA", 30))
+EMAIL_FILA_INTERVALO = float(os.getenv("EMAIL_FILA_INTERVALO", 5))
+EMAIL_FILA_LEASE = float(os.getenv("EMAIL_FILA_LEASE", 300))
+
+
+class FilaEmailManager:
+    """
+    Caixa de saída de emails persistida no Postgres.
+
+    A rota apenas grava o email em ``fila_emails``; workers em background reivindicam
+    lotes com ``FOR UPDATE SKIP LOCKED`` e fazem o envio SMTP. Um email reivindicado fica
+    em ``ENVIANDO`` até ``proxima_tentativa``, que funciona como lease: se o processo cair
+    no meio do envio, outro worker o reivindica quando o lease expira.
+    """
+
+    def __init__(self, concorrencia: int = EMAIL_FILA_CONCORRENCIA):
+        self.concorrencia = concorrencia
+        self._workers: list[asyncio.Task] = []
+        self._novo_email = asyncio.Event()
+
+    async def enfileirar_email(self, email: dict) -> dict:
+        query = """
+            INSERT INTO fila_emails(email, assunto, mensagem, status, tentativas, hora_solicitacao, proxima_tentativa)
+                VALUES($1, $2, $3, 'PENDENTE', 0, NOW(), NOW())
+                RETURNING id, email, assunto, mensagem, status;
+        """
+
+        try:
+            async with asyncpg_manager.pool.acquire() as connection:
+                registro = await connection.fetchrow(query, email["email"], email["assunto"], email["mensagem"])
+
+            self._novo_email.set()
+            return {"status": True, "data": dict(registro)}
+
+        except Exception as e:
+            print(e)
+            return {"status": False, "mensagem": "Erro ao enfileirar o email"}
+
+    async def inserir_emails(self, connection, emails: list[dict]) -> list[int]:
+        query = """
+            INSERT INTO fila_emails(email, assunto, mensagem, status, tentativas, hora_solicitacao, proxima_tentativa)
+                SELECT email, assunto, mensagem, 'PENDENTE', 0, NOW(), NOW()
+                FROM unnest($1::varchar[], $2::text[], $3::text[]) AS e(email, assunto, mensagem)
+                RETURNING id;
+        """
+
+        ids = await connection.fetch(query, [email["email"] for email in emails],
+                                     [email["assunto"] for email in emails],
+                                     [email["mensagem"] for email in emails])
+        self._novo_email.set()
+        return [registro["id"] for registro in ids]
+
+    async def get_email_by_id(self, email_id: int) -> dict:
+        query = """
+            SELECT id, email, assunto, status, tentativas, ultimo_erro, hora_solicitacao, hora_envio
+            FROM fila_emails
+            WHERE id = $1;
+        """
+
+        try:
+            async with asyncpg_manager.pool.acquire() as connection:
+                email = await connection.fetchrow(query, email_id)
+
+                if email:
+                    return {"status": True, "data": dict(email)}
+                else:
+                    return {"status": False, "mensagem": "Email não encontrado"}
+
+        except Exception as e:
+            print(e)
+            return {"status": False, "mensagem": "Erro ao buscar o email"}
+
+    async def enviar_lote(self, tamanho: int = EMAIL_FILA_LOTE) -> int:
+        query_reivindicar = """
+            UPDATE fila_emails
+                SET status = 'ENVIANDO',
+                    tentativas = tentativas + 1,
+                    proxima_tentativa = NOW() + make_interval(secs => $2)
+                WHERE id IN (
+                    SELECT id
+                    FROM fila_emails
+                    WHERE status IN ('PENDENTE', 'ENVIANDO')
+                      AND proxima_tentativa <= NOW()
+                    ORDER BY proxima_tentativa
+                    LIMIT $1
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id, email, assunto, mensagem, tentativas;
+        """
+
+        query_enviado = """
+            UPDATE fila_emails
+                SET status = 'ENVIADO',
+                    hora_envio = NOW(),
+                    ultimo_erro = NULL
+                WHERE id = $1;
+        """
+
+        query_falha = """
+            UPDATE fila_emails
+                SET status = CASE WHEN tentativas >= $2 THEN 'FALHA' ELSE 'PENDENTE' END,
+                    ultimo_erro = $3,
+                    proxima_tentativa = NOW() + make_interval(secs => $4 * power(2, tentativas - 1))
+                WHERE id = $1;
+        """
+
+        async with asyncpg_manager.pool.acquire() as connection:
+            emails = await connection.fetch(query_reivindicar, tamanho, EMAIL_FILA_LEASE)
+
+        if not emails:
+            return 0
+
+        # O lote reivindicado sai pelas mesmas sessões SMTP, sem handshake por email
+        resultado = await email_instance.send_emails([dict(email) for email in emails])
+
+        async with asyncpg_manager.pool.acquire() as connection:
+            for indice, email in enumerate(emails):
+                if resultado["status"] and resultado["data"]["resultados"][indice]["status"]:
+                    await connection.execute(query_enviado, email["id"])
+                else:
+                    mensagem = resultado["data"]["resultados"][indice]["mensagem"] if resultado["status"] else resultado["mensagem"]
+                    await connection.execute(query_falha, email["id"], EMAIL_FILA_MAX_TENTATIVAS,
+                                             mensagem, EMAIL_FILA_ATRASO_RETENTATIVA)
+
+        return len(emails)
+
+    async def _worker(self):
+        while True:
+            try:
+                if await self.enviar_lote():
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(e)
+
+            self._novo_email.clear()
+            try:
+                await asyncio.wait_for(self._novo_email.wait(), timeout=EMAIL_FILA_INTERVALO)
+            except asyncio.TimeoutError:
+                pass
+
+    async def start(self):
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concorrencia)]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+
+fila_email_instance = FilaEmailManager()
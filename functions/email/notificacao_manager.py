@@ -0,0 +1,119 @@
+import asyncio
+import os
+from itertools import groupby
+
+from dotenv import load_dotenv
+
+from functions.database.asyncpg_manager import asyncpg_manager
+from functions.email.fila_email_manager import fila_email_instance
+from functions.email.template_manager import template_instance
+from functions.integration.ciclista_manager import ciclista_instance
+
+load_dotenv()
+
+NOTIFICACAO_JANELA = float(os.getenv("NOTIFICACAO_JANELA", 300))
+NOTIFICACAO_INTERVALO = float(os.getenv("NOTIFICACAO_INTERVALO", 60))
+NOTIFICACAO_LOTE = int(os.getenv("NOTIFICACAO_LOTE", 500))
+
+TEMPLATE_POR_STATUS = {
+    "FINALIZADA": "cobranca_confirmada",
+    "FALHA": "cobranca_falha",
+}
+
+
+class NotificacaoManager:
+    """
+    Transforma as notificações registradas pela fila de cobranças em emails.
+
+    As notificações de um mesmo ciclista ficam acumuladas até a mais antiga completar
+    ``NOTIFICACAO_JANELA`` segundos; então viram um único email (ou um resumo, se houver
+    mais de uma) gravado na fila de emails, que cuida do envio e das retentativas.
+    """
+
+    def __init__(self):
+        self._tarefa = None
+
+    def _montar_email(self, ciclista: dict, notificacoes: list) -> dict:
+        if len(notificacoes) == 1:
+            notificacao = notificacoes[0]
+            return template_instance.aplicar({
+                "email": ciclista["email"],
+                "template": TEMPLATE_POR_STATUS[notificacao["status"]],
+                "variaveis": {"nome": ciclista.get("nome"), "valor": notificacao["valor"], "cobranca_id": notificacao["cobranca_id"]},
+            })
+
+        return template_instance.aplicar({
+            "email": ciclista["email"],
+            "template": "resumo_cobrancas",
+            "variaveis": {"nome": ciclista.get("nome"), "cobrancas": [dict(notificacao) for notificacao in notificacoes]},
+        })
+
+    async def enviar_resumos(self) -> int:
+        query_select = """
+            SELECT id, ciclista, cobranca_id, status, valor
+            FROM notificacoes_cobranca
+            WHERE ciclista IN (
+                SELECT ciclista
+                FROM notificacoes_cobranca
+                GROUP BY ciclista
+                HAVING MIN(hora_registro) <= NOW() - make_interval(secs => $1)
+                LIMIT $2
+            )
+            ORDER BY ciclista, id
+            FOR UPDATE SKIP LOCKED;
+        """
+
+        query_delete = """
+            DELETE FROM notificacoes_cobranca
+                WHERE id = ANY($1::int[]);
+        """
+
+        async with asyncpg_manager.pool.acquire() as connection:
+            async with connection.transaction():
+                rows = await connection.fetch(query_select, NOTIFICACAO_JANELA, NOTIFICACAO_LOTE)
+                if not rows:
+                    return 0
+
+                por_ciclista = {ciclista: list(notificacoes) for ciclista, notificacoes in groupby(rows, key=lambda row: row["ciclista"])}
+                ciclistas = await asyncio.gather(*(ciclista_instance.obter_ciclista(ciclista) for ciclista in por_ciclista))
+
+                emails = []
+                resolvidas = []
+                for (ciclista_id, notificacoes), ciclista in zip(por_ciclista.items(), ciclistas):
+                    # Sem email do ciclista a notificação fica para a próxima rodada
+                    if not ciclista["status"] or not ciclista["data"].get("email"):
+                        print(f"Não foi possível obter o email do ciclista {ciclista_id}")
+                        continue
+
+                    emails.append(self._montar_email(ciclista["data"], notificacoes))
+                    resolvidas += [notificacao["id"] for notificacao in notificacoes]
+
+                if emails:
+                    await fila_email_instance.inserir_emails(connection, emails)
+                    await connection.execute(query_delete, resolvidas)
+
+                return len(emails)
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.enviar_resumos()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(e)
+
+            await asyncio.sleep(NOTIFICACAO_INTERVALO)
+
+    async def start(self):
+        if self._tarefa is None:
+            self._tarefa = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._tarefa is not None:
+            self._tarefa.cancel()
+            await asyncio.gather(self._tarefa, return_exceptions=True)
+            self._tarefa = None
+
+
+notificacao_instance = NotificacaoManager()
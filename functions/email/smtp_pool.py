@@ -0,0 +1,227 @@
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from email.utils import formataddr
+from typing import Optional
+
+import aiosmtplib
+from dotenv import load_dotenv
+from fastapi_mail import ConnectionConfig, MessageSchema
+from fastapi_mail.msg import MailMsg
+
+from functions.email.token_bucket import TokenBucket
+
+load_dotenv()
+
+SMTP_POOL_MAX_SIZE = int(os.getenv("SMTP_POOL_MAX_SIZE", 4))
+SMTP_POOL_MAX_MENSAGENS = int(os.getenv("SMTP_POOL_MAX_MENSAGENS", 100))
+SMTP_POOL_IDLE_TIMEOUT = float(os.getenv("SMTP_POOL_IDLE_TIMEOUT", 30))
+SMTP_POOL_NOOP_APOS = float(os.getenv("SMTP_POOL_NOOP_APOS", 5))
+SMTP_FALHA_COOLDOWN = float(os.getenv("SMTP_FALHA_COOLDOWN", 30))
+
+
+class SessaoSMTP:
+    def __init__(self, smtp: aiosmtplib.SMTP):
+        self.smtp = smtp
+        self.mensagens = 0
+        self.ultimo_uso = time.monotonic()
+
+
+class SMTPPool:
+    """
+    Pool de sessões SMTP já autenticadas.
+
+    Cada sessão paga o connect, o STARTTLS e o AUTH uma única vez e é reaproveitada
+    entre envios. Sessões ociosas há mais de ``noop_apos`` segundos recebem um NOOP
+    antes do uso; sessões que atingem ``max_mensagens`` ou ficam ociosas além de
+    ``idle_timeout`` são encerradas e substituídas por novas.
+
+    Com ``limite_por_segundo`` o pool respeita o limite do provedor com um token bucket:
+    envios acima da taxa aguardam a vez em vez de serem recusados pelo servidor.
+    """
+
+    def __init__(
+        self,
+        config: ConnectionConfig,
+        max_size: int = SMTP_POOL_MAX_SIZE,
+        max_mensagens: int = SMTP_POOL_MAX_MENSAGENS,
+        idle_timeout: float = SMTP_POOL_IDLE_TIMEOUT,
+        noop_apos: float = SMTP_POOL_NOOP_APOS,
+        limite_por_segundo: Optional[float] = None,
+        rajada: Optional[float] = None,
+    ):
+        self.config = config
+        self.max_size = max_size
+        self.max_mensagens = max_mensagens
+        self.idle_timeout = idle_timeout
+        self.noop_apos = noop_apos
+        self.bucket = TokenBucket(limite_por_segundo, rajada) if limite_por_segundo else None
+
+        self.pendentes = 0
+        self.indisponivel_ate = 0.0
+
+        self._livres: list[SessaoSMTP] = []
+        self._semaforo = asyncio.Semaphore(max_size)
+        self._fechado = False
+
+    @property
+    def saudavel(self) -> bool:
+        return time.monotonic() >= self.indisponivel_ate
+
+    def marcar_falha(self, cooldown: float = SMTP_FALHA_COOLDOWN):
+        self.indisponivel_ate = time.monotonic() + cooldown
+
+    def carga(self) -> tuple:
+        espera = self.bucket.espera_estimada() if self.bucket else 0.0
+        return espera, self.pendentes / self.max_size
+
+    async def _aguardar_vez(self):
+        if self.bucket is not None:
+            await self.bucket.adquirir()
+
+    async def _abrir_sessao(self) -> SessaoSMTP:
+        smtp = aiosmtplib.SMTP(
+            hostname=self.config.MAIL_SERVER,
+            port=self.config.MAIL_PORT,
+            timeout=self.config.TIMEOUT,
+            use_tls=self.config.MAIL_SSL_TLS,
+            start_tls=self.config.MAIL_STARTTLS,
+            validate_certs=self.config.VALIDATE_CERTS,
+            local_hostname=self.config.LOCAL_HOSTNAME,
+            cert_bundle=self.config.CERT_BUNDLE,
+        )
+        await smtp.connect()
+
+        if self.config.USE_CREDENTIALS:
+            await smtp.login(self.config.MAIL_USERNAME, self.config.MAIL_PASSWORD.get_secret_value())
+
+        return SessaoSMTP(smtp)
+
+    async def _fechar_sessao(self, sessao: SessaoSMTP):
+        try:
+            await sessao.smtp.quit()
+        except Exception:
+            sessao.smtp.close()
+
+    async def _sessao_utilizavel(self, sessao: SessaoSMTP) -> bool:
+        ocioso = time.monotonic() - sessao.ultimo_uso
+
+        if not sessao.smtp.is_connected or ocioso > self.idle_timeout:
+            return False
+
+        if ocioso > self.noop_apos:
+            try:
+                await sessao.smtp.noop()
+            except Exception:
+                return False
+
+        return True
+
+    async def _obter_sessao(self) -> SessaoSMTP:
+        while self._livres:
+            sessao = self._livres.pop()
+
+            if await self._sessao_utilizavel(sessao):
+                return sessao
+
+            await self._fechar_sessao(sessao)
+
+        return await self._abrir_sessao()
+
+    async def _devolver_sessao(self, sessao: SessaoSMTP):
+        sessao.ultimo_uso = time.monotonic()
+
+        if self._fechado or sessao.mensagens >= self.max_mensagens:
+            await self._fechar_sessao(sessao)
+        else:
+            self._livres.append(sessao)
+
+    @asynccontextmanager
+    async def sessao(self):
+        async with self._semaforo:
+            sessao = await self._obter_sessao()
+
+            try:
+                yield sessao.smtp
+            except Exception:
+                # Uma sessão que falhou no meio de um envio não é confiável para o próximo
+                await self._fechar_sessao(sessao)
+                raise
+
+            sessao.mensagens += 1
+            await self._devolver_sessao(sessao)
+
+    async def montar_mensagem(self, message: MessageSchema):
+        remetente = self.config.MAIL_FROM
+        if self.config.MAIL_FROM_NAME is not None:
+            remetente = formataddr((self.config.MAIL_FROM_NAME, remetente))
+
+        return await MailMsg(message)._message(remetente)
+
+    async def send_message(self, message: MessageSchema):
+        mensagem = await self.montar_mensagem(message)
+        self.pendentes += 1
+
+        try:
+            await self._aguardar_vez()
+            async with self.sessao() as smtp:
+                await smtp.send_message(mensagem)
+        finally:
+            self.pendentes -= 1
+
+    async def consumir_fila(self, fila: deque, erros: list) -> Optional[Exception]:
+        """
+        Consome pares ``(indice, message)`` de uma fila que pode ser compartilhada com
+        outros pools, registrando em ``erros[indice]`` a exceção de cada envio que falhar.
+
+        Cada sessão envia mensagens em sequência até a fila acabar ou até atingir
+        ``max_mensagens``, pagando só o DATA por mensagem. Como cada pool retira itens no
+        próprio ritmo, pools mais rápidos ou com limite maior escoam mais mensagens.
+        Se o servidor ficar inacessível, o pool para de consumir e devolve o erro de
+        conexão, deixando o restante da fila para os demais.
+        """
+        erro_conexao: Optional[Exception] = None
+
+        async def enviar_da_fila():
+            nonlocal erro_conexao
+
+            while fila and erro_conexao is None:
+                async with self._semaforo:
+                    if not fila or erro_conexao is not None:
+                        return
+
+                    try:
+                        sessao = await self._obter_sessao()
+                    except Exception as e:
+                        erro_conexao = e
+                        return
+
+                    while fila and sessao.mensagens < self.max_mensagens:
+                        indice, message = fila.popleft()
+                        self.pendentes += 1
+                        try:
+                            await self._aguardar_vez()
+                            await sessao.smtp.send_message(await self.montar_mensagem(message))
+                            sessao.mensagens += 1
+                        except Exception as e:
+                            erros[indice] = e
+                            if not sessao.smtp.is_connected:
+                                break
+                        finally:
+                            self.pendentes -= 1
+
+                    if sessao.smtp.is_connected:
+                        await self._devolver_sessao(sessao)
+                    else:
+                        await self._fechar_sessao(sessao)
+
+        await asyncio.gather(*(enviar_da_fila() for _ in range(min(self.max_size, len(fila)))))
+        return erro_conexao
+
+    async def close(self):
+        self._fechado = True
+
+        while self._livres:
+            await self._fechar_sessao(self._livres.pop())
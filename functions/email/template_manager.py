@@ -0,0 +1,116 @@
+import json
+import os
+from typing import Optional, Union
+
+from jinja2 import Environment, FileSystemLoader, Template, UndefinedError, select_autoescape
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), "templates")
+
+ASSUNTOS = {
+    "cobranca_confirmada": "Cobrança confirmada",
+    "cobranca_falha": "Não foi possível realizar sua cobrança",
+    "cartao_validado": "Cartão de crédito validado",
+    "resumo_cobrancas": "Resumo das suas cobranças",
+}
+
+# Variáveis sem as quais o template não tem o que mostrar; as demais são opcionais
+VARIAVEIS_OBRIGATORIAS = {
+    "cobranca_confirmada": ("valor",),
+    "cobranca_falha": ("valor",),
+    "cartao_validado": (),
+    "resumo_cobrancas": ("cobrancas",),
+}
+
+
+class TemplateInvalido(ValueError):
+    """Variáveis ausentes ou inválidas para o template pedido."""
+
+
+def formatar_moeda(valor) -> str:
+    inteiro, centavos = f"{float(valor):,.2f}".split(".")
+    return f"R$ {inteiro.replace(',', '.')},{centavos}"
+
+
+class TemplateManager:
+    """
+    Templates de emails transacionais renderizados no servidor.
+
+    Os templates são compilados uma única vez em ``carregar`` (chamado no lifespan) e
+    mantidos em memória; com ``auto_reload`` desligado, renderizar não toca no disco.
+    """
+
+    def __init__(self):
+        self.env = Environment(
+            loader=FileSystemLoader(TEMPLATES_DIR),
+            autoescape=select_autoescape(["html"]),
+            auto_reload=False,
+        )
+        self.env.filters["moeda"] = formatar_moeda
+        self._templates: dict[str, Template] = {}
+
+    def carregar(self):
+        for template_id in ASSUNTOS:
+            self._templates[template_id] = self.env.get_template(f"{template_id}.html")
+
+    def renderizar(self, template_id: str, variaveis: Optional[dict] = None) -> str:
+        if not self._templates:
+            self.carregar()
+
+        variaveis = variaveis or {}
+        ausentes = [nome for nome in VARIAVEIS_OBRIGATORIAS[template_id] if variaveis.get(nome) is None]
+        if ausentes:
+            raise TemplateInvalido(f"Variáveis obrigatórias do template {template_id} ausentes: {', '.join(ausentes)}")
+
+        try:
+            return self._templates[template_id].render(variaveis)
+        except (UndefinedError, ValueError, TypeError) as e:
+            raise TemplateInvalido(f"Variáveis inválidas para o template {template_id}: {e}") from e
+
+    def aplicar(self, email_data: dict) -> dict:
+        template_id = email_data.get("template")
+        if template_id is None:
+            return email_data
+
+        return {
+            **email_data,
+            "assunto": email_data.get("assunto") or ASSUNTOS[template_id],
+            "mensagem": self.renderizar(template_id, email_data.get("variaveis")),
+        }
+
+    def aplicar_lote(self, emails: list[dict]) -> tuple[list[dict], list[dict]]:
+        """
+        Aplica os templates de um lote; devolve os emails prontos e, em ``rejeitados``, o
+        índice e o motivo dos que têm variáveis inválidas, sem interromper os demais.
+        """
+        # Destinatários com o mesmo template e as mesmas variáveis compartilham o corpo renderizado
+        renderizados: dict[tuple, Union[str, TemplateInvalido]] = {}
+        aplicados = []
+        rejeitados = []
+
+        for indice, email_data in enumerate(emails):
+            template_id = email_data.get("template")
+            if template_id is None:
+                aplicados.append(email_data)
+                continue
+
+            chave = (template_id, json.dumps(email_data.get("variaveis"), sort_keys=True, default=str))
+            if chave not in renderizados:
+                try:
+                    renderizados[chave] = self.renderizar(template_id, email_data.get("variaveis"))
+                except TemplateInvalido as e:
+                    renderizados[chave] = e
+
+            if isinstance(renderizados[chave], TemplateInvalido):
+                rejeitados.append({"indice": indice, "email": email_data["email"], "mensagem": str(renderizados[chave])})
+                continue
+
+            aplicados.append({
+                **email_data,
+                "assunto": email_data.get("assunto") or ASSUNTOS[template_id],
+                "mensagem": renderizados[chave],
+            })
+
+        return aplicados, rejeitados
+
+
+template_instance = TemplateManager()
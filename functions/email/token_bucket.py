@@ -0,0 +1,35 @@
+import asyncio
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    Limitador de taxa por token bucket que enfileira em vez de recusar.
+
+    ``adquirir`` reserva um token mesmo que o balde esteja vazio: o saldo fica negativo
+    e o chamador dorme até o instante em que o seu token seria reposto. Assim rajadas
+    são escoadas exatamente na taxa configurada, na ordem de chegada.
+    """
+
+    def __init__(self, taxa: float, capacidade: Optional[float] = None):
+        self.taxa = taxa
+        self.capacidade = capacidade if capacidade is not None else max(taxa, 1.0)
+        self.tokens = self.capacidade
+        self._atualizado = time.monotonic()
+
+    def _repor(self):
+        agora = time.monotonic()
+        self.tokens = min(self.capacidade, self.tokens + (agora - self._atualizado) * self.taxa)
+        self._atualizado = agora
+
+    def espera_estimada(self) -> float:
+        self._repor()
+        return max(0.0, (1 - self.tokens) / self.taxa)
+
+    async def adquirir(self):
+        self._repor()
+        self.tokens -= 1
+
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.taxa)
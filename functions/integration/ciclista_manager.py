@@ -2,13 +2,27 @@ import os
 import httpx
 from dotenv import load_dotenv
 
+from functions.cache.cache_manager import cartao_cache_instance, CARTAO_CACHE_TTL
+from functions.cache.invalidacao_manager import invalidacao_instance
+
 load_dotenv()
 
 base_url = os.getenv("CICLISTA_SERVICE_URL")
+dados_url = os.getenv("CICLISTA_DADOS_URL")
 
 
 class CiclistaManager:
     async def obter_cartao(self, ciclista_id: int) -> dict:
+        return await cartao_cache_instance.obter(ciclista_id, lambda: self._buscar_cartao(ciclista_id))
+
+    async def invalidar_cartao(self, ciclista_id: int):
+        await invalidacao_instance.publicar("cartao", [ciclista_id])
+
+    async def _buscar_cartao(self, ciclista_id: int) -> tuple[dict, float]:
+        response = await self._requisitar_cartao(ciclista_id)
+        return response, CARTAO_CACHE_TTL if response["status"] else 0
+
+    async def _requisitar_cartao(self, ciclista_id: int) -> dict:
         endpoint = f"{base_url}{ciclista_id}"
 
         async with httpx.AsyncClient() as client:
@@ -21,7 +35,23 @@ class CiclistaManager:
                     return {"status": False, "mensagem": "Ciclista não encontrado"}
             except httpx.RequestError as e:
                 print(e)
-                return {"status": False, "mensagem": "Erro ao conectar ao serviço de ciclistas"}
+                return {"status": False, "codigo": 502, "mensagem": "Erro ao conectar ao serviço de ciclistas"}
+
+
+    async def obter_ciclista(self, ciclista_id: int) -> dict:
+        endpoint = f"{dados_url}{ciclista_id}"
+
+        async with httpx.AsyncClient() as client:
+            try:
+                response = await client.get(endpoint)
+
+                if response.status_code == 200:
+                    return {"status": True, "data": response.json()}
+                else:
+                    return {"status": False, "mensagem": "Ciclista não encontrado"}
+            except httpx.RequestError as e:
+                print(e)
+                return {"status": False, "codigo": 502, "mensagem": "Erro ao conectar ao serviço de ciclistas"}
 
 
 ciclista_instance = CiclistaManager()
\ No newline at end of file
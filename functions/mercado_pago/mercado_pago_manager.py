@@ -1,10 +1,16 @@
 import os
+from typing import Optional
+
 from dotenv import load_dotenv
 import mercadopago
+from mercadopago.config import RequestOptions
 
 load_dotenv()
 sdk = mercadopago.SDK(os.getenv("MP_ACCESS_TOKEN"))
 
+# Pagamentos que ainda podem terminar aprovados
+STATUS_PENDENTES = {"pending", "in_process", "authorized"}
+
 
 class MercadoPagoManager:
 
@@ -35,7 +41,8 @@ class MercadoPagoManager:
             print(e)
             return {"status": False, "mensagem": "Erro ao validar o cartão de crédito"}
 
-    async def realiza_pagamento(self, cartao: dict, valor: float) -> dict:
+    async def realiza_pagamento(self, cartao: dict, valor: float, chave_idempotencia: Optional[str] = None,
+                                referencia: Optional[str] = None) -> dict:
         try:
             exp_month = cartao["validade"].split("-")[1]
             exp_year = cartao["validade"].split("-")[0]
@@ -70,16 +77,53 @@ class MercadoPagoManager:
                 }
             }
 
-            payment = sdk.payment().create(payment_data)
+            # Permite encontrar o pagamento depois pela cobrança, se a resposta se perder
+            if referencia is not None:
+                payment_data["external_reference"] = referencia
+
+            # Com uma chave determinística, uma repetição devolve o pagamento já criado em vez de cobrar
+            # de novo; sem ela o SDK gera uma chave aleatória por chamada
+            request_options = None
+            if chave_idempotencia is not None:
+                request_options = RequestOptions(custom_headers={"x-idempotency-key": chave_idempotencia})
+
+            payment = sdk.payment().create(payment_data, request_options)
 
             if payment["response"]["status"] == "approved":
                 return{"status": True}
+            elif payment["response"]["status"] in STATUS_PENDENTES:
+                # Em análise: ainda pode ser aprovado, então não é uma recusa
+                return {"status": False, "pendente": True, "mensagem": payment["response"]}
             else:
                 return {"status": False, "mensagem": payment["response"]}
 
         except Exception as e:
             print(e)
-            return {"status": False, "mensagem": "Erro interno"}
+            return {"status": False, "codigo": 502, "mensagem": "Erro interno"}
+
+    async def consultar_pagamento(self, referencia: str) -> dict:
+        """
+        Situação no gateway dos pagamentos criados com ``referencia``: ``aprovado`` se algum
+        foi aprovado, ``pendente`` se algum ainda está em análise, ou ``recusado`` (inclusive
+        quando nenhum pagamento chegou a ser criado).
+        """
+        try:
+            busca = sdk.payment().search({"external_reference": referencia})
+
+            if busca["status"] != 200:
+                return {"status": False, "codigo": 502, "mensagem": "Erro ao consultar o pagamento"}
+
+            situacoes = {pagamento["status"] for pagamento in busca["response"]["results"]}
+
+            if "approved" in situacoes:
+                return {"status": True, "data": "aprovado"}
+            if situacoes & STATUS_PENDENTES:
+                return {"status": True, "data": "pendente"}
+            return {"status": True, "data": "recusado"}
+
+        except Exception as e:
+            print(e)
+            return {"status": False, "codigo": 502, "mensagem": "Erro ao consultar o pagamento"}
 
 
 mercado_pago_instance = MercadoPagoManager()
\ No newline at end of file
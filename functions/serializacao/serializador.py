@@ -0,0 +1,24 @@
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from starlette.responses import JSONResponse
+
+
+def _padrao(valor: Any) -> Any:
+    # datetime, date, UUID e Enum o orjson já codifica; Decimal (numeric do Postgres) vira número
+    if isinstance(valor, Decimal):
+        return float(valor)
+    raise TypeError(f"Tipo não serializável em JSON: {type(valor).__name__}")
+
+
+def serializar(conteudo: Any) -> bytes:
+    """Serializa para JSON em UTF-8, com datas em ISO 8601 e Decimal como número."""
+    return orjson.dumps(conteudo, default=_padrao)
+
+
+class OrjsonResponse(JSONResponse):
+    """Resposta JSON padrão da aplicação, serializada com ``serializar``."""
+
+    def render(self, content: Any) -> bytes:
+        return serializar(content)
@@ -5,8 +5,15 @@ from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.exceptions import RequestValidationError
 from starlette.middleware.cors import CORSMiddleware
-from starlette.responses import JSONResponse
+from functions.cache.invalidacao_manager import invalidacao_instance
 from functions.database.asyncpg_manager import asyncpg_manager
+from functions.database.migracao_manager import migracao_instance, DB_MIGRAR_NA_INICIALIZACAO
+from functions.database.varredura_manager import varredura_instance
+from functions.email.email_manager import email_instance
+from functions.email.fila_email_manager import fila_email_instance
+from functions.email.notificacao_manager import notificacao_instance
+from functions.email.template_manager import template_instance
+from functions.serializacao.serializador import OrjsonResponse
 from routes.email.router import router as email_router
 from routes.cartao.router import router as cartao_router
 from routes.cobranca.router import router as cobranca_router
@@ -14,10 +21,23 @@ from routes.banco.router import router as banco_router
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    template_instance.carregar()
+    if DB_MIGRAR_NA_INICIALIZACAO:
+        await migracao_instance.migrar_banco()
     await asyncpg_manager.connect()
+    await invalidacao_instance.start(asyncpg_manager.pool)
+    await email_instance.connect()
+    await fila_email_instance.start()
+    await notificacao_instance.start()
+    await varredura_instance.start()
     yield
+    await varredura_instance.stop()
+    await notificacao_instance.stop()
+    await fila_email_instance.stop()
+    await email_instance.disconnect()
+    await invalidacao_instance.stop()
     await asyncpg_manager.disconnect()
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=OrjsonResponse)
 load_dotenv()
 
 app.add_middleware(
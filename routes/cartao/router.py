@@ -1,8 +1,9 @@
 from fastapi import APIRouter
-from starlette.responses import JSONResponse
 
 from entities.cartao.cartao import Cartao
+from functions.integration.ciclista_manager import ciclista_instance
 from functions.mercado_pago.mercado_pago_manager import mercado_pago_instance
+from functions.serializacao.serializador import OrjsonResponse
 
 router = APIRouter()
 
@@ -14,10 +15,20 @@ async def valida_cartao(cartao: Cartao):
         response = await mercado_pago_instance.valida_cartao(cartao)
 
         if not response["status"]:
-            return JSONResponse(status_code=400, content={"codigo": 400, "mensagem": response["mensagem"]})
+            return OrjsonResponse(status_code=400, content={"codigo": 400, "mensagem": response["mensagem"]})
 
-        return JSONResponse(status_code=200, content=response["mensagem"])
+        return OrjsonResponse(status_code=200, content=response["mensagem"])
 
     except Exception as e:
         print(e)
-        return JSONResponse(status_code=500, content={"mensagem": "Erro interno do servidor"})
\ No newline at end of file
+        return OrjsonResponse(status_code=500, content={"mensagem": "Erro interno do servidor"})
+
+@router.post("/invalidarCartao/{ciclista_id}")
+async def invalidar_cartao(ciclista_id: int):
+    try:
+        await ciclista_instance.invalidar_cartao(ciclista_id)
+        return OrjsonResponse(status_code=200, content={"mensagem": "Cartão removido do cache"})
+
+    except Exception as e:
+        print(e)
+        return OrjsonResponse(status_code=500, content={"mensagem": "Erro interno do servidor"})
@@ -1,65 +1,241 @@
-from fastapi import APIRouter
-from starlette.responses import JSONResponse
-
-from entities.cobranca.cobranca import CobrancaRequest
+import os
+import zlib
+from contextlib import aclosing
+from datetime import datetime
+from typing import Optional
+
+from dotenv import load_dotenv
+from fastapi import APIRouter, Header, Query
+from starlette.background import BackgroundTask
+from starlette.responses import Response, StreamingResponse
+
+from entities.cobranca.cobranca import Cobranca, CobrancaRequest, StatusCobranca
+from functions.cache.cache_manager import cobranca_cache_instance, COBRANCA_CACHE_TTL, ESTADOS_FINAIS
 from functions.database.asyncpg_manager import asyncpg_manager
+from functions.database.idempotencia_manager import idempotencia_instance
+from functions.serializacao.serializador import OrjsonResponse, serializar
+
+load_dotenv()
+
+COBRANCA_LOTE_MAX = int(os.getenv("COBRANCA_LOTE_MAX", 500))
+FILA_COBRANCA_LOTE_MAX = int(os.getenv("FILA_COBRANCA_LOTE_MAX", 50000))
+
+FORMATOS_EXPORTACAO = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
 
 router = APIRouter()
+async def _realizar_cobranca(cobranca: dict, chave_gateway: Optional[str]) -> Response:
+    try:
+        response = await asyncpg_manager.realizar_cobranca(cobranca, chave_gateway)
+
+        # Erros transitórios vêm com código 5xx e não ficam gravados na chave de idempotência
+        if not response["status"]:
+            return OrjsonResponse(status_code=response.get("codigo") or 400, content=response["mensagem"])
+
+        return Response(status_code=200, content=response["data"].json, media_type="application/json")
+
+    except Exception as e:
+        print(e)
+        return OrjsonResponse(status_code=500, content={"mensagem": "Erro interno do servidor"})
+
 @router.post("/cobranca")
-async def realiza_cobranca(cobranca: CobrancaRequest):
+async def realiza_cobranca(cobranca: CobrancaRequest, idempotency_key: Optional[str] = Header(None, max_length=255)):
     cobranca = cobranca.model_dump()
 
     try:
-        response = await asyncpg_manager.realizar_cobranca(cobranca)
+        chave_gateway = idempotencia_instance.chave_externa("cobranca", idempotency_key, cobranca)
+        return await idempotencia_instance.executar("cobranca", idempotency_key, cobranca,
+                                                    lambda: _realizar_cobranca(cobranca, chave_gateway))
+
+    except Exception as e:
+        print(e)
+        return OrjsonResponse(status_code=500, content={"mensagem": "Erro interno do servidor"})
+
+def _serializar_cobranca(cobranca: Cobranca) -> tuple[dict, Optional[float]]:
+    # Guarda o corpo já serializado pelo banco: um hit não consulta o banco de novo
+    ttl = None if cobranca.status in ESTADOS_FINAIS else COBRANCA_CACHE_TTL
+    return {"status": True, "data": cobranca.json}, ttl
+
+async def _carregar_cobranca(cobranca_id: int) -> tuple[dict, Optional[float]]:
+    response = await asyncpg_manager.get_cobranca_by_id(cobranca_id)
+    if not response["status"]:
+        return response, 0
+
+    return _serializar_cobranca(response["data"])
+
+@router.get("/cobranca/{cobranca_id}")
+async def get_cobranca(cobranca_id: int):
+    try:
+        response = await cobranca_cache_instance.obter(cobranca_id, lambda: _carregar_cobranca(cobranca_id))
 
         if not response["status"]:
-            return JSONResponse(status_code=400, content=response["mensagem"])
+            return OrjsonResponse(status_code=404, content={"mensagem": response["mensagem"]})
 
-        return JSONResponse(status_code=200, content=response["data"])
+        return Response(status_code=200, content=response["data"], media_type="application/json")
 
     except Exception as e:
         print(e)
-        return JSONResponse(status_code=500, content={"mensagem": "Erro interno do servidor"})
+        return OrjsonResponse(status_code=500, content={"mensagem": "Erro interno do servidor"})
+
+@router.post("/consultaCobrancasEmLote")
+async def consulta_cobrancas_em_lote(cobranca_ids: list[int]):
+    if len(cobranca_ids) > COBRANCA_LOTE_MAX:
+        return OrjsonResponse(status_code=400, content={"mensagem": f"O lote deve ter no máximo {COBRANCA_LOTE_MAX} cobranças"})
 
-@router.get("/cobranca/{cobranca_id}")
-async def get_cobranca(cobranca_id: int):
     try:
-        response = await asyncpg_manager.get_cobranca_by_id(cobranca_id)
+        cobranca_ids = list(dict.fromkeys(cobranca_ids))
+        corpos = {}
+        for cobranca_id in cobranca_ids:
+            em_cache = cobranca_cache_instance.get(cobranca_id)
+            if em_cache is not None:
+                corpos[cobranca_id] = em_cache["data"]
+
+        faltantes = [cobranca_id for cobranca_id in cobranca_ids if cobranca_id not in corpos]
+        if faltantes:
+            # Cobranças alteradas durante a consulta são devolvidas, mas não guardadas
+            with cobranca_cache_instance.leitura() as marca:
+                response = await asyncpg_manager.get_cobrancas_by_ids(faltantes)
+                if not response["status"]:
+                    return OrjsonResponse(status_code=500, content={"mensagem": response["mensagem"]})
+
+                for cobranca in response["data"]:
+                    serializada, ttl = _serializar_cobranca(cobranca)
+                    cobranca_cache_instance.set(cobranca.id, serializada, ttl, marca)
+                    corpos[cobranca.id] = serializada["data"]
+
+        # A resposta é montada com os corpos já serializados de cada cobrança
+        encontradas = b",".join(corpos[cobranca_id] for cobranca_id in cobranca_ids if cobranca_id in corpos)
+        nao_encontradas = [cobranca_id for cobranca_id in cobranca_ids if cobranca_id not in corpos]
+        conteudo = b'{"encontradas":[' + encontradas + b'],"nao_encontradas":' + serializar(nao_encontradas) + b"}"
+
+        return Response(status_code=200, content=conteudo, media_type="application/json")
+
+    except Exception as e:
+        print(e)
+        return OrjsonResponse(status_code=500, content={"mensagem": "Erro interno do servidor"})
+
+@router.get("/cobrancas")
+async def listar_cobrancas(ciclista: Optional[int] = None, status: Optional[StatusCobranca] = None,
+                           desde: Optional[datetime] = None, ate: Optional[datetime] = None,
+                           after_id: Optional[int] = None, limite: int = Query(50, ge=1, le=500)):
+    try:
+        response = await asyncpg_manager.listar_cobrancas(ciclista, status.value if status else None, desde, ate, after_id, limite)
+
+        if not response["status"]:
+            return OrjsonResponse(status_code=500, content={"mensagem": response["mensagem"]})
+
+        conteudo = (b'{"cobrancas":[' + b",".join(response["data"]["cobrancas"]) + b'],"proximo":'
+                    + serializar(response["data"]["proximo"]) + b"}")
+        return Response(status_code=200, content=conteudo, media_type="application/json")
+
+    except Exception as e:
+        print(e)
+        return OrjsonResponse(status_code=500, content={"mensagem": "Erro interno do servidor"})
+
+async def _comprimir(pedacos):
+    compressor = zlib.compressobj(wbits=31)
+    async with aclosing(pedacos):
+        async for pedaco in pedacos:
+            comprimido = compressor.compress(pedaco)
+            if comprimido:
+                yield comprimido
+    yield compressor.flush()
+
+async def _fechar(pedacos):
+    await pedacos.aclose()
+
+@router.get("/cobrancas/exportar")
+async def exportar_cobrancas(formato: str = Query("csv", pattern="^(csv|ndjson)$"), ciclista: Optional[int] = None,
+                             status: Optional[StatusCobranca] = None, desde: Optional[datetime] = None,
+                             ate: Optional[datetime] = None, gzip: bool = False):
+    pedacos = asyncpg_manager.exportar_cobrancas(formato, ciclista, status.value if status else None, desde, ate)
+
+    try:
+        # O primeiro pedaço é lido antes de responder: se a consulta falhar, ainda dá para devolver 500
+        primeiro = await anext(pedacos, b"")
+    except Exception as e:
+        print(e)
+        await pedacos.aclose()
+        return OrjsonResponse(status_code=500, content={"mensagem": "Erro ao exportar as cobranças"})
+
+    async def conteudo():
+        # Fechar o gerador da exportação devolve a conexão ao pool e encerra o COPY
+        async with aclosing(pedacos):
+            yield primeiro
+            async for pedaco in pedacos:
+                yield pedaco
+
+    arquivo = f"cobrancas.{formato}"
+    media_type = FORMATOS_EXPORTACAO[formato]
+    corpo = conteudo()
+    if gzip:
+        arquivo += ".gz"
+        media_type = "application/gzip"
+        corpo = _comprimir(corpo)
+
+    # O StreamingResponse não fecha o iterador quando o cliente desconecta; a tarefa de fundo
+    # fecha a cadeia de geradores em vez de deixar a conexão presa até o coletor de lixo
+    return StreamingResponse(corpo, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{arquivo}"'},
+                             background=BackgroundTask(_fechar, corpo))
+
+async def _colocar_cobranca_na_fila(cobranca: dict, idempotency_key: Optional[str]) -> Response:
+    async def concluir_chave(connection, enfileirada: Cobranca):
+        # A resposta da chave é gravada na transação do INSERT: uma repetição depois de uma
+        # queda entre os dois recebe a cobrança já enfileirada em vez de enfileirar outra
+        await idempotencia_instance.concluir(connection, "filaCobranca", idempotency_key, 200, enfileirada.json)
+
+    try:
+        response = await asyncpg_manager.colocar_cobranca_na_fila(cobranca, concluir_chave if idempotency_key else None)
 
         if not response["status"]:
-            return JSONResponse(status_code=404, content={"mensagem": response["mensagem"]})
+            return OrjsonResponse(status_code=response.get("codigo") or 400, content={"mensagem": response["mensagem"]})
 
-        return JSONResponse(status_code=200, content=response["data"])
+        return Response(status_code=200, content=response["data"].json, media_type="application/json")
 
     except Exception as e:
         print(e)
-        return JSONResponse(status_code=500, content={"mensagem": "Erro interno do servidor"})
+        return OrjsonResponse(status_code=500, content={"mensagem": "Erro interno do servidor"})
 
 @router.post("/filaCobranca")
-async def colocar_cobranca_na_fila(cobranca: CobrancaRequest):
+async def colocar_cobranca_na_fila(cobranca: CobrancaRequest, idempotency_key: Optional[str] = Header(None, max_length=255)):
     cobranca = cobranca.model_dump()
 
     try:
-        response = await asyncpg_manager.colocar_cobranca_na_fila(cobranca)
+        return await idempotencia_instance.executar("filaCobranca", idempotency_key, cobranca,
+                                                    lambda: _colocar_cobranca_na_fila(cobranca, idempotency_key))
+
+    except Exception as e:
+        print(e)
+        return OrjsonResponse(status_code=500, content={"mensagem": "Erro interno do servidor"})
+
+@router.post("/filaCobrancaEmLote")
+async def colocar_cobrancas_na_fila(cobrancas: list[CobrancaRequest]):
+    if len(cobrancas) > FILA_COBRANCA_LOTE_MAX:
+        return OrjsonResponse(status_code=400, content={"mensagem": f"O lote deve ter no máximo {FILA_COBRANCA_LOTE_MAX} cobranças"})
+
+    cobrancas = [cobranca.model_dump() for cobranca in cobrancas]
+
+    try:
+        response = await asyncpg_manager.colocar_cobrancas_na_fila(cobrancas)
 
         if not response["status"]:
-            return JSONResponse(status_code=400, content={"mensagem": response["mensagem"]})
+            return OrjsonResponse(status_code=500, content={"mensagem": response["mensagem"]})
 
-        return JSONResponse(status_code=200, content=response["data"])
+        return OrjsonResponse(status_code=200, content=response["data"])
 
     except Exception as e:
         print(e)
-        return JSONResponse(status_code=500, content={"mensagem": "Erro interno do servidor"})
+        return OrjsonResponse(status_code=500, content={"mensagem": "Erro interno do servidor"})
 
 @router.post("/processaCobrancasEmFila")
-async def processa_cobrancas_em_fila():
+async def processa_cobrancas_em_fila(notificar: Optional[bool] = None):
     try:
-        response = await asyncpg_manager.processar_fila_cobrancas()
+        response = await asyncpg_manager.processar_fila_cobrancas(notificar)
         if not response["status"]:
-            return JSONResponse(status_code=400, content={"mensagem": response["mensagem"]})
+            return OrjsonResponse(status_code=400, content={"mensagem": response["mensagem"]})
 
-        return JSONResponse(status_code=200, content=response["data"])
+        conteudo = b"[" + b",".join(cobranca.json for cobranca in response["data"]) + b"]"
+        return Response(status_code=200, content=conteudo, media_type="application/json")
 
     except Exception as e:
         print(e)
-        return JSONResponse(status_code=500, content={"mensagem": "Erro interno do servidor"})
\ No newline at end of file
+        return OrjsonResponse(status_code=500, content={"mensagem": "Erro interno do servidor"})
\ No newline at end of file
@@ -1,8 +1,17 @@
+import os
+
+from dotenv import load_dotenv
 from fastapi import APIRouter
-from starlette.responses import JSONResponse
 
 from entities.email.email import EmailRequest
 from functions.email.email_manager import email_instance
+from functions.email.fila_email_manager import fila_email_instance
+from functions.email.template_manager import TemplateInvalido, template_instance
+from functions.serializacao.serializador import OrjsonResponse
+
+load_dotenv()
+
+EMAIL_LOTE_MAX = int(os.getenv("EMAIL_LOTE_MAX", 5000))
 
 router = APIRouter()
 
@@ -12,13 +21,63 @@ async def sendEmail(email: EmailRequest):
     email = email.model_dump()
 
     try:
-        response = await email_instance.send_email(email)
+        email = template_instance.aplicar(email)
+    except TemplateInvalido as e:
+        return OrjsonResponse(status_code=422, content={"mensagem": str(e)})
+
+    try:
+        response = await fila_email_instance.enfileirar_email(email)
+
+        if not response["status"]:
+            return OrjsonResponse(status_code=500, content={"mensagem": response["mensagem"]})
+
+        return OrjsonResponse(status_code=202, content=response["data"])
+
+    except Exception as e:
+        print(e)
+        return OrjsonResponse(status_code=500, content={"message": "Erro interno do servidor"})
+
+@router.get("/email/{email_id}")
+async def get_email(email_id: int):
+    try:
+        response = await fila_email_instance.get_email_by_id(email_id)
 
         if not response["status"]:
-            return JSONResponse(status_code=404, content={"codigo": response["status"], "messagem": response["message"]})
+            return OrjsonResponse(status_code=404, content={"mensagem": response["mensagem"]})
+
+        return OrjsonResponse(status_code=200, content=response["data"])
+
+    except Exception as e:
+        print(e)
+        return OrjsonResponse(status_code=500, content={"mensagem": "Erro interno do servidor"})
+
+@router.post("/enviarEmailsEmLote")
+async def send_emails(emails: list[EmailRequest]):
+    if len(emails) > EMAIL_LOTE_MAX:
+        return OrjsonResponse(status_code=400, content={"mensagem": f"O lote deve ter no máximo {EMAIL_LOTE_MAX} emails"})
+
+    emails = [email.model_dump() for email in emails]
+
+    try:
+        # Emails com variáveis inválidas voltam como falha no próprio item; os demais são enviados
+        emails, rejeitados = template_instance.aplicar_lote(emails)
+
+        if not emails:
+            data = {"enviados": 0, "falhas": 0, "resultados": []}
+        else:
+            response = await email_instance.send_emails(emails)
+
+            if not response["status"]:
+                return OrjsonResponse(status_code=500, content={"mensagem": response["mensagem"]})
+
+            data = response["data"]
+
+        resultados = list(data["resultados"])
+        for rejeitado in rejeitados:
+            resultados.insert(rejeitado["indice"], {"email": rejeitado["email"], "status": False, "mensagem": rejeitado["mensagem"]})
 
-        return JSONResponse(status_code=200, content=response["data"])
+        return OrjsonResponse(status_code=200, content={**data, "falhas": data["falhas"] + len(rejeitados), "resultados": resultados})
 
     except Exception as e:
         print(e)
-        return JSONResponse(status_code=500, content={"message": "Erro interno do servidor"})
+        return OrjsonResponse(status_code=500, content={"mensagem": "Erro interno do servidor"})
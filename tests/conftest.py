@@ -16,6 +16,18 @@ os.environ["MAIL_PORT"] = "587"
 os.environ["MAIL_SERVER"] = "smtp.test.com"
 
 
+@pytest.fixture(autouse=True)
+def limpar_caches():
+    """Impede que cobranças e cartões em cache vazem de um teste para outro."""
+    from functions.cache.cache_manager import cobranca_cache_instance, cartao_cache_instance
+
+    cobranca_cache_instance.limpar()
+    cartao_cache_instance.limpar()
+    yield
+    cobranca_cache_instance.limpar()
+    cartao_cache_instance.limpar()
+
+
 @pytest.fixture
 def mock_asyncpg_pool():
     """Mock para o pool de conexões do asyncpg."""
@@ -1,7 +1,7 @@
 import pytest
 from pydantic import ValidationError
 
-from entities.cobranca.cobranca import CobrancaRequest
+from entities.cobranca.cobranca import Cobranca, CobrancaRequest
 
 
 class TestCobrancaRequest:
@@ -70,3 +70,22 @@ class TestCobrancaRequest:
         cobranca = CobrancaRequest(valor=0.01, ciclista=1)
         assert cobranca.valor == 0.01
 
+
+class TestCobranca:
+    """Testes para o tipo Cobranca usado entre o banco e a resposta."""
+
+    def test_de_registro_reaproveita_campos(self):
+        """Testa que a cobrança usa os mesmos objetos do registro, sem cópia."""
+        corpo = b'{"id":1,"status":"FINALIZADA"}'
+        cobranca = Cobranca.de_registro({"id": 1, "status": "FINALIZADA", "json": corpo})
+
+        assert cobranca == Cobranca(1, "FINALIZADA", corpo)
+        assert cobranca.json is corpo
+
+    def test_cobranca_sem_dict_de_instancia(self):
+        """Testa que a cobrança usa slots em vez de um __dict__ por instância."""
+        cobranca = Cobranca(1, "FINALIZADA", b"{}")
+
+        assert not hasattr(cobranca, "__dict__")
+        with pytest.raises(AttributeError):
+            cobranca.valor = 10
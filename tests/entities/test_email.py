@@ -1,7 +1,7 @@
 import pytest
 from pydantic import ValidationError
 
-from entities.email.email import Email, EmailRequest
+from entities.email.email import Email, EmailRequest, TemplateEmail
 
 
 class TestEmail:
@@ -142,7 +142,9 @@ class TestEmailRequest:
         assert data == {
             "email": "test@example.com",
             "assunto": "Assunto Teste",
-            "mensagem": "Corpo da mensagem"
+            "mensagem": "Corpo da mensagem",
+            "template": None,
+            "variaveis": None
         }
 
     def test_email_request_email_com_subdominio(self):
@@ -183,3 +185,20 @@ class TestEmailRequest:
         )
         assert len(email_request.mensagem) == 10000
 
+    def test_email_request_com_template(self):
+        """Testa que um template dispensa assunto e mensagem."""
+        email_request = EmailRequest(
+            email="test@example.com",
+            template="cobranca_confirmada",
+            variaveis={"valor": 15.5}
+        )
+        assert email_request.template == TemplateEmail.COBRANCA_CONFIRMADA
+        assert email_request.mensagem is None
+
+    def test_email_request_template_inexistente(self):
+        """Testa que um template desconhecido falha."""
+        with pytest.raises(ValidationError):
+            EmailRequest(
+                email="test@example.com",
+                template="inexistente"
+            )
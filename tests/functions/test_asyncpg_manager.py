@@ -1,8 +1,24 @@
+import asyncio
+import json
+import os
+import uuid
+
+import asyncpg
 import pytest
 from unittest.mock import AsyncMock, patch, MagicMock
 from datetime import datetime
 
-from functions.database.asyncpg_manager import AsyncpgManager
+from functions.database.asyncpg_manager import (AsyncpgManager, COBRANCA_LOCK, DB_POOL_MIN_SIZE, DB_POOL_MAX_QUERIES, DB_STATEMENT_CACHE_SIZE,
+                                                QUERY_COBRANCA_FALHA, QUERY_COBRANCA_FINALIZADA, QUERY_DESCARTAR_COBRANCA,
+                                                QUERY_CONCLUIR_COBRANCA, QUERY_REAGENDAR_COBRANCA, QUERY_REIVINDICAR_COBRANCAS, QUERY_RENOVAR_LEASE,
+                                                QUERY_TRAVAR_CICLISTA, recusa_definitiva,
+                                                FILA_COBRANCAS_ATRASO_MAX, FILA_COBRANCAS_ATRASO_RETENTATIVA, FILA_COBRANCAS_JANELA,
+                                                FILA_COBRANCAS_PESO_PRIORIDADE, PRIORIDADE_ALTA, PRIORIDADE_NORMAL,
+                                                FILA_COBRANCAS_LEASE, FILA_COBRANCAS_LOTE, FILA_COBRANCAS_MAX_TENTATIVAS, NOTIFICAR_COBRANCAS)
+from functions.database.migracao_manager import MigracaoManager
+
+# Banco descartável para os testes que executam as consultas de verdade; sem ele são pulados
+TEST_DB_URL = os.getenv("TEST_DB_URL")
 
 
 class MockAsyncContextManager:
@@ -17,6 +33,21 @@ class MockAsyncContextManager:
         return None
 
 
+def linha_cobranca(cobranca: dict) -> dict:
+    """Linha de cobrança como o banco devolve, com o JSON montado pelo Postgres."""
+    return {"id": cobranca["id"], "status": cobranca["status"], "json": json.dumps(cobranca, default=str).encode()}
+
+
+class MockCursor:
+    """Helper class para simular o cursor assíncrono do asyncpg."""
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def __aiter__(self):
+        for row in self.rows:
+            yield row
+
+
 class TestAsyncpgManager:
     """Testes para o AsyncpgManager."""
 
@@ -35,6 +66,7 @@ class TestAsyncpgManager:
         # Configurar o context manager para acquire
         pool.acquire.return_value = MockAsyncContextManager(connection)
         pool.close = AsyncMock()
+        connection.transaction = MagicMock(return_value=MockAsyncContextManager(None))
         
         return pool, connection
 
@@ -65,6 +97,32 @@ class TestAsyncpgManager:
             mock_create_pool.assert_called_once()
             assert asyncpg_manager.pool == mock_pool
 
+    @pytest.mark.asyncio
+    async def test_connect_configura_pool(self, asyncpg_manager):
+        """Testa que o pool é criado com os limites configurados, sem hook de inicialização."""
+        with patch("asyncpg.create_pool", new_callable=AsyncMock) as mock_create_pool:
+            await asyncpg_manager.connect()
+
+            kwargs = mock_create_pool.call_args.kwargs
+            assert kwargs["min_size"] == DB_POOL_MIN_SIZE
+            assert kwargs["max_queries"] == DB_POOL_MAX_QUERIES
+            assert kwargs["statement_cache_size"] == DB_STATEMENT_CACHE_SIZE
+            assert "init" not in kwargs
+
+    @pytest.mark.asyncio
+    async def test_connect_modo_pgbouncer(self):
+        """Testa que o modo PgBouncer desliga o cache de statements."""
+        manager = AsyncpgManager(dsn="postgresql://pgbouncer:6432/test", pgbouncer=True)
+
+        with patch("asyncpg.create_pool", new_callable=AsyncMock) as mock_create_pool:
+            await manager.connect()
+
+            kwargs = mock_create_pool.call_args.kwargs
+            assert kwargs["dsn"] == "postgresql://pgbouncer:6432/test"
+            assert kwargs["statement_cache_size"] == 0
+            assert "init" not in kwargs
+            assert "server_settings" not in kwargs
+
     @pytest.mark.asyncio
     async def test_connect_ja_conectado(self, asyncpg_manager):
         """Testa que connect não cria novo pool se já conectado."""
@@ -105,14 +163,14 @@ class TestAsyncpgManager:
         connection.fetchval.return_value = 1
 
         # Mock da consulta de finalização
-        mock_row = {
+        mock_row = linha_cobranca({
             "id": 1,
             "status": "FINALIZADA",
             "hora_solicitacao": datetime.now(),
             "hora_finalizacao": datetime.now(),
             "valor": 100.00,
             "ciclista": 1
-        }
+        })
         connection.fetchrow.return_value = mock_row
 
         with patch("functions.database.asyncpg_manager.ciclista_instance") as mock_ciclista:
@@ -128,7 +186,83 @@ class TestAsyncpgManager:
 
                 assert result["status"] is True
                 assert "data" in result
-                assert result["data"]["id"] == 1
+                assert result["data"].id == 1
+
+    @pytest.mark.asyncio
+    async def test_realizar_cobranca_repassa_chave_idempotencia(self, asyncpg_manager, mock_pool, cobranca_data, cartao_data):
+        """Testa que a Idempotency-Key do cliente chega ao gateway."""
+        pool, connection = mock_pool
+        asyncpg_manager.pool = pool
+
+        connection.fetchval.return_value = 1
+        connection.fetchrow.return_value = linha_cobranca({"id": 1, "status": "FINALIZADA"})
+
+        with patch("functions.database.asyncpg_manager.ciclista_instance") as mock_ciclista:
+            mock_ciclista.obter_cartao = AsyncMock(return_value={"status": True, "data": cartao_data})
+
+            with patch("functions.database.asyncpg_manager.mercado_pago_instance") as mock_mp:
+                mock_mp.realiza_pagamento = AsyncMock(return_value={"status": True})
+
+                await asyncpg_manager.realizar_cobranca(cobranca_data, "chave-1")
+
+                mock_mp.realiza_pagamento.assert_called_once_with(cartao_data, cobranca_data["valor"], "chave-1", "cobranca-1")
+
+    @pytest.mark.asyncio
+    async def test_realizar_cobranca_trava_ciclista_no_banco(self, asyncpg_manager, mock_pool, cobranca_data, cartao_data):
+        """Testa que o pagamento roda dentro do advisory lock de transação do ciclista."""
+        pool, connection = mock_pool
+        asyncpg_manager.pool = pool
+
+        connection.fetchval.return_value = 1
+        connection.fetchrow.return_value = linha_cobranca({"id": 1, "status": "FINALIZADA"})
+
+        with patch("functions.database.asyncpg_manager.ciclista_instance") as mock_ciclista:
+            mock_ciclista.obter_cartao = AsyncMock(return_value={"status": True, "data": cartao_data})
+
+            with patch("functions.database.asyncpg_manager.mercado_pago_instance") as mock_mp:
+                mock_mp.realiza_pagamento = AsyncMock(return_value={"status": True})
+
+                await asyncpg_manager.realizar_cobranca(cobranca_data)
+
+                connection.transaction.assert_called_once_with()
+                connection.execute.assert_any_call(QUERY_TRAVAR_CICLISTA, COBRANCA_LOCK, cobranca_data["ciclista"])
+                assert asyncpg_manager._travas_ciclistas == {}
+
+    @pytest.mark.asyncio
+    async def test_realizar_cobranca_serializa_mesmo_ciclista(self, asyncpg_manager, mock_pool, cartao_data):
+        """Testa que cobranças do mesmo ciclista não pagam em paralelo e ciclistas diferentes sim."""
+        pool, connection = mock_pool
+        asyncpg_manager.pool = pool
+
+        connection.fetchval.return_value = 1
+        connection.fetchrow.return_value = linha_cobranca({"id": 1, "status": "FINALIZADA"})
+
+        em_andamento = {}
+        maximo = {}
+
+        async def realiza_pagamento(cartao, valor, chave, referencia):
+            ciclista = int(valor)
+            em_andamento[ciclista] = em_andamento.get(ciclista, 0) + 1
+            maximo[ciclista] = max(maximo.get(ciclista, 0), em_andamento[ciclista])
+            maximo["total"] = max(maximo.get("total", 0), sum(em_andamento.values()))
+            await asyncio.sleep(0.01)
+            em_andamento[ciclista] -= 1
+            return {"status": True}
+
+        with patch("functions.database.asyncpg_manager.ciclista_instance") as mock_ciclista:
+            mock_ciclista.obter_cartao = AsyncMock(return_value={"status": True, "data": cartao_data})
+
+            with patch("functions.database.asyncpg_manager.mercado_pago_instance") as mock_mp:
+                mock_mp.realiza_pagamento = AsyncMock(side_effect=realiza_pagamento)
+
+                await asyncio.gather(*[
+                    asyncpg_manager.realizar_cobranca({"valor": ciclista, "ciclista": ciclista})
+                    for ciclista in (1, 1, 1, 2, 2)
+                ])
+
+        assert maximo[1] == 1 and maximo[2] == 1
+        assert maximo["total"] == 2
+        assert asyncpg_manager._travas_ciclistas == {}
 
     @pytest.mark.asyncio
     async def test_realizar_cobranca_cartao_nao_encontrado(self, asyncpg_manager, mock_pool, cobranca_data):
@@ -171,7 +305,59 @@ class TestAsyncpgManager:
 
                 assert result["status"] is False
                 assert "Pagamento rejeitado" in result["mensagem"]
-                connection.execute.assert_called_once()  # Deve marcar como FALHA
+                connection.execute.assert_any_call(QUERY_COBRANCA_FALHA, 1)  # Deve marcar como FALHA
+                assert connection.execute.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_realizar_cobranca_aprovada_com_falha_no_commit(self, asyncpg_manager, mock_pool, cobranca_data, cartao_data):
+        """Testa que um pagamento aprovado cujo commit falha é finalizado de novo, e não marcado como FALHA."""
+        pool, connection = mock_pool
+        asyncpg_manager.pool = pool
+
+        class TransacaoComFalhaNoCommit(MockAsyncContextManager):
+            async def __aexit__(self, exc_type, exc_val, exc_tb):
+                raise Exception("Conexão perdida no commit")
+
+        connection.transaction = MagicMock(return_value=TransacaoComFalhaNoCommit(None))
+        connection.fetchval.return_value = 1
+        connection.fetchrow.return_value = linha_cobranca({"id": 1, "status": "FINALIZADA"})
+
+        with patch("functions.database.asyncpg_manager.ciclista_instance") as mock_ciclista, \
+                patch("functions.database.asyncpg_manager.mercado_pago_instance") as mock_mp:
+            mock_ciclista.obter_cartao = AsyncMock(return_value={"status": True, "data": cartao_data})
+            mock_mp.realiza_pagamento = AsyncMock(return_value={"status": True})
+
+            result = await asyncpg_manager.realizar_cobranca(cobranca_data)
+
+        assert result["status"] is True
+        assert [chamada.args for chamada in connection.fetchrow.call_args_list] == [(QUERY_COBRANCA_FINALIZADA, 1)] * 2
+        assert (QUERY_COBRANCA_FALHA, 1) not in [chamada.args for chamada in connection.execute.call_args_list]
+
+    @pytest.mark.asyncio
+    async def test_realizar_cobranca_publica_depois_do_commit(self, asyncpg_manager, mock_pool, cobranca_data, cartao_data):
+        """Testa que a invalidação é publicada só depois que a transação do pagamento termina."""
+        pool, connection = mock_pool
+        asyncpg_manager.pool = pool
+        eventos = []
+
+        class Transacao(MockAsyncContextManager):
+            async def __aexit__(self, exc_type, exc_val, exc_tb):
+                eventos.append("commit")
+
+        connection.transaction = MagicMock(return_value=Transacao(None))
+        connection.fetchval.return_value = 1
+        connection.fetchrow.return_value = linha_cobranca({"id": 1, "status": "FINALIZADA"})
+
+        with patch("functions.database.asyncpg_manager.ciclista_instance") as mock_ciclista, \
+                patch("functions.database.asyncpg_manager.mercado_pago_instance") as mock_mp, \
+                patch("functions.database.asyncpg_manager.invalidacao_instance") as mock_invalidacao:
+            mock_ciclista.obter_cartao = AsyncMock(return_value={"status": True, "data": cartao_data})
+            mock_mp.realiza_pagamento = AsyncMock(return_value={"status": True})
+            mock_invalidacao.publicar = AsyncMock(side_effect=lambda *args: eventos.append("publicar"))
+
+            await asyncpg_manager.realizar_cobranca(cobranca_data)
+
+        assert eventos == ["commit", "publicar"]
 
     @pytest.mark.asyncio
     async def test_realizar_cobranca_excecao(self, asyncpg_manager, mock_pool, cobranca_data, cartao_data):
@@ -193,6 +379,7 @@ class TestAsyncpgManager:
                 result = await asyncpg_manager.realizar_cobranca(cobranca_data)
 
                 assert result["status"] is False
+                assert result["codigo"] == 500
                 assert "Erro ao processar" in result["mensagem"]
 
     @pytest.mark.asyncio
@@ -201,20 +388,22 @@ class TestAsyncpgManager:
         pool, connection = mock_pool
         asyncpg_manager.pool = pool
 
-        mock_row = {
+        mock_row = linha_cobranca({
             "id": 1,
             "status": "FINALIZADA",
             "hora_solicitacao": datetime.now(),
             "hora_finalizacao": datetime.now(),
             "valor": 100.00,
             "ciclista": 1
-        }
+        })
         connection.fetchrow.return_value = mock_row
 
         result = await asyncpg_manager.get_cobranca_by_id(1)
 
         assert result["status"] is True
-        assert result["data"]["id"] == 1
+        assert result["data"].id == 1
+        assert json.loads(result["data"].json)["status"] == "FINALIZADA"
+        assert "json_build_object" in connection.fetchrow.call_args.args[0]
 
     @pytest.mark.asyncio
     async def test_get_cobranca_by_id_nao_encontrada(self, asyncpg_manager, mock_pool):
@@ -242,20 +431,295 @@ class TestAsyncpgManager:
         assert result["status"] is False
         assert "Erro ao buscar" in result["mensagem"]
 
+    @pytest.mark.asyncio
+    async def test_get_cobranca_by_id_le_da_replica(self, asyncpg_manager, mock_pool):
+        """Testa que a consulta por id usa o pool de leitura quando configurado."""
+        pool, connection = mock_pool
+        read_pool, read_connection = MagicMock(), AsyncMock()
+        read_pool.acquire.return_value = MockAsyncContextManager(read_connection)
+        read_connection.fetchrow.return_value = linha_cobranca({"id": 1, "status": "FINALIZADA", "hora_solicitacao": datetime.now(),
+                                                                "hora_finalizacao": None, "valor": 10.00, "ciclista": 1})
+        asyncpg_manager.pool = pool
+        asyncpg_manager.read_pool = read_pool
+
+        result = await asyncpg_manager.get_cobranca_by_id(1)
+
+        assert result["status"] is True
+        connection.fetchrow.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_get_cobranca_recem_escrita_le_do_primario(self, asyncpg_manager, mock_pool):
+        """Testa read-your-writes: uma cobrança recém-escrita é lida do primário."""
+        pool, connection = mock_pool
+        read_pool = MagicMock()
+        connection.fetchrow.return_value = None
+        asyncpg_manager.pool = pool
+        asyncpg_manager.read_pool = read_pool
+
+        asyncpg_manager._registrar_escrita(1)
+        await asyncpg_manager.get_cobranca_by_id(1)
+
+        read_pool.acquire.assert_not_called()
+        connection.fetchrow.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_get_cobranca_replica_indisponivel_usa_primario(self, asyncpg_manager, mock_pool):
+        """Testa o fallback para o primário quando a réplica não responde."""
+        pool, connection = mock_pool
+        read_pool, read_connection = MagicMock(), AsyncMock()
+        read_pool.acquire.return_value = MockAsyncContextManager(read_connection)
+        read_connection.fetchrow.side_effect = ConnectionRefusedError("réplica fora")
+        connection.fetchrow.return_value = None
+        asyncpg_manager.pool = pool
+        asyncpg_manager.read_pool = read_pool
+
+        result = await asyncpg_manager.get_cobranca_by_id(1)
+
+        assert result["mensagem"] == "Cobrança não encontrada"
+        connection.fetchrow.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_connect_cria_pool_de_leitura(self):
+        """Testa que DB_READ_URL cria um segundo pool."""
+        manager = AsyncpgManager(dsn="postgresql://primario/test", read_dsn="postgresql://replica/test")
+
+        with patch("asyncpg.create_pool", new_callable=AsyncMock) as mock_create_pool:
+            await manager.connect()
+
+            assert [chamada.kwargs["dsn"] for chamada in mock_create_pool.call_args_list] == ["postgresql://primario/test", "postgresql://replica/test"]
+            assert manager.read_pool is not None
+
+    @pytest.mark.asyncio
+    async def test_pool_de_leitura_usa_as_mesmas_opcoes(self):
+        """Testa que o pool da réplica só difere do primário no endereço."""
+        manager = AsyncpgManager(dsn="postgresql://primario/test", read_dsn="postgresql://replica/test")
+
+        with patch("asyncpg.create_pool", new_callable=AsyncMock) as mock_create_pool:
+            await manager.connect()
+
+            primario, replica = (chamada.kwargs for chamada in mock_create_pool.call_args_list)
+            assert {**primario, "dsn": None} == {**replica, "dsn": None}
+
+    @pytest.mark.asyncio
+    async def test_get_cobrancas_by_ids_consulta_unica(self, asyncpg_manager, mock_pool):
+        """Testa que várias cobranças são buscadas com um único ANY($1)."""
+        pool, connection = mock_pool
+        asyncpg_manager.pool = pool
+        connection.fetch.return_value = [
+            linha_cobranca({"id": id_, "status": "FINALIZADA", "hora_solicitacao": datetime.now(), "hora_finalizacao": None, "valor": 10, "ciclista": 1})
+            for id_ in (1, 2)
+        ]
+
+        result = await asyncpg_manager.get_cobrancas_by_ids([1, 2, 3])
+
+        assert [cobranca.id for cobranca in result["data"]] == [1, 2]
+        connection.fetch.assert_called_once()
+        query, ids = connection.fetch.call_args.args
+        assert "ANY($1::int[])" in query
+        assert ids == [1, 2, 3]
+
+    @pytest.mark.asyncio
+    async def test_get_cobrancas_by_ids_confirma_ausentes_no_primario(self, asyncpg_manager, mock_pool):
+        """Testa que ids ausentes na réplica são confirmados no primário."""
+        pool, connection = mock_pool
+        read_pool, read_connection = MagicMock(), AsyncMock()
+        read_pool.acquire.return_value = MockAsyncContextManager(read_connection)
+        read_connection.fetch.return_value = [linha_cobranca({"id": 1, "status": "FINALIZADA", "hora_solicitacao": None,
+                                                              "hora_finalizacao": None, "valor": 10, "ciclista": 1})]
+        connection.fetch.return_value = []
+        asyncpg_manager.pool = pool
+        asyncpg_manager.read_pool = read_pool
+
+        await asyncpg_manager.get_cobrancas_by_ids([1, 2])
+
+        assert connection.fetch.call_args.args[1] == [2]
+
+    @pytest.mark.asyncio
+    async def test_listar_cobrancas_pagina_com_cursor(self, asyncpg_manager, mock_pool):
+        """Testa que a listagem busca uma linha a mais para saber se há próxima página."""
+        pool, connection = mock_pool
+        asyncpg_manager.pool = pool
+        connection.fetch.return_value = [
+            linha_cobranca({"id": id_, "status": "FINALIZADA", "hora_solicitacao": datetime.now(), "hora_finalizacao": None, "valor": 10, "ciclista": 1})
+            for id_ in (9, 8, 7)
+        ]
+
+        result = await asyncpg_manager.listar_cobrancas(ciclista=1, after_id=10, limite=2)
+
+        assert [json.loads(cobranca)["id"] for cobranca in result["data"]["cobrancas"]] == [9, 8]
+        assert result["data"]["proximo"] == 8
+        query, *args = connection.fetch.call_args.args
+        assert "OFFSET" not in query
+        assert "id < $2" in query
+        assert args == [1, 10, 3]
+
+    @pytest.mark.asyncio
+    async def test_listar_cobrancas_ultima_pagina(self, asyncpg_manager, mock_pool):
+        """Testa que a última página não devolve cursor."""
+        pool, connection = mock_pool
+        asyncpg_manager.pool = pool
+        connection.fetch.return_value = [linha_cobranca({"id": 1, "status": "FALHA", "hora_solicitacao": datetime.now(),
+                                                         "hora_finalizacao": datetime.now(), "valor": 10, "ciclista": 1})]
+
+        result = await asyncpg_manager.listar_cobrancas(status="FALHA", limite=2)
+
+        assert result["data"]["proximo"] is None
+        query = connection.fetch.call_args.args[0]
+        assert "fila_cobrancas" not in query
+
+    def test_query_listagem_em_fila_le_so_a_fila(self, asyncpg_manager):
+        """Testa que o filtro EM_FILA consulta apenas a tabela da fila."""
+        query, args = asyncpg_manager._query_listagem(None, "EM_FILA", datetime(2024, 1, 1), None, None, 10)
+
+        assert "FROM cobrancas" not in query
+        assert "enfileirada_em >= $1" in query
+        assert args == [datetime(2024, 1, 1), 11]
+
+    def test_query_listagem_sem_filtros_une_historico_e_fila(self, asyncpg_manager):
+        """Testa que sem filtro de status a listagem une histórico e fila."""
+        query, args = asyncpg_manager._query_listagem(None, None, None, None, None, 10)
+
+        assert "UNION ALL" in query
+        assert "WHERE" not in query
+        assert args == [11]
+
+    @pytest.mark.asyncio
+    async def test_listar_cobrancas_excecao(self, asyncpg_manager, mock_pool):
+        """Testa listagem com erro no banco."""
+        pool, connection = mock_pool
+        asyncpg_manager.pool = pool
+        connection.fetch.side_effect = Exception("Database error")
+
+        result = await asyncpg_manager.listar_cobrancas()
+
+        assert result["status"] is False
+
+    def test_query_exportacao_filtra_historico(self, asyncpg_manager):
+        """Testa que a exportação lê o histórico em ordem de id com os filtros informados."""
+        query, args = asyncpg_manager._query_exportacao("csv", 1, "FINALIZADA", datetime(2024, 1, 1), None)
+
+        assert "FROM cobrancas" in query and "fila_cobrancas" not in query
+        assert "ORDER BY id" in query and "LIMIT" not in query
+        assert args == [1, "FINALIZADA", datetime(2024, 1, 1)]
+
+    def test_query_exportacao_em_fila(self, asyncpg_manager):
+        """Testa que status EM_FILA exporta a fila."""
+        query, args = asyncpg_manager._query_exportacao("ndjson", None, "EM_FILA", None, datetime(2024, 1, 1))
+
+        assert "FROM fila_cobrancas" in query
+        assert "json_build_object" in query
+        assert "enfileirada_em < $1" in query
+        assert args == [datetime(2024, 1, 1)]
+
+    @pytest.mark.asyncio
+    async def test_exportar_cobrancas_csv_usa_copy(self, asyncpg_manager, mock_pool):
+        """Testa que o CSV sai do COPY em pedaços, na ordem em que o banco escreve."""
+        pool, connection = mock_pool
+        asyncpg_manager.pool = pool
+
+        async def copy_from_query(query, *args, output, format, header):
+            await output(b"id,status\n")
+            await output(b"1,FINALIZADA\n")
+
+        connection.copy_from_query = AsyncMock(side_effect=copy_from_query)
+
+        pedacos = [pedaco async for pedaco in asyncpg_manager.exportar_cobrancas("csv", ciclista=1)]
+
+        assert pedacos == [b"id,status\n", b"1,FINALIZADA\n"]
+        assert connection.copy_from_query.call_args.args[1] == 1
+        assert connection.copy_from_query.call_args.kwargs["format"] == "csv"
+
+    @pytest.mark.asyncio
+    async def test_exportar_cobrancas_csv_propaga_erro(self, asyncpg_manager, mock_pool):
+        """Testa que uma falha no COPY interrompe a exportação."""
+        pool, connection = mock_pool
+        asyncpg_manager.pool = pool
+        connection.copy_from_query = AsyncMock(side_effect=Exception("Database error"))
+
+        with pytest.raises(Exception):
+            [pedaco async for pedaco in asyncpg_manager.exportar_cobrancas("csv")]
+
+    @pytest.mark.asyncio
+    async def test_exportar_cobrancas_ndjson_usa_cursor(self, asyncpg_manager, mock_pool):
+        """Testa o NDJSON lido por cursor, agrupado em pedaços de EXPORTACAO_PREFETCH linhas."""
+        pool, connection = mock_pool
+        asyncpg_manager.pool = pool
+        connection.transaction = MagicMock(return_value=MockAsyncContextManager(None))
+        connection.cursor = MagicMock(return_value=MockCursor([{"json": json.dumps({"id": i}).encode()} for i in range(3)]))
+
+        with patch("functions.database.asyncpg_manager.EXPORTACAO_PREFETCH", 2):
+            pedacos = [pedaco async for pedaco in asyncpg_manager.exportar_cobrancas("ndjson")]
+
+        assert len(pedacos) == 2
+        linhas = b"".join(pedacos).decode().splitlines()
+        assert [json.loads(linha)["id"] for linha in linhas] == [0, 1, 2]
+        assert "json_build_object" in connection.cursor.call_args.args[0]
+        connection.transaction.assert_called_once_with(readonly=True)
+
+    @pytest.mark.asyncio
+    async def test_exportar_cobrancas_usa_replica(self, asyncpg_manager, mock_pool):
+        """Testa que a exportação lê da réplica quando configurada."""
+        pool, _ = mock_pool
+        read_pool = MagicMock()
+        read_connection = AsyncMock()
+        read_pool.acquire.return_value = MockAsyncContextManager(read_connection)
+        asyncpg_manager.pool = pool
+        asyncpg_manager.read_pool = read_pool
+
+        [pedaco async for pedaco in asyncpg_manager.exportar_cobrancas("csv")]
+
+        read_connection.copy_from_query.assert_called_once()
+        pool.acquire.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_exportar_cobrancas_limita_exportacoes_no_primario(self, mock_pool):
+        """Testa que, sem réplica, só EXPORTACAO_CONCORRENCIA exportações ocupam conexões do primário."""
+        pool, connection = mock_pool
+        with patch("functions.database.asyncpg_manager.EXPORTACAO_CONCORRENCIA", 2):
+            manager = AsyncpgManager(dsn="postgresql://primario/test")
+        manager.pool = pool
+
+        liberar = asyncio.Event()
+        em_andamento = 0
+        maximo = 0
+
+        async def copy_from_query(query, *args, output, format, header):
+            nonlocal em_andamento, maximo
+            em_andamento += 1
+            maximo = max(maximo, em_andamento)
+            await liberar.wait()
+            await output(b"id\n")
+            em_andamento -= 1
+
+        connection.copy_from_query = AsyncMock(side_effect=copy_from_query)
+
+        async def exportar():
+            return [pedaco async for pedaco in manager.exportar_cobrancas("csv")]
+
+        tarefas = [asyncio.create_task(exportar()) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        acessos = pool.acquire.call_count
+        liberar.set()
+        resultados = await asyncio.gather(*tarefas)
+
+        assert acessos == 2
+        assert maximo == 2
+        assert resultados == [[b"id\n"]] * 3
+
     @pytest.mark.asyncio
     async def test_colocar_cobranca_na_fila_sucesso(self, asyncpg_manager, mock_pool, cobranca_data, cartao_data):
         """Testa colocação de cobrança na fila com sucesso."""
         pool, connection = mock_pool
         asyncpg_manager.pool = pool
 
-        mock_row = {
+        mock_row = linha_cobranca({
             "id": 1,
             "status": "EM_FILA",
             "hora_solicitacao": datetime.now(),
             "hora_finalizacao": None,
             "valor": 100.00,
             "ciclista": 1
-        }
+        })
         connection.fetchrow.return_value = mock_row
 
         with patch("functions.database.asyncpg_manager.ciclista_instance") as mock_ciclista:
@@ -267,7 +731,32 @@ class TestAsyncpgManager:
             result = await asyncpg_manager.colocar_cobranca_na_fila(cobranca_data)
 
             assert result["status"] is True
-            assert result["data"]["status"] == "EM_FILA"
+            assert result["data"].status == "EM_FILA"
+            assert "INSERT INTO fila_cobrancas" in connection.fetchrow.call_args.args[0]
+
+    @pytest.mark.asyncio
+    async def test_colocar_cobranca_na_fila_ao_enfileirar_na_transacao(self, asyncpg_manager, mock_pool, cobranca_data, cartao_data):
+        """Testa que o gancho recebe a conexão e a cobrança dentro da transação do INSERT."""
+        pool, connection = mock_pool
+        asyncpg_manager.pool = pool
+        connection.fetchrow.return_value = linha_cobranca({"id": 1, "status": "EM_FILA", "valor": 100.00, "ciclista": 1})
+
+        eventos = []
+        transacao = MagicMock()
+        transacao.__aenter__ = AsyncMock(side_effect=lambda *args: eventos.append("inicio"))
+        transacao.__aexit__ = AsyncMock(side_effect=lambda *args: eventos.append("fim"))
+        connection.transaction = MagicMock(return_value=transacao)
+
+        async def ao_enfileirar(conexao, cobranca):
+            eventos.append(("gancho", conexao, cobranca.id))
+
+        with patch("functions.database.asyncpg_manager.ciclista_instance") as mock_ciclista:
+            mock_ciclista.obter_cartao = AsyncMock(return_value={"status": True, "data": cartao_data})
+
+            result = await asyncpg_manager.colocar_cobranca_na_fila(cobranca_data, ao_enfileirar)
+
+        assert result["status"] is True
+        assert eventos == ["inicio", ("gancho", connection, 1), "fim"]
 
     @pytest.mark.asyncio
     async def test_colocar_cobranca_na_fila_cartao_nao_encontrado(self, asyncpg_manager, mock_pool, cobranca_data):
@@ -304,6 +793,92 @@ class TestAsyncpgManager:
             assert result["status"] is False
             assert "Erro ao colocar" in result["mensagem"]
 
+    @pytest.mark.asyncio
+    async def test_colocar_cobrancas_na_fila_usa_copy(self, asyncpg_manager, mock_pool, cartao_data):
+        """Testa o enfileiramento em lote com um único COPY e um cartão por ciclista."""
+        pool, connection = mock_pool
+        asyncpg_manager.pool = pool
+        connection.transaction = MagicMock(return_value=MockAsyncContextManager(None))
+        agora = datetime.now()
+        connection.fetch.return_value = [{"id": 10, "enfileirada_em": agora}, {"id": 11, "enfileirada_em": agora}]
+
+        cobrancas = [{"valor": 10.5, "ciclista": 1}, {"valor": 20.0, "ciclista": 2}, {"valor": 5.0, "ciclista": 1}]
+
+        async def obter_cartao(ciclista):
+            if ciclista == 2:
+                return {"status": False, "mensagem": "Ciclista não encontrado"}
+            return {"status": True, "data": cartao_data}
+
+        with patch("functions.database.asyncpg_manager.ciclista_instance") as mock_ciclista:
+            mock_ciclista.obter_cartao = AsyncMock(side_effect=obter_cartao)
+
+            result = await asyncpg_manager.colocar_cobrancas_na_fila(cobrancas)
+
+            assert result["status"] is True
+            assert mock_ciclista.obter_cartao.call_count == 2
+            assert [cobranca["id"] for cobranca in result["data"]["enfileiradas"]] == [10, 11]
+            assert result["data"]["enfileiradas"][0]["valor"] == 10.5
+            assert result["data"]["rejeitadas"] == [{"indice": 1, "ciclista": 2, "mensagem": "Ciclista não encontrado"}]
+            assert connection.fetch.call_args.args[1] == 2
+            connection.copy_records_to_table.assert_called_once()
+            assert connection.copy_records_to_table.call_args.args[0] == "fila_cobrancas"
+            registros = connection.copy_records_to_table.call_args.kwargs["records"]
+            assert [(registro[0], registro[1]) for registro in registros] == [(10, 1), (11, 1)]
+
+    @pytest.mark.asyncio
+    async def test_colocar_cobrancas_na_fila_marca_prioridade_por_valor(self, asyncpg_manager, mock_pool, cartao_data):
+        """Testa que cobranças a partir do valor prioritário entram na fila como prioritárias."""
+        pool, connection = mock_pool
+        asyncpg_manager.pool = pool
+        agora = datetime.now()
+        connection.fetch.return_value = [{"id": 10, "enfileirada_em": agora}, {"id": 11, "enfileirada_em": agora}]
+
+        with patch("functions.database.asyncpg_manager.ciclista_instance") as mock_ciclista, \
+                patch("functions.database.asyncpg_manager.FILA_COBRANCAS_VALOR_PRIORITARIO", 100):
+            mock_ciclista.obter_cartao = AsyncMock(return_value={"status": True, "data": cartao_data})
+
+            await asyncpg_manager.colocar_cobrancas_na_fila([{"valor": 150.0, "ciclista": 1}, {"valor": 20.0, "ciclista": 2}])
+
+            registros = connection.copy_records_to_table.call_args.kwargs["records"]
+            assert [registro[4] for registro in registros] == [PRIORIDADE_ALTA, PRIORIDADE_NORMAL]
+            assert connection.copy_records_to_table.call_args.kwargs["columns"][-1] == "prioridade"
+
+    def test_prioridade_desligada_por_padrao(self, asyncpg_manager):
+        """Testa que sem valor prioritário configurado todas as cobranças são normais."""
+        assert asyncpg_manager._prioridade(1_000_000) == PRIORIDADE_NORMAL
+
+    @pytest.mark.asyncio
+    async def test_colocar_cobrancas_na_fila_todas_rejeitadas(self, asyncpg_manager, mock_pool):
+        """Testa que o lote sem nenhuma cobrança válida não abre conexão."""
+        pool, connection = mock_pool
+        asyncpg_manager.pool = pool
+
+        with patch("functions.database.asyncpg_manager.ciclista_instance") as mock_ciclista:
+            mock_ciclista.obter_cartao = AsyncMock(return_value={"status": False, "mensagem": "Cartão não encontrado"})
+
+            result = await asyncpg_manager.colocar_cobrancas_na_fila([{"valor": 1.0, "ciclista": 3}])
+
+            assert result["data"]["enfileiradas"] == []
+            assert len(result["data"]["rejeitadas"]) == 1
+            pool.acquire.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_colocar_cobrancas_na_fila_excecao(self, asyncpg_manager, mock_pool, cartao_data):
+        """Testa o enfileiramento em lote quando o COPY falha."""
+        pool, connection = mock_pool
+        asyncpg_manager.pool = pool
+        connection.transaction = MagicMock(return_value=MockAsyncContextManager(None))
+        connection.fetch.return_value = [{"id": 10, "enfileirada_em": datetime.now()}]
+        connection.copy_records_to_table.side_effect = Exception("Database error")
+
+        with patch("functions.database.asyncpg_manager.ciclista_instance") as mock_ciclista:
+            mock_ciclista.obter_cartao = AsyncMock(return_value={"status": True, "data": cartao_data})
+
+            result = await asyncpg_manager.colocar_cobrancas_na_fila([{"valor": 1.0, "ciclista": 1}])
+
+            assert result["status"] is False
+            assert "Erro ao colocar" in result["mensagem"]
+
     @pytest.mark.asyncio
     async def test_processar_fila_cobrancas_sucesso(self, asyncpg_manager, mock_pool, cartao_data):
         """Testa processamento da fila com sucesso."""
@@ -312,20 +887,20 @@ class TestAsyncpgManager:
 
         # Mock das cobranças na fila
         mock_rows = [
-            {"id": 1, "valor": 100.00, "ciclista": 1},
-            {"id": 2, "valor": 50.00, "ciclista": 2}
+            {"id": 1, "valor": 100.00, "ciclista": 1, "tentativas": 1},
+            {"id": 2, "valor": 50.00, "ciclista": 2, "tentativas": 1}
         ]
-        connection.fetch.return_value = mock_rows
+        connection.fetch.side_effect = [mock_rows, []]
 
         # Mock da cobrança finalizada
-        mock_finalizada = {
+        mock_finalizada = linha_cobranca({
             "id": 1,
             "status": "FINALIZADA",
             "hora_solicitacao": datetime.now(),
             "hora_finalizacao": datetime.now(),
             "valor": 100.00,
             "ciclista": 1
-        }
+        })
         connection.fetchrow.return_value = mock_finalizada
 
         with patch("functions.database.asyncpg_manager.ciclista_instance") as mock_ciclista:
@@ -374,8 +949,8 @@ class TestAsyncpgManager:
         pool, connection = mock_pool
         asyncpg_manager.pool = pool
 
-        mock_rows = [{"id": 1, "valor": 100.00, "ciclista": 1}]
-        connection.fetch.return_value = mock_rows
+        mock_rows = [{"id": 1, "valor": 100.00, "ciclista": 1, "tentativas": 1}]
+        connection.fetch.side_effect = [mock_rows, []]
 
         with patch("functions.database.asyncpg_manager.ciclista_instance") as mock_ciclista:
             mock_ciclista.obter_cartao = AsyncMock(return_value={
@@ -394,6 +969,384 @@ class TestAsyncpgManager:
                 assert result["status"] is True
                 assert result["data"] == []  # Nenhuma cobrança processada
 
+    @pytest.mark.asyncio
+    async def test_processar_fila_reagenda_recusada_com_backoff(self, asyncpg_manager, mock_pool, cartao_data):
+        """Testa que a cobrança recusada é reagendada e continua na fila."""
+        pool, connection = mock_pool
+        asyncpg_manager.pool = pool
+
+        connection.fetch.side_effect = [[{"id": 1, "valor": 100.00, "ciclista": 1, "tentativas": 1}], []]
+        connection.fetchval.return_value = 1
+
+        with patch("functions.database.asyncpg_manager.ciclista_instance") as mock_ciclista:
+            mock_ciclista.obter_cartao = AsyncMock(return_value={"status": True, "data": cartao_data})
+
+            with patch("functions.database.asyncpg_manager.mercado_pago_instance") as mock_mp:
+                mock_mp.realiza_pagamento = AsyncMock(return_value={"status": False, "mensagem": "Rejeitado"})
+
+                await asyncpg_manager.processar_fila_cobrancas()
+
+                connection.fetchval.assert_called_with(QUERY_REAGENDAR_COBRANCA, 1, FILA_COBRANCAS_ATRASO_RETENTATIVA,
+                                                       FILA_COBRANCAS_ATRASO_MAX, FILA_COBRANCAS_MAX_TENTATIVAS, 1)
+                assert all(chamada.args[0] != QUERY_DESCARTAR_COBRANCA for chamada in connection.execute.call_args_list)
+
+    @pytest.mark.asyncio
+    async def test_processar_fila_consulta_indisponivel_na_ultima_tentativa_nao_descarta(self, asyncpg_manager, mock_pool):
+        """Testa que, sem resposta do gateway, a cobrança é reagendada sem contar recusa nem ir para FALHA."""
+        pool, connection = mock_pool
+        asyncpg_manager.pool = pool
+
+        connection.fetch.side_effect = [[{"id": 1, "valor": 100.00, "ciclista": 1,
+                                          "tentativas": FILA_COBRANCAS_MAX_TENTATIVAS}], []]
+        connection.fetchval.side_effect = [1, None]
+
+        with patch("functions.database.asyncpg_manager.mercado_pago_instance") as mock_mp:
+            mock_mp.consultar_pagamento = AsyncMock(return_value={"status": False, "codigo": 502,
+                                                                  "mensagem": "Erro ao consultar o pagamento"})
+            mock_mp.realiza_pagamento = AsyncMock()
+
+            await asyncpg_manager.processar_fila_cobrancas()
+
+            mock_mp.realiza_pagamento.assert_not_called()
+            assert connection.fetchval.call_args.args[0] == QUERY_REAGENDAR_COBRANCA
+            assert connection.fetchval.call_args.args[-1] == 0
+            assert all(chamada.args[0] != QUERY_DESCARTAR_COBRANCA for chamada in connection.execute.call_args_list)
+
+    @pytest.mark.asyncio
+    async def test_processar_fila_gateway_indisponivel_nao_conta_recusa(self, asyncpg_manager, mock_pool, cartao_data):
+        """Testa que um erro 5xx do gateway reagenda a cobrança sem contar como recusa."""
+        pool, connection = mock_pool
+        asyncpg_manager.pool = pool
+
+        connection.fetch.side_effect = [[{"id": 1, "valor": 100.00, "ciclista": 1, "tentativas": 1}], []]
+        connection.fetchval.side_effect = [1, None]
+
+        with patch("functions.database.asyncpg_manager.ciclista_instance") as mock_ciclista:
+            mock_ciclista.obter_cartao = AsyncMock(return_value={"status": True, "data": cartao_data})
+
+            with patch("functions.database.asyncpg_manager.mercado_pago_instance") as mock_mp:
+                mock_mp.realiza_pagamento = AsyncMock(return_value={"status": False, "codigo": 502, "mensagem": "Erro interno"})
+
+                await asyncpg_manager.processar_fila_cobrancas()
+
+                assert connection.fetchval.call_args.args[-1] == 0
+                assert all(chamada.args[0] != QUERY_DESCARTAR_COBRANCA for chamada in connection.execute.call_args_list)
+
+    def test_recusa_definitiva(self):
+        """Testa que só uma recusa do gateway conta: análise e erros 5xx não."""
+        assert recusa_definitiva({"status": False, "mensagem": "Rejeitado"}) is True
+        assert recusa_definitiva({"status": False, "mensagem": "Ciclista não encontrado"}) is True
+        assert recusa_definitiva({"status": False, "pendente": True, "mensagem": "Em análise"}) is False
+        assert recusa_definitiva({"status": False, "codigo": 502, "mensagem": "Erro interno"}) is False
+
+    @pytest.mark.asyncio
+    async def test_processar_fila_descarta_apos_ultima_tentativa(self, asyncpg_manager, mock_pool, cartao_data):
+        """Testa que a cobrança sem tentativas restantes vai para o histórico como FALHA."""
+        pool, connection = mock_pool
+        asyncpg_manager.pool = pool
+
+        connection.fetch.side_effect = [[{"id": 1, "valor": 100.00, "ciclista": 1, "tentativas": 1}], []]
+        # Lease renovado, reagendamento sem tentativas restantes
+        connection.fetchval.side_effect = [1, None]
+
+        with patch("functions.database.asyncpg_manager.ciclista_instance") as mock_ciclista:
+            mock_ciclista.obter_cartao = AsyncMock(return_value={"status": True, "data": cartao_data})
+
+            with patch("functions.database.asyncpg_manager.mercado_pago_instance") as mock_mp:
+                mock_mp.realiza_pagamento = AsyncMock(return_value={"status": False, "mensagem": "Rejeitado"})
+
+                await asyncpg_manager.processar_fila_cobrancas()
+
+                connection.execute.assert_any_call(QUERY_DESCARTAR_COBRANCA, 1, NOTIFICAR_COBRANCAS)
+
+    @pytest.mark.asyncio
+    async def test_processar_fila_pula_cobranca_com_lease_perdido(self, asyncpg_manager, mock_pool, cartao_data):
+        """Testa que a cobrança cujo lease expirou antes da sua vez no lote não é paga."""
+        pool, connection = mock_pool
+        asyncpg_manager.pool = pool
+
+        connection.fetch.side_effect = [[{"id": 1, "valor": 100.00, "ciclista": 1, "tentativas": 2}], []]
+        connection.fetchval.return_value = None
+
+        with patch("functions.database.asyncpg_manager.mercado_pago_instance") as mock_mp:
+            mock_mp.realiza_pagamento = AsyncMock()
+
+            result = await asyncpg_manager.processar_fila_cobrancas()
+
+            assert result["data"] == []
+            connection.fetchval.assert_called_once_with(QUERY_RENOVAR_LEASE, 1, FILA_COBRANCAS_LEASE, 2)
+            mock_mp.realiza_pagamento.assert_not_called()
+            connection.execute.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_processar_fila_usa_chave_por_tentativa(self, asyncpg_manager, mock_pool, cartao_data):
+        """Testa que cada tentativa vai ao gateway com a própria chave e a referência da cobrança."""
+        pool, connection = mock_pool
+        asyncpg_manager.pool = pool
+
+        connection.fetch.side_effect = [[{"id": 1, "valor": 100.00, "ciclista": 1, "tentativas": 3}], []]
+        connection.fetchval.return_value = 1
+
+        with patch("functions.database.asyncpg_manager.ciclista_instance") as mock_ciclista:
+            mock_ciclista.obter_cartao = AsyncMock(return_value={"status": True, "data": cartao_data})
+
+            with patch("functions.database.asyncpg_manager.mercado_pago_instance") as mock_mp:
+                mock_mp.consultar_pagamento = AsyncMock(return_value={"status": True, "data": "recusado"})
+                mock_mp.realiza_pagamento = AsyncMock(return_value={"status": False, "mensagem": "Rejeitado"})
+
+                await asyncpg_manager.processar_fila_cobrancas()
+
+                mock_mp.consultar_pagamento.assert_called_once_with("cobranca-1")
+                mock_mp.realiza_pagamento.assert_called_once_with(cartao_data, 100.00, "fila-1-3", "cobranca-1")
+
+    @pytest.mark.asyncio
+    async def test_processar_fila_conclui_tentativa_anterior_aprovada(self, asyncpg_manager, mock_pool):
+        """Testa que a cobrança aprovada numa tentativa anterior é concluída sem pagar de novo."""
+        pool, connection = mock_pool
+        asyncpg_manager.pool = pool
+
+        connection.fetch.side_effect = [[{"id": 1, "valor": 100.00, "ciclista": 1, "tentativas": 2}], []]
+        connection.fetchval.return_value = 1
+        connection.fetchrow.return_value = linha_cobranca({"id": 1, "status": "FINALIZADA"})
+
+        with patch("functions.database.asyncpg_manager.mercado_pago_instance") as mock_mp:
+            mock_mp.consultar_pagamento = AsyncMock(return_value={"status": True, "data": "aprovado"})
+            mock_mp.realiza_pagamento = AsyncMock()
+
+            result = await asyncpg_manager.processar_fila_cobrancas()
+
+            assert result["data"][0].status == "FINALIZADA"
+            mock_mp.realiza_pagamento.assert_not_called()
+            assert connection.fetchrow.call_args.args == (QUERY_CONCLUIR_COBRANCA, 1, NOTIFICAR_COBRANCAS)
+
+    @pytest.mark.asyncio
+    async def test_processar_fila_reagenda_tentativa_anterior_em_analise(self, asyncpg_manager, mock_pool):
+        """Testa que a cobrança com pagamento anterior em análise é reagendada sem pagar de novo."""
+        pool, connection = mock_pool
+        asyncpg_manager.pool = pool
+
+        connection.fetch.side_effect = [[{"id": 1, "valor": 100.00, "ciclista": 1, "tentativas": 2}], []]
+        connection.fetchval.return_value = 1
+
+        with patch("functions.database.asyncpg_manager.mercado_pago_instance") as mock_mp:
+            mock_mp.consultar_pagamento = AsyncMock(return_value={"status": True, "data": "pendente"})
+            mock_mp.realiza_pagamento = AsyncMock()
+
+            await asyncpg_manager.processar_fila_cobrancas()
+
+            mock_mp.realiza_pagamento.assert_not_called()
+            assert connection.fetchval.call_args.args[0] == QUERY_REAGENDAR_COBRANCA
+            assert connection.fetchval.call_args.args[-1] == 0
+
+    @pytest.mark.asyncio
+    async def test_processar_fila_cartao_indisponivel_reagenda(self, asyncpg_manager, mock_pool):
+        """Testa que uma falha na consulta do cartão reagenda a cobrança sem chamar o gateway."""
+        pool, connection = mock_pool
+        asyncpg_manager.pool = pool
+
+        connection.fetch.side_effect = [[{"id": 1, "valor": 100.00, "ciclista": 1, "tentativas": 1}], []]
+        connection.fetchval.return_value = 1
+
+        with patch("functions.database.asyncpg_manager.ciclista_instance") as mock_ciclista:
+            mock_ciclista.obter_cartao = AsyncMock(return_value={"status": False, "codigo": 502,
+                                                                 "mensagem": "Erro ao conectar ao serviço de ciclistas"})
+
+            with patch("functions.database.asyncpg_manager.mercado_pago_instance") as mock_mp:
+                mock_mp.realiza_pagamento = AsyncMock()
+
+                result = await asyncpg_manager.processar_fila_cobrancas()
+
+                assert result["status"] is True
+                mock_mp.realiza_pagamento.assert_not_called()
+                assert connection.fetchval.call_args.args[0] == QUERY_REAGENDAR_COBRANCA
+                assert connection.fetchval.call_args.args[-1] == 0
+
+    def test_reivindicacao_so_pega_cobrancas_vencidas(self):
+        """Testa que a reivindicação filtra e ordena pela próxima tentativa."""
+        assert "proxima_tentativa <= NOW()" in QUERY_REIVINDICAR_COBRANCAS
+        assert "ORDER BY proxima_tentativa, id" in QUERY_REIVINDICAR_COBRANCAS
+
+    @pytest.mark.asyncio
+    async def test_processar_fila_registra_notificacoes(self, asyncpg_manager, mock_pool, cartao_data):
+        """Testa que o processamento registra uma notificação por cobrança quando ativado."""
+        pool, connection = mock_pool
+        asyncpg_manager.pool = pool
+
+        connection.fetch.side_effect = [[{"id": 1, "valor": 100.00, "ciclista": 1, "tentativas": 1},
+                                         {"id": 2, "valor": 50.00, "ciclista": 1, "tentativas": 1}], []]
+        connection.fetchrow.return_value = linha_cobranca({"id": 1, "status": "FINALIZADA", "hora_solicitacao": datetime.now(),
+                                                           "hora_finalizacao": datetime.now(), "valor": 100.00, "ciclista": 1})
+        # Leases renovados; a cobrança 2 não tem mais tentativas e é descartada
+        connection.fetchval.side_effect = [1, 2, None]
+
+        with patch("functions.database.asyncpg_manager.ciclista_instance") as mock_ciclista:
+            mock_ciclista.obter_cartao = AsyncMock(return_value={"status": True, "data": cartao_data})
+
+            with patch("functions.database.asyncpg_manager.mercado_pago_instance") as mock_mp:
+                mock_mp.realiza_pagamento = AsyncMock(side_effect=[{"status": True}, {"status": False, "mensagem": "Rejeitado"}])
+
+                await asyncpg_manager.processar_fila_cobrancas(notificar=True)
+
+                # A notificação é registrada pelo mesmo comando que move a cobrança
+                connection.fetchrow.assert_called_once_with(QUERY_CONCLUIR_COBRANCA, 1, True)
+                connection.execute.assert_any_call(QUERY_DESCARTAR_COBRANCA, 2, True)
+                connection.executemany.assert_not_called()
+
+    def test_notificacao_no_mesmo_comando_da_mudanca(self):
+        """Testa que concluir e descartar registram a notificação no próprio comando, se pedida."""
+        for query, status in ((QUERY_CONCLUIR_COBRANCA, "'FINALIZADA'"), (QUERY_DESCARTAR_COBRANCA, "'FALHA'")):
+            notificacao = query[query.index("notificacao AS"):]
+            assert "INSERT INTO notificacoes_cobranca" in notificacao
+            assert status in notificacao and "WHERE $2::boolean" in notificacao
+
+    @pytest.mark.asyncio
+    async def test_processar_fila_publica_lote_interrompido(self, asyncpg_manager, mock_pool, cartao_data):
+        """Testa que as cobranças movidas antes de um erro no meio do lote ainda são invalidadas nas réplicas."""
+        pool, connection = mock_pool
+        asyncpg_manager.pool = pool
+
+        connection.fetch.side_effect = [[{"id": 1, "valor": 100.00, "ciclista": 1, "tentativas": 1},
+                                         {"id": 2, "valor": 50.00, "ciclista": 2, "tentativas": 1}], []]
+        connection.fetchrow.return_value = linha_cobranca({"id": 1, "status": "FINALIZADA"})
+        connection.fetchval.side_effect = [1, Exception("Conexão perdida")]
+
+        with patch("functions.database.asyncpg_manager.ciclista_instance") as mock_ciclista, \
+                patch("functions.database.asyncpg_manager.mercado_pago_instance") as mock_mp, \
+                patch("functions.database.asyncpg_manager.invalidacao_instance") as mock_invalidacao:
+            mock_ciclista.obter_cartao = AsyncMock(return_value={"status": True, "data": cartao_data})
+            mock_mp.realiza_pagamento = AsyncMock(return_value={"status": True})
+            mock_invalidacao.publicar = AsyncMock()
+
+            result = await asyncpg_manager.processar_fila_cobrancas(notificar=True)
+
+            assert result["status"] is False
+            mock_invalidacao.publicar.assert_called_once_with("cobranca", [1], connection)
+
+    @pytest.mark.asyncio
+    async def test_processar_fila_sem_notificar(self, asyncpg_manager, mock_pool, cartao_data):
+        """Testa que nenhuma notificação é registrada quando desativado."""
+        pool, connection = mock_pool
+        asyncpg_manager.pool = pool
+
+        connection.fetch.side_effect = [[{"id": 1, "valor": 100.00, "ciclista": 1, "tentativas": 1}], []]
+        connection.fetchval.side_effect = [1, None]
+
+        with patch("functions.database.asyncpg_manager.ciclista_instance") as mock_ciclista:
+            mock_ciclista.obter_cartao = AsyncMock(return_value={"status": True, "data": cartao_data})
+
+            with patch("functions.database.asyncpg_manager.mercado_pago_instance") as mock_mp:
+                mock_mp.realiza_pagamento = AsyncMock(return_value={"status": False, "mensagem": "Rejeitado"})
+
+                await asyncpg_manager.processar_fila_cobrancas(notificar=False)
+
+                connection.execute.assert_any_call(QUERY_DESCARTAR_COBRANCA, 1, False)
+
+    @pytest.mark.asyncio
+    async def test_processar_fila_nao_notifica_cobranca_reagendada(self, asyncpg_manager, mock_pool, cartao_data):
+        """Testa que a cobrança recusada e reagendada não gera notificação de FALHA."""
+        pool, connection = mock_pool
+        asyncpg_manager.pool = pool
+
+        connection.fetch.side_effect = [[{"id": 1, "valor": 100.00, "ciclista": 1, "tentativas": 1}], []]
+        connection.fetchval.return_value = 1
+
+        with patch("functions.database.asyncpg_manager.ciclista_instance") as mock_ciclista:
+            mock_ciclista.obter_cartao = AsyncMock(return_value={"status": True, "data": cartao_data})
+
+            with patch("functions.database.asyncpg_manager.mercado_pago_instance") as mock_mp:
+                mock_mp.realiza_pagamento = AsyncMock(return_value={"status": False, "mensagem": "Rejeitado"})
+
+                await asyncpg_manager.processar_fila_cobrancas(notificar=True)
+
+                assert all(chamada.args[0] != QUERY_DESCARTAR_COBRANCA for chamada in connection.execute.call_args_list)
+
+    @pytest.mark.asyncio
+    async def test_processar_fila_drena_em_lotes_pela_tabela_da_fila(self, asyncpg_manager, mock_pool, cartao_data):
+        """Testa que a fila é reivindicada em lotes com lease e a cobrança paga sai da fila."""
+        pool, connection = mock_pool
+        asyncpg_manager.pool = pool
+
+        connection.fetch.side_effect = [[{"id": 1, "valor": 10.00, "ciclista": 1, "tentativas": 1}], [{"id": 2, "valor": 20.00, "ciclista": 2, "tentativas": 1}], []]
+        connection.fetchrow.return_value = linha_cobranca({"id": 1, "status": "FINALIZADA", "hora_solicitacao": datetime.now(),
+                                                           "hora_finalizacao": datetime.now(), "valor": 10.00, "ciclista": 1})
+
+        with patch("functions.database.asyncpg_manager.ciclista_instance") as mock_ciclista:
+            mock_ciclista.obter_cartao = AsyncMock(return_value={"status": True, "data": cartao_data})
+
+            with patch("functions.database.asyncpg_manager.mercado_pago_instance") as mock_mp:
+                mock_mp.realiza_pagamento = AsyncMock(return_value={"status": True})
+
+                result = await asyncpg_manager.processar_fila_cobrancas()
+
+                assert len(result["data"]) == 2
+                query_reivindicar = connection.fetch.call_args.args[0]
+                assert "fila_cobrancas" in query_reivindicar and "SKIP LOCKED" in query_reivindicar
+                assert "status" not in query_reivindicar
+                query_concluir = connection.fetchrow.call_args.args[0]
+                assert "DELETE FROM fila_cobrancas" in query_concluir and "INSERT INTO cobrancas" in query_concluir
+
+    @pytest.mark.asyncio
+    async def test_processar_fila_reivindica_so_com_tentativas_restantes(self, asyncpg_manager, mock_pool):
+        """Testa que a reivindicação recebe o limite de tentativas."""
+        pool, connection = mock_pool
+        asyncpg_manager.pool = pool
+
+        connection.fetch.return_value = []
+
+        await asyncpg_manager.processar_fila_cobrancas()
+
+        assert connection.fetch.call_args.args[1:] == (FILA_COBRANCAS_LOTE, FILA_COBRANCAS_LEASE, FILA_COBRANCAS_MAX_TENTATIVAS,
+                                                       FILA_COBRANCAS_JANELA, FILA_COBRANCAS_PESO_PRIORIDADE, None)
+        assert "recusas < $3" in connection.fetch.call_args.args[0]
+
+    @pytest.mark.asyncio
+    async def test_processar_fila_avanca_cursor_do_rodizio(self, asyncpg_manager, mock_pool):
+        """Testa que a próxima reivindicação começa depois do ciclista atendido mais adiante, voltando ao início."""
+        pool, connection = mock_pool
+        asyncpg_manager.pool = pool
+        asyncpg_manager._cursor_fila = 4
+
+        connection.fetch.side_effect = [[{"id": 1, "valor": 10.00, "ciclista": 5, "tentativas": 1},
+                                         {"id": 2, "valor": 10.00, "ciclista": 2, "tentativas": 1}],
+                                        [{"id": 3, "valor": 10.00, "ciclista": 3, "tentativas": 1}], []]
+        # Leases perdidos: só o rodízio importa aqui
+        connection.fetchval.return_value = None
+
+        await asyncpg_manager.processar_fila_cobrancas()
+
+        assert [chamada.args[-1] for chamada in connection.fetch.call_args_list] == [4, 2, 3]
+        assert asyncpg_manager._cursor_fila == 3
+
+    @pytest.mark.asyncio
+    async def test_processar_fila_paga_cobranca_ja_descartada(self, asyncpg_manager, mock_pool, cartao_data):
+        """Testa que uma cobrança paga depois de a varredura descartá-la é finalizada no histórico."""
+        pool, connection = mock_pool
+        asyncpg_manager.pool = pool
+
+        connection.fetch.side_effect = [[{"id": 1, "valor": 10.00, "ciclista": 1, "tentativas": 1}], []]
+        connection.fetchrow.side_effect = [None, linha_cobranca({"id": 1, "status": "FINALIZADA"})]
+
+        with patch("functions.database.asyncpg_manager.ciclista_instance") as mock_ciclista:
+            mock_ciclista.obter_cartao = AsyncMock(return_value={"status": True, "data": cartao_data})
+
+            with patch("functions.database.asyncpg_manager.mercado_pago_instance") as mock_mp:
+                mock_mp.realiza_pagamento = AsyncMock(return_value={"status": True})
+
+                result = await asyncpg_manager.processar_fila_cobrancas()
+
+                assert result["data"][0].status == "FINALIZADA"
+                assert connection.fetchrow.call_args.args == (QUERY_COBRANCA_FINALIZADA, 1)
+
+    @pytest.mark.asyncio
+    async def test_registrar_escrita_invalida_cache(self, asyncpg_manager):
+        """Testa que escrever uma cobrança remove a versão em cache."""
+        from functions.cache.cache_manager import cobranca_cache_instance
+
+        cobranca_cache_instance.set(1, {"status": True, "data": b"{}"})
+        asyncpg_manager._registrar_escrita(1)
+
+        assert cobranca_cache_instance.get(1) is None
+
     @pytest.mark.asyncio
     async def test_restaurar_banco_sucesso(self, asyncpg_manager, mock_pool):
         """Testa restauração do banco com sucesso."""
@@ -417,4 +1370,125 @@ class TestAsyncpgManager:
         result = await asyncpg_manager.restaurar_banco()
 
         assert result["status"] is False
-        assert "Erro ao restaurar" in result["mensagem"]
\ No newline at end of file
+        assert "Erro ao restaurar" in result["mensagem"]
+
+@pytest.mark.skipif(not TEST_DB_URL, reason="TEST_DB_URL não configurada")
+class TestReivindicacaoNoBanco:
+    """Executa a reivindicação da fila num PostgreSQL real, num schema próprio por teste."""
+
+    @pytest.fixture
+    async def connection(self):
+        connection = await asyncpg.connect(dsn=TEST_DB_URL)
+        schema = f"teste_{uuid.uuid4().hex}"
+        await connection.execute(f"CREATE SCHEMA {schema}; SET search_path TO {schema};")
+        await MigracaoManager().migrar(connection)
+        try:
+            yield connection
+        finally:
+            await connection.execute(f"DROP SCHEMA {schema} CASCADE;")
+            await connection.close()
+
+    async def enfileirar(self, connection, ciclista: int, minutos_atras: int, prioridade: int = PRIORIDADE_NORMAL,
+                         lease_minutos: int = None) -> int:
+        return await connection.fetchval(
+            """
+            INSERT INTO fila_cobrancas(ciclista, valor, enfileirada_em, proxima_tentativa, prioridade, lease_ate)
+                VALUES($1, 10, NOW(), NOW() - make_interval(mins => $2), $3, NOW() + make_interval(mins => $4))
+                RETURNING id;
+            """, ciclista, minutos_atras, prioridade, lease_minutos)
+
+    async def reivindicar(self, connection, lote: int, janela: int = 10, cursor: int = None) -> set:
+        rows = await connection.fetch(QUERY_REIVINDICAR_COBRANCAS, lote, 300, 3, janela, 4, cursor)
+        return {row["id"] for row in rows}
+
+    @pytest.mark.asyncio
+    async def test_intercala_ciclistas_e_adianta_prioritarias(self, connection):
+        """Testa que o ciclista com mais cobranças não ocupa o lote e a prioritária entra primeiro."""
+        ciclista_1 = [await self.enfileirar(connection, 1, 60 - n) for n in range(6)]
+        ciclista_2 = [await self.enfileirar(connection, 2, 30 - n) for n in range(2)]
+        prioritaria = await self.enfileirar(connection, 3, 1, PRIORIDADE_ALTA)
+
+        primeiro = await self.reivindicar(connection, 4)
+        segundo = await self.reivindicar(connection, 4)
+
+        assert primeiro == {prioritaria, ciclista_1[0], ciclista_2[0], ciclista_1[1]}
+        assert segundo == {ciclista_2[1], ciclista_1[2], ciclista_1[3], ciclista_1[4]}
+
+    @pytest.mark.asyncio
+    async def test_backlog_de_um_ciclista_nao_atrasa_os_outros(self, connection):
+        """Testa que a cobrança mais nova de outro ciclista entra no lote mesmo atrás de um backlog maior que a janela."""
+        backlog = [await self.enfileirar(connection, 1, 60 - n) for n in range(5)]
+        outro = await self.enfileirar(connection, 2, 1)
+
+        assert await self.reivindicar(connection, 2, janela=1) == {backlog[0], outro}
+
+    @pytest.mark.asyncio
+    async def test_limita_cobrancas_lidas_por_ciclista(self, connection):
+        """Testa que cada reivindicação lê no máximo a janela de cobranças de um mesmo ciclista."""
+        ids = [await self.enfileirar(connection, 1, 60 - n) for n in range(6)]
+
+        assert await self.reivindicar(connection, 10, janela=2) == set(ids[:2])
+
+    @pytest.mark.asyncio
+    async def test_ignora_cobrancas_com_lease_vigente(self, connection):
+        """Testa que cobranças com outro worker não são reivindicadas nem tiram a vez das demais."""
+        com_lease = await self.enfileirar(connection, 1, 60, lease_minutos=5)
+        livre = await self.enfileirar(connection, 1, 50)
+        outro = await self.enfileirar(connection, 2, 40)
+
+        assert await self.reivindicar(connection, 2) == {livre, outro}
+        assert com_lease not in await self.reivindicar(connection, 2)
+
+    @pytest.mark.asyncio
+    async def test_rodizio_a_partir_do_cursor(self, connection):
+        """Testa que a reivindicação começa depois do último ciclista atendido e volta ao início."""
+        ids = {ciclista: await self.enfileirar(connection, ciclista, 60) for ciclista in (1, 2, 3, 4)}
+
+        assert await self.reivindicar(connection, 2, cursor=3) == {ids[4], ids[1]}
+        assert await self.reivindicar(connection, 2, cursor=1) == {ids[2], ids[3]}
+
+    @pytest.mark.asyncio
+    async def test_backlog_grande_le_so_o_lote_pelo_indice(self, connection):
+        """Testa que, com milhares de cobranças vencidas, a reivindicação não percorre a fila inteira."""
+        await connection.execute(
+            """
+            INSERT INTO fila_cobrancas(ciclista, valor, enfileirada_em, proxima_tentativa, prioridade)
+                SELECT n % 500, 10, NOW(), NOW() - make_interval(secs => n), CASE WHEN n % 50 = 0 THEN 1 ELSE 0 END
+                FROM generate_series(1, 20000) AS n;
+            ANALYZE fila_cobrancas;
+            """)
+
+        plano = json.loads(await connection.fetchval("EXPLAIN (ANALYZE, FORMAT JSON) " + QUERY_REIVINDICAR_COBRANCAS,
+                                                      10, 300, 3, 10, 4, None))[0]["Plan"]
+
+        def nos(no):
+            yield no
+            for filho in no.get("Plans", []):
+                yield from nos(filho)
+
+        na_fila = [no for no in nos(plano) if no.get("Relation Name") == "fila_cobrancas"]
+        lidas = sum((no["Actual Rows"] + no.get("Rows Removed by Filter", 0)) * no["Actual Loops"] for no in na_fila)
+
+        assert plano["Actual Rows"] == 10
+        assert all(no["Node Type"] != "Seq Scan" for no in na_fila)
+        assert lidas < 1000
+
+    @pytest.mark.asyncio
+    async def test_so_recusas_esgotam_a_cobranca(self, connection):
+        """Testa que tentativas sem resposta não tiram a cobrança da fila; recusas no limite sim."""
+        sem_resposta = await self.enfileirar(connection, 1, 60)
+        recusada = await self.enfileirar(connection, 2, 50)
+        await connection.execute("UPDATE fila_cobrancas SET tentativas = 10 WHERE id = $1", sem_resposta)
+        await connection.execute("UPDATE fila_cobrancas SET recusas = 3 WHERE id = $1", recusada)
+
+        assert await self.reivindicar(connection, 10) == {sem_resposta}
+
+    @pytest.mark.asyncio
+    async def test_reagendar_conta_so_recusas(self, connection):
+        """Testa que o reagendamento só devolve nada quando uma recusa esgota o limite."""
+        cobranca = await self.enfileirar(connection, 1, 60)
+        await connection.execute("UPDATE fila_cobrancas SET tentativas = 40, recusas = 2 WHERE id = $1", cobranca)
+
+        assert await connection.fetchval(QUERY_REAGENDAR_COBRANCA, cobranca, 60, 3600, 3, 0) == cobranca
+        assert await connection.fetchval(QUERY_REAGENDAR_COBRANCA, cobranca, 60, 3600, 3, 1) is None
+        assert await connection.fetchval("SELECT recusas FROM fila_cobrancas WHERE id = $1", cobranca) == 2
@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock
+
+from functions.cache.cache_manager import CacheManager
+
+
+class TestCacheManager:
+    """Testes para o CacheManager."""
+
+    @pytest.fixture
+    def cache(self):
+        """Cache pequeno para testes."""
+        return CacheManager(max_itens=2)
+
+    def test_set_sem_ttl_nao_expira(self, cache):
+        """Testa que itens sem TTL permanecem em cache."""
+        cache.set(1, b"um")
+
+        assert cache.get(1) == b"um"
+
+    def test_ttl_expirado(self, cache):
+        """Testa que itens com TTL vencido não são devolvidos."""
+        cache.set(1, b"um", ttl=-1)
+
+        assert cache.get(1) is None
+
+    def test_ttl_zero_nao_guarda(self, cache):
+        """Testa que TTL zero não guarda o item."""
+        cache.set(1, b"um", ttl=0)
+
+        assert cache.get(1) is None
+
+    def test_remove_menos_usado_ao_encher(self, cache):
+        """Testa o descarte LRU ao atingir o limite de itens."""
+        cache.set(1, b"um")
+        cache.set(2, b"dois")
+        cache.get(1)
+        cache.set(3, b"tres")
+
+        assert cache.get(1) == b"um"
+        assert cache.get(2) is None
+
+    def test_invalidar(self, cache):
+        """Testa a remoção de um item."""
+        cache.set(1, b"um")
+        cache.invalidar(1)
+
+        assert cache.get(1) is None
+
+    @pytest.mark.asyncio
+    async def test_obter_usa_cache_no_hit(self, cache):
+        """Testa que um hit não chama o carregamento."""
+        carregar = AsyncMock(return_value=(b"um", None))
+
+        await cache.obter(1, carregar)
+        valor = await cache.obter(1, carregar)
+
+        assert valor == b"um"
+        carregar.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_obter_coalesce_misses_concorrentes(self, cache):
+        """Testa que misses simultâneos para a mesma chave fazem um único carregamento."""
+        chamadas = 0
+
+        async def carregar():
+            nonlocal chamadas
+            chamadas += 1
+            await asyncio.sleep(0.01)
+            return b"um", 0
+
+        valores = await asyncio.gather(*(cache.obter(1, carregar) for _ in range(10)))
+
+        assert valores == [b"um"] * 10
+        assert chamadas == 1
+
+    @pytest.mark.asyncio
+    async def test_obter_propaga_erro_para_todos(self, cache):
+        """Testa que um erro no carregamento chega a todos que aguardavam e não fica em cache."""
+        async def carregar():
+            await asyncio.sleep(0.01)
+            raise Exception("Database error")
+
+        resultados = await asyncio.gather(*(cache.obter(1, carregar) for _ in range(3)), return_exceptions=True)
+
+        assert all(str(resultado) == "Database error" for resultado in resultados)
+        assert cache._carregando == {}
+
+    @pytest.mark.asyncio
+    async def test_obter_nao_guarda_valor_invalidado_durante_a_carga(self, cache):
+        """Testa que a invalidação no meio de um carregamento impede que o valor antigo fique em cache."""
+        liberar = asyncio.Event()
+        valores = iter([b"antigo", b"novo"])
+
+        async def carregar():
+            valor = next(valores)
+            if valor == b"antigo":
+                await liberar.wait()
+            return valor, None
+
+        primeira = asyncio.create_task(cache.obter(1, carregar))
+        await asyncio.sleep(0)
+        cache.invalidar(1)
+        # Quem chega depois da invalidação não aguarda o carregamento antigo
+        segunda = await cache.obter(1, carregar)
+        liberar.set()
+
+        assert await primeira == b"antigo"
+        assert segunda == b"novo"
+        assert cache.get(1) == b"novo"
+
+    def test_set_com_marca_descarta_leitura_invalidada(self, cache):
+        """Testa que um valor lido antes de invalidar ou limpar o cache não é guardado."""
+        with cache.leitura() as marca:
+            cache.invalidar(1)
+            cache.set(1, b"antigo", marca=marca)
+            cache.set(2, b"dois", marca=marca)
+
+        assert cache.get(1) is None
+        assert cache.get(2) == b"dois"
+
+        with cache.leitura() as marca:
+            cache.limpar()
+            cache.set(2, b"antigo", marca=marca)
+
+        assert cache.get(2) is None
+        assert cache._invalidadas == {}
@@ -84,6 +84,7 @@ class TestCiclistaManager:
             result = await ciclista_manager.obter_cartao(1)
 
             assert result["status"] is False
+            assert result["codigo"] == 502
             assert result["mensagem"] == "Erro ao conectar ao serviço de ciclistas"
 
     @pytest.mark.asyncio
@@ -134,3 +135,87 @@ class TestCiclistaManager:
 
             assert result["status"] is False
 
+    @pytest.mark.asyncio
+    async def test_obter_cartao_usa_cache(self, ciclista_manager):
+        """Testa que, com CARTAO_CACHE_TTL, o cartão obtido é reaproveitado nas chamadas seguintes."""
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {"numero": "4509953566233704"}
+
+        with patch("httpx.AsyncClient") as mock_client, \
+                patch("functions.integration.ciclista_manager.CARTAO_CACHE_TTL", 300):
+            mock_client_instance = AsyncMock()
+            mock_client_instance.get.return_value = mock_response
+            mock_client.return_value.__aenter__.return_value = mock_client_instance
+            mock_client.return_value.__aexit__.return_value = None
+
+            await ciclista_manager.obter_cartao(1)
+            result = await ciclista_manager.obter_cartao(1)
+
+            assert result["status"] is True
+            mock_client_instance.get.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_obter_cartao_sem_cache_por_padrao(self, ciclista_manager):
+        """Testa que, sem CARTAO_CACHE_TTL, cada chamada busca o cartão atual."""
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {"numero": "4509953566233704"}
+
+        with patch("httpx.AsyncClient") as mock_client:
+            mock_client_instance = AsyncMock()
+            mock_client_instance.get.return_value = mock_response
+            mock_client.return_value.__aenter__.return_value = mock_client_instance
+            mock_client.return_value.__aexit__.return_value = None
+
+            await ciclista_manager.obter_cartao(1)
+            await ciclista_manager.obter_cartao(1)
+
+            assert mock_client_instance.get.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_invalidar_cartao_publica_invalidacao(self, ciclista_manager):
+        """Testa que invalidar o cartão publica a chave no canal de invalidação."""
+        with patch("functions.integration.ciclista_manager.invalidacao_instance") as mock_invalidacao:
+            mock_invalidacao.publicar = AsyncMock()
+
+            await ciclista_manager.invalidar_cartao(1)
+
+            mock_invalidacao.publicar.assert_called_once_with("cartao", [1])
+
+    @pytest.mark.asyncio
+    async def test_obter_ciclista_sucesso(self, ciclista_manager):
+        """Testa obtenção dos dados do ciclista com sucesso."""
+        ciclista_data = {"id": 1, "nome": "João Silva", "email": "joao@example.com"}
+
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = ciclista_data
+
+        with patch("httpx.AsyncClient") as mock_client:
+            mock_client_instance = AsyncMock()
+            mock_client_instance.get.return_value = mock_response
+            mock_client.return_value.__aenter__.return_value = mock_client_instance
+            mock_client.return_value.__aexit__.return_value = None
+
+            result = await ciclista_manager.obter_ciclista(1)
+
+            assert result["status"] is True
+            assert result["data"] == ciclista_data
+
+    @pytest.mark.asyncio
+    async def test_obter_ciclista_nao_encontrado(self, ciclista_manager):
+        """Testa quando ciclista não é encontrado."""
+        mock_response = MagicMock()
+        mock_response.status_code = 404
+
+        with patch("httpx.AsyncClient") as mock_client:
+            mock_client_instance = AsyncMock()
+            mock_client_instance.get.return_value = mock_response
+            mock_client.return_value.__aenter__.return_value = mock_client_instance
+            mock_client.return_value.__aexit__.return_value = None
+
+            result = await ciclista_manager.obter_ciclista(999)
+
+            assert result["status"] is False
+            assert result["mensagem"] == "Ciclista não encontrado"
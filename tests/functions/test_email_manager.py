@@ -48,18 +48,17 @@ class TestEmailManager:
             assert "mensagem" in result
 
     @pytest.mark.asyncio
-    async def test_send_email_retorna_id_aleatorio(self, email_data):
-        """Testa que o ID retornado é um número aleatório."""
+    async def test_send_email_retorna_id_da_fila(self, email_data):
+        """Testa que o ID retornado é o do registro na fila de emails."""
         with patch("functions.email.email_manager.FastMail") as mock_fastmail:
             mock_fm_instance = AsyncMock()
             mock_fm_instance.send_message = AsyncMock()
             mock_fastmail.return_value = mock_fm_instance
 
             email_manager = EmailManager()
-            result = await email_manager.send_email(email_data)
+            result = await email_manager.send_email({**email_data, "id": 42})
 
-            assert isinstance(result["data"]["id"], int)
-            assert 1 <= result["data"]["id"] <= 1000
+            assert result["data"]["id"] == 42
 
     @pytest.mark.asyncio
     async def test_send_email_conexao_timeout(self, email_data):
@@ -134,3 +133,241 @@ class TestEmailManager:
             assert result["status"] is True
             assert len(result["data"]["mensagem"]) == 10000
 
+
+    @pytest.mark.asyncio
+    async def test_send_email_usa_pool_quando_conectado(self, email_data):
+        """Testa que o envio usa o pool SMTP após o connect."""
+        with patch("functions.email.email_manager.FastMail") as mock_fastmail:
+            email_manager = EmailManager()
+            await email_manager.connect()
+            email_manager.smtp_pools[0].send_message = AsyncMock()
+
+            result = await email_manager.send_email(email_data)
+
+            assert result["status"] is True
+            email_manager.smtp_pools[0].send_message.assert_called_once()
+            mock_fastmail.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_disconnect_fecha_pool(self):
+        """Testa que o disconnect encerra os pools SMTP."""
+        email_manager = EmailManager()
+        await email_manager.connect()
+        pool = email_manager.smtp_pools[0]
+        pool.close = AsyncMock()
+
+        await email_manager.disconnect()
+
+        pool.close.assert_called_once()
+        assert email_manager.smtp_pools == []
+
+    @pytest.mark.asyncio
+    async def test_disconnect_sem_pool(self):
+        """Testa desconexão quando não há pool."""
+        email_manager = EmailManager()
+
+        await email_manager.disconnect()
+
+        assert email_manager.smtp_pools == []
+
+    def test_carregar_servidores_padrao(self):
+        """Testa que sem MAIL_SERVERS é usado o servidor das variáveis MAIL_*."""
+        email_manager = EmailManager()
+
+        assert len(email_manager.servidores) == 1
+        assert email_manager.servidores[0]["config"].MAIL_SERVER == "smtp.test.com"
+
+    def test_carregar_servidores_de_mail_servers(self):
+        """Testa a leitura de vários servidores com limites próprios."""
+        email_manager = EmailManager()
+
+        servidores = email_manager._carregar_servidores(
+            '[{"servidor": "smtp1.test.com", "limite_por_segundo": 10},'
+            ' {"servidor": "smtp2.test.com", "porta": 2525, "senha": "outra", "limite_por_segundo": 5, "max_conexoes": 2}]'
+        )
+
+        assert [s["config"].MAIL_SERVER for s in servidores] == ["smtp1.test.com", "smtp2.test.com"]
+        assert servidores[1]["config"].MAIL_PORT == 2525
+        assert servidores[1]["config"].MAIL_PASSWORD.get_secret_value() == "outra"
+        assert servidores[0]["config"].MAIL_USERNAME == "test@test.com"
+        assert servidores[1]["limite_por_segundo"] == 5
+        assert servidores[1]["max_conexoes"] == 2
+
+    @pytest.mark.asyncio
+    async def test_send_email_escolhe_servidor_menos_carregado(self, email_data):
+        """Testa que o envio vai para o servidor com menor carga."""
+        email_manager = EmailManager()
+        ocupado, livre = MagicMock(), MagicMock()
+        for pool, carga in ((ocupado, (0.5, 0)), (livre, (0.0, 0))):
+            pool.saudavel = True
+            pool.carga.return_value = carga
+            pool.send_message = AsyncMock()
+        email_manager.smtp_pools = [ocupado, livre]
+
+        await email_manager.send_email(email_data)
+
+        livre.send_message.assert_called_once()
+        ocupado.send_message.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_send_email_failover_para_outro_servidor(self, email_data):
+        """Testa que uma falha de servidor redireciona o envio e marca o servidor."""
+        email_manager = EmailManager()
+        com_falha, reserva = MagicMock(), MagicMock()
+        for pool, carga in ((com_falha, (0.0, 0)), (reserva, (0.1, 0))):
+            pool.saudavel = True
+            pool.carga.return_value = carga
+        com_falha.send_message = AsyncMock(side_effect=ConnectionRefusedError("Connection refused"))
+        reserva.send_message = AsyncMock()
+        email_manager.smtp_pools = [com_falha, reserva]
+
+        result = await email_manager.send_email(email_data)
+
+        assert result["status"] is True
+        com_falha.marcar_falha.assert_called_once()
+        reserva.send_message.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_send_email_destinatario_recusado_nao_faz_failover(self, email_data):
+        """Testa que recusa de destinatário não é tratada como falha de servidor."""
+        import aiosmtplib
+
+        email_manager = EmailManager()
+        primeiro, segundo = MagicMock(), MagicMock()
+        for pool, carga in ((primeiro, (0.0, 0)), (segundo, (0.1, 0))):
+            pool.saudavel = True
+            pool.carga.return_value = carga
+            pool.send_message = AsyncMock()
+        primeiro.send_message.side_effect = aiosmtplib.SMTPRecipientsRefused([])
+        email_manager.smtp_pools = [primeiro, segundo]
+
+        result = await email_manager.send_email(email_data)
+
+        assert result["codigo"] == 404
+        primeiro.marcar_falha.assert_not_called()
+        segundo.send_message.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_send_email_mensagem_recusada_nao_faz_failover(self, email_data):
+        """Testa que a recusa permanente de uma mensagem não coloca o servidor em cooldown."""
+        import aiosmtplib
+
+        email_manager = EmailManager()
+        primeiro, segundo = MagicMock(), MagicMock()
+        for pool, carga in ((primeiro, (0.0, 0)), (segundo, (0.1, 0))):
+            pool.saudavel = True
+            pool.carga.return_value = carga
+            pool.send_message = AsyncMock()
+        primeiro.send_message.side_effect = aiosmtplib.SMTPDataError(554, "Mensagem rejeitada")
+        email_manager.smtp_pools = [primeiro, segundo]
+
+        result = await email_manager.send_email(email_data)
+
+        assert result["codigo"] == 404
+        primeiro.marcar_falha.assert_not_called()
+        segundo.send_message.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_send_email_erro_temporario_faz_failover(self, email_data):
+        """Testa que uma recusa temporária (4xx) do servidor redireciona o envio."""
+        import aiosmtplib
+
+        email_manager = EmailManager()
+        primeiro, segundo = MagicMock(), MagicMock()
+        for pool, carga in ((primeiro, (0.0, 0)), (segundo, (0.1, 0))):
+            pool.saudavel = True
+            pool.carga.return_value = carga
+            pool.send_message = AsyncMock()
+        primeiro.send_message.side_effect = aiosmtplib.SMTPDataError(451, "Tente mais tarde")
+        email_manager.smtp_pools = [primeiro, segundo]
+
+        result = await email_manager.send_email(email_data)
+
+        assert result["status"] is True
+        primeiro.marcar_falha.assert_called_once()
+        segundo.send_message.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_send_email_evita_servidor_em_cooldown(self, email_data):
+        """Testa que servidores marcados como indisponíveis só são usados em último caso."""
+        email_manager = EmailManager()
+        indisponivel, saudavel = MagicMock(), MagicMock()
+        indisponivel.saudavel, saudavel.saudavel = False, True
+        indisponivel.carga.return_value = (0.0, 0)
+        saudavel.carga.return_value = (1.0, 1)
+        indisponivel.send_message = AsyncMock()
+        saudavel.send_message = AsyncMock()
+        email_manager.smtp_pools = [indisponivel, saudavel]
+
+        await email_manager.send_email(email_data)
+
+        saudavel.send_message.assert_called_once()
+        indisponivel.send_message.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_send_emails_retorna_resultado_por_destinatario(self, email_data):
+        """Testa que o envio em lote retorna o resultado de cada destinatário."""
+        import aiosmtplib
+
+        email_manager = EmailManager()
+        await email_manager.connect()
+        pool = email_manager.smtp_pools[0]
+
+        async def consumir_fila(fila, erros):
+            while fila:
+                indice, _ = fila.popleft()
+                if indice == 1:
+                    erros[indice] = aiosmtplib.SMTPRecipientsRefused([])
+            return None
+
+        pool.consumir_fila = consumir_fila
+
+        outro = {**email_data, "email": "outro@example.com"}
+        result = await email_manager.send_emails([email_data, outro])
+
+        assert result["status"] is True
+        assert result["data"]["enviados"] == 1
+        assert result["data"]["falhas"] == 1
+        assert result["data"]["resultados"][0] == {"email": email_data["email"], "status": True}
+        assert result["data"]["resultados"][1]["status"] is False
+
+    @pytest.mark.asyncio
+    async def test_send_emails_redistribui_quando_servidor_cai(self, email_data):
+        """Testa que mensagens não enviadas por um servidor inacessível vão para outro."""
+        email_manager = EmailManager()
+        await email_manager.connect()
+        pool = email_manager.smtp_pools[0]
+        pool.consumir_fila = AsyncMock(return_value=Exception("Connection refused"))
+        pool.send_message = AsyncMock()
+
+        result = await email_manager.send_emails([email_data, email_data])
+
+        assert result["data"]["enviados"] == 2
+        assert pool.send_message.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_send_emails_sem_pool_usa_pool_temporario(self, email_data):
+        """Testa que sem connect o lote abre e fecha pools próprios."""
+        with patch("functions.email.email_manager.SMTPPool") as mock_pool_cls:
+            pool = mock_pool_cls.return_value
+            pool.saudavel = True
+            pool.consumir_fila = AsyncMock(side_effect=lambda fila, erros: fila.clear())
+            pool.close = AsyncMock()
+
+            email_manager = EmailManager()
+            result = await email_manager.send_emails([email_data])
+
+            assert result["data"]["enviados"] == 1
+            pool.close.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_send_emails_erro(self, email_data):
+        """Testa envio em lote com erro inesperado."""
+        email_manager = EmailManager()
+        await email_manager.connect()
+        email_manager._send_messages = AsyncMock(side_effect=Exception("Erro"))
+
+        result = await email_manager.send_emails([email_data])
+
+        assert result["status"] is False
+        assert "Erro ao enviar" in result["mensagem"]
@@ -0,0 +1,209 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch, MagicMock
+from datetime import datetime
+
+from functions.email.fila_email_manager import FilaEmailManager
+
+
+class MockAsyncContextManager:
+    """Helper class para simular async context manager."""
+    def __init__(self, connection):
+        self.connection = connection
+
+    async def __aenter__(self):
+        return self.connection
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        return None
+
+
+class TestFilaEmailManager:
+    """Testes para o FilaEmailManager."""
+
+    @pytest.fixture
+    def fila_email_manager(self):
+        """Instância do FilaEmailManager para testes."""
+        return FilaEmailManager(concorrencia=1)
+
+    @pytest.fixture
+    def mock_pool(self):
+        """Mock do pool do asyncpg_manager."""
+        pool = MagicMock()
+        connection = AsyncMock()
+        pool.acquire.return_value = MockAsyncContextManager(connection)
+
+        with patch("functions.email.fila_email_manager.asyncpg_manager") as mock_manager:
+            mock_manager.pool = pool
+            yield pool, connection
+
+    @pytest.fixture
+    def email_data(self):
+        """Dados de email para teste."""
+        return {
+            "email": "test@example.com",
+            "assunto": "Teste",
+            "mensagem": "Mensagem de teste"
+        }
+
+    @pytest.mark.asyncio
+    async def test_enfileirar_email_sucesso(self, fila_email_manager, mock_pool, email_data):
+        """Testa que o email é gravado na fila e recebe o id real."""
+        _, connection = mock_pool
+        connection.fetchrow.return_value = {**email_data, "id": 7, "status": "PENDENTE"}
+
+        result = await fila_email_manager.enfileirar_email(email_data)
+
+        assert result["status"] is True
+        assert result["data"]["id"] == 7
+        assert result["data"]["status"] == "PENDENTE"
+
+    @pytest.mark.asyncio
+    async def test_enfileirar_email_excecao(self, fila_email_manager, mock_pool, email_data):
+        """Testa enfileiramento com erro no banco."""
+        _, connection = mock_pool
+        connection.fetchrow.side_effect = Exception("Database error")
+
+        result = await fila_email_manager.enfileirar_email(email_data)
+
+        assert result["status"] is False
+        assert "Erro ao enfileirar" in result["mensagem"]
+
+    @pytest.mark.asyncio
+    async def test_get_email_by_id_sucesso(self, fila_email_manager, mock_pool):
+        """Testa consulta do status de entrega."""
+        _, connection = mock_pool
+        connection.fetchrow.return_value = {
+            "id": 1,
+            "email": "test@example.com",
+            "assunto": "Teste",
+            "status": "ENVIADO",
+            "tentativas": 1,
+            "ultimo_erro": None,
+            "hora_solicitacao": datetime.now(),
+            "hora_envio": datetime.now()
+        }
+
+        result = await fila_email_manager.get_email_by_id(1)
+
+        assert result["status"] is True
+        assert result["data"]["status"] == "ENVIADO"
+        # As datas seguem como datetime; a resposta as serializa em ISO 8601
+        assert isinstance(result["data"]["hora_envio"], datetime)
+
+    @pytest.mark.asyncio
+    async def test_get_email_by_id_nao_encontrado(self, fila_email_manager, mock_pool):
+        """Testa consulta de email inexistente."""
+        _, connection = mock_pool
+        connection.fetchrow.return_value = None
+
+        result = await fila_email_manager.get_email_by_id(999)
+
+        assert result["status"] is False
+        assert result["mensagem"] == "Email não encontrado"
+
+    @pytest.mark.asyncio
+    async def test_get_email_by_id_excecao(self, fila_email_manager, mock_pool):
+        """Testa consulta de email com erro no banco."""
+        _, connection = mock_pool
+        connection.fetchrow.side_effect = Exception("Database error")
+
+        result = await fila_email_manager.get_email_by_id(1)
+
+        assert result["status"] is False
+        assert "Erro ao buscar" in result["mensagem"]
+
+    @pytest.mark.asyncio
+    async def test_enviar_lote_marca_enviados(self, fila_email_manager, mock_pool, email_data):
+        """Testa que emails enviados com sucesso são marcados como ENVIADO."""
+        _, connection = mock_pool
+        connection.fetch.return_value = [{**email_data, "id": 1, "tentativas": 1}]
+
+        with patch("functions.email.fila_email_manager.email_instance") as mock_email:
+            mock_email.send_emails = AsyncMock(return_value={"status": True, "data": {
+                "enviados": 1, "falhas": 0, "resultados": [{"email": email_data["email"], "status": True}]}})
+
+            processados = await fila_email_manager.enviar_lote()
+
+            assert processados == 1
+            assert "SKIP LOCKED" in connection.fetch.call_args.args[0]
+            query, email_id = connection.execute.call_args.args
+            assert "'ENVIADO'" in query
+            assert email_id == 1
+
+    @pytest.mark.asyncio
+    async def test_enviar_lote_agenda_retentativa_em_falha(self, fila_email_manager, mock_pool, email_data):
+        """Testa que falhas de envio são devolvidas à fila com o erro registrado."""
+        _, connection = mock_pool
+        connection.fetch.return_value = [{**email_data, "id": 1, "tentativas": 1}]
+
+        with patch("functions.email.fila_email_manager.email_instance") as mock_email:
+            mock_email.send_emails = AsyncMock(return_value={"status": True, "data": {
+                "enviados": 0, "falhas": 1, "resultados": [{"email": email_data["email"], "status": False, "mensagem": "Erro ao enviar o email"}]}})
+
+            await fila_email_manager.enviar_lote()
+
+            args = connection.execute.call_args.args
+            assert "'FALHA'" in args[0]
+            assert args[1] == 1
+            assert args[3] == "Erro ao enviar o email"
+
+    @pytest.mark.asyncio
+    async def test_enviar_lote_marca_resultado_por_email(self, fila_email_manager, mock_pool, email_data):
+        """Testa que o lote é enviado de uma vez e cada email recebe o seu resultado."""
+        _, connection = mock_pool
+        connection.fetch.return_value = [{**email_data, "id": 1, "tentativas": 1}, {**email_data, "id": 2, "tentativas": 1}]
+
+        with patch("functions.email.fila_email_manager.email_instance") as mock_email:
+            mock_email.send_emails = AsyncMock(return_value={"status": True, "data": {"enviados": 1, "falhas": 1, "resultados": [
+                {"email": email_data["email"], "status": True},
+                {"email": email_data["email"], "status": False, "mensagem": "Erro ao enviar o email"},
+            ]}})
+
+            await fila_email_manager.enviar_lote()
+
+            mock_email.send_emails.assert_called_once()
+            primeira, segunda = connection.execute.call_args_list
+            assert "'ENVIADO'" in primeira.args[0] and primeira.args[1] == 1
+            assert "'FALHA'" in segunda.args[0] and segunda.args[1] == 2
+
+    @pytest.mark.asyncio
+    async def test_inserir_emails_usa_unnest(self, fila_email_manager, email_data):
+        """Testa a gravação de vários emails em um único INSERT na conexão recebida."""
+        connection = AsyncMock()
+        connection.fetch.return_value = [{"id": 1}, {"id": 2}]
+
+        ids = await fila_email_manager.inserir_emails(connection, [email_data, email_data])
+
+        assert ids == [1, 2]
+        query, emails, assuntos, mensagens = connection.fetch.call_args.args
+        assert "unnest" in query
+        assert emails == [email_data["email"]] * 2
+
+    @pytest.mark.asyncio
+    async def test_enviar_lote_vazio(self, fila_email_manager, mock_pool):
+        """Testa que um lote vazio não envia nada."""
+        _, connection = mock_pool
+        connection.fetch.return_value = []
+
+        with patch("functions.email.fila_email_manager.email_instance") as mock_email:
+            mock_email.send_emails = AsyncMock()
+
+            processados = await fila_email_manager.enviar_lote()
+
+            assert processados == 0
+            mock_email.send_emails.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_start_e_stop_workers(self, fila_email_manager):
+        """Testa que os workers são criados e cancelados."""
+        fila_email_manager.enviar_lote = AsyncMock(return_value=0)
+
+        await fila_email_manager.start()
+        assert len(fila_email_manager._workers) == 1
+
+        await asyncio.sleep(0)
+        await fila_email_manager.stop()
+
+        assert fila_email_manager._workers == []
+        fila_email_manager.enviar_lote.assert_called()
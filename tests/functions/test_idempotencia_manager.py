@@ -0,0 +1,220 @@
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from starlette.responses import Response
+
+from functions.database.idempotencia_manager import (IdempotenciaManager, QUERY_CONCLUIR_CHAVE, QUERY_LIBERAR_CHAVE,
+                                                       QUERY_RENOVAR_CHAVE)
+
+
+class MockAsyncContextManager:
+    """Helper class para simular async context manager."""
+    def __init__(self, connection):
+        self.connection = connection
+
+    async def __aenter__(self):
+        return self.connection
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        return None
+
+
+def resposta(status_code: int = 200, corpo: bytes = b'{"id":1}') -> Response:
+    return Response(status_code=status_code, content=corpo, media_type="application/json")
+
+
+class TestIdempotenciaManager:
+    """Testes para o IdempotenciaManager."""
+
+    @pytest.fixture
+    def manager(self):
+        return IdempotenciaManager()
+
+    @pytest.fixture
+    def connection(self):
+        connection = AsyncMock()
+        pool = MagicMock()
+        pool.acquire.return_value = MockAsyncContextManager(connection)
+
+        with patch("functions.database.idempotencia_manager.asyncpg_manager") as mock_manager:
+            mock_manager.pool = pool
+            yield connection
+
+    @pytest.mark.asyncio
+    async def test_sem_chave_executa_direto(self, manager, connection):
+        """Testa que requisições sem Idempotency-Key não consultam a tabela."""
+        executar = AsyncMock(return_value=resposta())
+
+        response = await manager.executar("cobranca", None, {"valor": 10}, executar)
+
+        assert response.status_code == 200
+        executar.assert_called_once()
+        connection.fetchval.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_primeira_requisicao_grava_resposta(self, manager, connection):
+        """Testa que a requisição que reserva a chave executa e grava a resposta."""
+        connection.fetchval.return_value = "chave-1"
+        executar = AsyncMock(return_value=resposta())
+
+        response = await manager.executar("cobranca", "chave-1", {"valor": 10}, executar)
+
+        assert response.status_code == 200
+        assert response.body == b'{"id":1}'
+        assert "idempotent-replayed" not in response.headers
+        connection.execute.assert_called_once_with(QUERY_CONCLUIR_CHAVE, "cobranca", "chave-1", 200, b'{"id":1}')
+
+    @pytest.mark.asyncio
+    async def test_repeticao_devolve_resposta_gravada(self, manager, connection):
+        """Testa que uma repetição recebe a resposta gravada sem executar de novo."""
+        connection.fetchval.return_value = None
+        connection.fetchrow.return_value = {"impressao": manager._impressao({"valor": 10}),
+                                            "status_code": 200, "corpo": b'{"id":1}'}
+        executar = AsyncMock()
+
+        response = await manager.executar("cobranca", "chave-1", {"valor": 10}, executar)
+
+        assert response.status_code == 200
+        assert response.body == b'{"id":1}'
+        assert response.headers["idempotent-replayed"] == "true"
+        executar.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_chave_com_outra_requisicao(self, manager, connection):
+        """Testa que reusar a chave com outro corpo devolve 422."""
+        connection.fetchval.return_value = None
+        connection.fetchrow.return_value = {"impressao": manager._impressao({"valor": 10}),
+                                            "status_code": 200, "corpo": b'{"id":1}'}
+        executar = AsyncMock()
+
+        response = await manager.executar("cobranca", "chave-1", {"valor": 20}, executar)
+
+        assert response.status_code == 422
+        executar.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_erro_interno_libera_chave(self, manager, connection):
+        """Testa que respostas 5xx não são gravadas e liberam a chave."""
+        connection.fetchval.return_value = "chave-1"
+        executar = AsyncMock(return_value=resposta(500, b'{"mensagem":"Erro"}'))
+
+        response = await manager.executar("cobranca", "chave-1", {"valor": 10}, executar)
+
+        assert response.status_code == 500
+        connection.execute.assert_called_once_with(QUERY_LIBERAR_CHAVE, "cobranca", "chave-1")
+
+    @pytest.mark.asyncio
+    async def test_excecao_libera_chave(self, manager, connection):
+        """Testa que uma exceção na execução libera a chave e é propagada."""
+        connection.fetchval.return_value = "chave-1"
+        executar = AsyncMock(side_effect=Exception("Erro"))
+
+        with pytest.raises(Exception):
+            await manager.executar("cobranca", "chave-1", {"valor": 10}, executar)
+
+        connection.execute.assert_called_once_with(QUERY_LIBERAR_CHAVE, "cobranca", "chave-1")
+        assert manager._em_andamento == {}
+
+    @pytest.mark.asyncio
+    async def test_reserva_renovada_durante_a_execucao(self, manager, connection):
+        """Testa que uma execução mais longa que o lease renova a reserva em vez de perdê-la."""
+        connection.fetchval.return_value = "chave-1"
+
+        async def executar():
+            await asyncio.sleep(0.05)
+            return resposta()
+
+        with patch("functions.database.idempotencia_manager.IDEMPOTENCIA_LEASE", 0.03):
+            response = await manager.executar("cobranca", "chave-1", {"valor": 10}, executar)
+
+        assert response.status_code == 200
+        chamadas = [chamada.args for chamada in connection.execute.call_args_list]
+        assert (QUERY_RENOVAR_CHAVE, "cobranca", "chave-1") in chamadas
+        assert chamadas[-1] == (QUERY_CONCLUIR_CHAVE, "cobranca", "chave-1", 200, b'{"id":1}')
+
+    @pytest.mark.asyncio
+    async def test_renovacao_para_depois_da_execucao(self, manager, connection):
+        """Testa que a reserva deixa de ser renovada quando a execução termina."""
+        connection.fetchval.return_value = "chave-1"
+
+        with patch("functions.database.idempotencia_manager.IDEMPOTENCIA_LEASE", 0.03):
+            await manager.executar("cobranca", "chave-1", {"valor": 10}, AsyncMock(return_value=resposta()))
+            await asyncio.sleep(0.05)
+
+        connection.execute.assert_called_once_with(QUERY_CONCLUIR_CHAVE, "cobranca", "chave-1", 200, b'{"id":1}')
+
+    @pytest.mark.asyncio
+    async def test_concluir_na_conexao_da_operacao(self, manager):
+        """Testa que a resposta é gravada pela conexão recebida, e nada é gravado sem chave."""
+        connection = AsyncMock()
+
+        await manager.concluir(connection, "filaCobranca", "chave-1", 200, b'{"id":1}')
+        await manager.concluir(connection, "filaCobranca", None, 200, b'{"id":1}')
+
+        connection.execute.assert_called_once_with(QUERY_CONCLUIR_CHAVE, "filaCobranca", "chave-1", 200, b'{"id":1}')
+
+    @pytest.mark.asyncio
+    async def test_duplicada_concorrente_aguarda_resultado(self, manager, connection):
+        """Testa que duplicadas concorrentes na mesma réplica executam uma única vez."""
+        connection.fetchval.return_value = "chave-1"
+        liberar = asyncio.Event()
+
+        async def executar():
+            await liberar.wait()
+            return resposta()
+
+        executar_mock = AsyncMock(side_effect=executar)
+
+        primeira = asyncio.create_task(manager.executar("cobranca", "chave-1", {"valor": 10}, executar_mock))
+        await asyncio.sleep(0)
+        segunda = asyncio.create_task(manager.executar("cobranca", "chave-1", {"valor": 10}, executar_mock))
+        await asyncio.sleep(0)
+        liberar.set()
+
+        respostas = await asyncio.gather(primeira, segunda)
+
+        executar_mock.assert_called_once()
+        assert [response.status_code for response in respostas] == [200, 200]
+        assert respostas[1].headers["idempotent-replayed"] == "true"
+
+    @pytest.mark.asyncio
+    async def test_em_andamento_em_outra_replica(self, manager, connection):
+        """Testa o 409 quando a reserva de outra réplica não termina dentro da espera."""
+        connection.fetchval.return_value = None
+        connection.fetchrow.return_value = {"impressao": manager._impressao({"valor": 10}),
+                                            "status_code": None, "corpo": None}
+        executar = AsyncMock()
+
+        with patch("functions.database.idempotencia_manager.IDEMPOTENCIA_ESPERA", 0):
+            response = await manager.executar("cobranca", "chave-1", {"valor": 10}, executar)
+
+        assert response.status_code == 409
+        executar.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_aguarda_reserva_de_outra_replica(self, manager, connection):
+        """Testa que a requisição consulta a tabela até a outra réplica gravar a resposta."""
+        impressao = manager._impressao({"valor": 10})
+        connection.fetchval.return_value = None
+        connection.fetchrow.side_effect = [
+            {"impressao": impressao, "status_code": None, "corpo": None},
+            {"impressao": impressao, "status_code": 200, "corpo": b'{"id":1}'},
+        ]
+
+        with patch("functions.database.idempotencia_manager.IDEMPOTENCIA_INTERVALO", 0):
+            response = await manager.executar("cobranca", "chave-1", {"valor": 10}, AsyncMock())
+
+        assert response.status_code == 200
+        assert response.headers["idempotent-replayed"] == "true"
+
+    def test_chave_externa(self, manager):
+        """Testa que a chave repassada ao gateway depende da rota, da chave e do corpo."""
+        chave = manager.chave_externa("cobranca", "chave-1", {"valor": 10})
+
+        assert manager.chave_externa("cobranca", None, {"valor": 10}) is None
+        assert chave == manager.chave_externa("cobranca", "chave-1", {"valor": 10})
+        assert chave != manager.chave_externa("cobranca", "chave-1", {"valor": 20})
+        assert chave != manager.chave_externa("filaCobranca", "chave-1", {"valor": 10})
+        assert "chave-1" not in chave
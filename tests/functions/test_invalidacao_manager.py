@@ -0,0 +1,93 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from functions.cache.cache_manager import CacheManager
+from functions.cache.invalidacao_manager import InvalidacaoManager, MAX_CHAVES_POR_NOTIFY
+
+
+class MockAsyncContextManager:
+    def __init__(self, connection):
+        self.connection = connection
+
+    async def __aenter__(self):
+        return self.connection
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        return None
+
+
+class TestInvalidacaoManager:
+    """Testes para o InvalidacaoManager."""
+
+    @pytest.fixture
+    def invalidacao_manager(self):
+        """Instância com caches próprios para os testes."""
+        manager = InvalidacaoManager(dsn="postgresql://test", canal="canal_teste")
+        manager.caches = {"cobranca": CacheManager(), "cartao": CacheManager()}
+        return manager
+
+    @pytest.mark.asyncio
+    async def test_publicar_invalida_local_e_notifica(self, invalidacao_manager):
+        """Testa que publicar remove a chave local e emite o NOTIFY na conexão recebida."""
+        invalidacao_manager.caches["cobranca"].set(1, b"{}")
+        connection = AsyncMock()
+
+        await invalidacao_manager.publicar("cobranca", [1], connection)
+
+        assert invalidacao_manager.caches["cobranca"].get(1) is None
+        connection.fetchval.assert_called_once_with("SELECT pg_notify($1, $2);", "canal_teste", "cobranca:1")
+
+    @pytest.mark.asyncio
+    async def test_publicar_sem_conexao_usa_pool(self, invalidacao_manager):
+        """Testa que, sem conexão, o NOTIFY sai por uma conexão do pool."""
+        connection = AsyncMock()
+        pool = MagicMock()
+        pool.acquire.return_value = MockAsyncContextManager(connection)
+        invalidacao_manager.pool = pool
+
+        await invalidacao_manager.publicar("cartao", [5])
+
+        assert connection.fetchval.call_args.args[2] == "cartao:5"
+
+    @pytest.mark.asyncio
+    async def test_publicar_agrupa_chaves_no_limite_do_payload(self, invalidacao_manager):
+        """Testa que muitas chaves são divididas em vários NOTIFY."""
+        connection = AsyncMock()
+
+        await invalidacao_manager.publicar("cobranca", range(MAX_CHAVES_POR_NOTIFY + 1), connection)
+
+        assert connection.fetchval.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_publicar_sem_chaves_nao_notifica(self, invalidacao_manager):
+        """Testa que uma lista vazia não gera NOTIFY."""
+        connection = AsyncMock()
+
+        await invalidacao_manager.publicar("cobranca", [], connection)
+
+        connection.fetchval.assert_not_called()
+
+    def test_notificacao_remota_invalida_chaves(self, invalidacao_manager):
+        """Testa que um aviso de outra réplica remove as chaves do cache local."""
+        cache = invalidacao_manager.caches["cobranca"]
+        cache.set(1, b"um")
+        cache.set(2, b"dois")
+        cache.set(3, b"tres")
+
+        invalidacao_manager._ao_notificar(None, 123, "canal_teste", "cobranca:1,2")
+
+        assert cache.get(1) is None and cache.get(2) is None
+        assert cache.get(3) == b"tres"
+
+    def test_notificacao_remota_todas_as_chaves(self, invalidacao_manager):
+        """Testa que '*' esvazia o cache."""
+        cache = invalidacao_manager.caches["cobranca"]
+        cache.set(1, b"um")
+
+        invalidacao_manager._ao_notificar(None, 123, "canal_teste", "cobranca:*")
+
+        assert cache.get(1) is None
+
+    def test_notificacao_de_cache_desconhecido_e_ignorada(self, invalidacao_manager):
+        """Testa que avisos de caches não registrados não causam erro."""
+        invalidacao_manager._ao_notificar(None, 123, "canal_teste", "outro:1")
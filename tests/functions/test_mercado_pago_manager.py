@@ -130,6 +130,7 @@ class TestMercadoPagoManager:
 
             assert result["status"] is False
             assert "mensagem" in result
+            assert "pendente" not in result
 
     @pytest.mark.asyncio
     async def test_realiza_pagamento_pendente(self, mercado_pago_manager, cartao_valido):
@@ -146,6 +147,7 @@ class TestMercadoPagoManager:
             result = await mercado_pago_manager.realiza_pagamento(cartao_valido, 100.00)
 
             assert result["status"] is False
+            assert result["pendente"] is True
 
     @pytest.mark.asyncio
     async def test_realiza_pagamento_excecao(self, mercado_pago_manager, cartao_valido):
@@ -156,6 +158,7 @@ class TestMercadoPagoManager:
             result = await mercado_pago_manager.realiza_pagamento(cartao_valido, 100.00)
 
             assert result["status"] is False
+            assert result["codigo"] == 502
             assert result["mensagem"] == "Erro interno"
 
     @pytest.mark.asyncio
@@ -190,3 +193,69 @@ class TestMercadoPagoManager:
 
             assert result["status"] is True
 
+
+    @pytest.mark.asyncio
+    async def test_realiza_pagamento_com_chave_idempotencia(self, mercado_pago_manager, cartao_valido):
+        """Testa que a chave de idempotência vai para o gateway no header x-idempotency-key."""
+        with patch("functions.mercado_pago.mercado_pago_manager.sdk") as mock_sdk:
+            mock_sdk.card_token.return_value.create.return_value = {
+                "status": 201,
+                "response": {"id": "test_token_id"}
+            }
+            mock_sdk.payment.return_value.create.return_value = {
+                "response": {"status": "approved"}
+            }
+
+            result = await mercado_pago_manager.realiza_pagamento(cartao_valido, 100.00, "chave-1")
+
+            assert result["status"] is True
+            request_options = mock_sdk.payment.return_value.create.call_args.args[1]
+            assert request_options.custom_headers == {"x-idempotency-key": "chave-1"}
+
+    @pytest.mark.asyncio
+    async def test_realiza_pagamento_com_referencia(self, mercado_pago_manager, cartao_valido):
+        """Testa que a referência da cobrança vai para o gateway como external_reference."""
+        with patch("functions.mercado_pago.mercado_pago_manager.sdk") as mock_sdk:
+            mock_sdk.card_token.return_value.create.return_value = {
+                "status": 201,
+                "response": {"id": "test_token_id"}
+            }
+            mock_sdk.payment.return_value.create.return_value = {
+                "response": {"status": "approved"}
+            }
+
+            await mercado_pago_manager.realiza_pagamento(cartao_valido, 100.00, "chave-1", "cobranca-7")
+
+            payment_data = mock_sdk.payment.return_value.create.call_args.args[0]
+            assert payment_data["external_reference"] == "cobranca-7"
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("situacoes,esperado", [
+        (["rejected", "approved"], "aprovado"),
+        (["rejected", "in_process"], "pendente"),
+        (["rejected"], "recusado"),
+        ([], "recusado"),
+    ])
+    async def test_consultar_pagamento(self, mercado_pago_manager, situacoes, esperado):
+        """Testa a situação devolvida conforme os pagamentos encontrados pela referência."""
+        with patch("functions.mercado_pago.mercado_pago_manager.sdk") as mock_sdk:
+            mock_sdk.payment.return_value.search.return_value = {
+                "status": 200,
+                "response": {"results": [{"status": situacao} for situacao in situacoes]}
+            }
+
+            result = await mercado_pago_manager.consultar_pagamento("cobranca-7")
+
+            assert result == {"status": True, "data": esperado}
+            mock_sdk.payment.return_value.search.assert_called_once_with({"external_reference": "cobranca-7"})
+
+    @pytest.mark.asyncio
+    async def test_consultar_pagamento_erro(self, mercado_pago_manager):
+        """Testa que uma falha na consulta não é confundida com pagamento recusado."""
+        with patch("functions.mercado_pago.mercado_pago_manager.sdk") as mock_sdk:
+            mock_sdk.payment.return_value.search.side_effect = Exception("Timeout")
+
+            result = await mercado_pago_manager.consultar_pagamento("cobranca-7")
+
+            assert result["status"] is False
+            assert result["codigo"] == 502
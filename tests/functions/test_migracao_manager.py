@@ -0,0 +1,118 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from functions.database.migracao_manager import MigracaoManager, MIGRACAO_LOCK
+
+
+class MockAsyncContextManager:
+    async def __aenter__(self):
+        return None
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        return None
+
+
+class TestMigracaoManager:
+    """Testes para o MigracaoManager."""
+
+    @pytest.fixture
+    def diretorio(self, tmp_path):
+        """Diretório com duas migrações de exemplo."""
+        (tmp_path / "0002_indices.sql").write_text(
+            "-- migracao: sem-transacao\n"
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_a ON t(a);\n"
+            "-- comentário\n"
+            "DROP INDEX CONCURRENTLY IF EXISTS idx_b;\n", encoding="utf-8")
+        (tmp_path / "0001_tabelas.sql").write_text("CREATE TABLE t (a INTEGER);\n", encoding="utf-8")
+        return tmp_path
+
+    @pytest.fixture
+    def connection(self):
+        """Mock de conexão sem migrações aplicadas."""
+        connection = AsyncMock()
+        connection.fetch.return_value = []
+        # Lock obtido na primeira tentativa e nenhum índice inválido
+        connection.fetchval.side_effect = lambda query, *args: True if "pg_try_advisory_lock" in query else None
+        connection.transaction = MagicMock(return_value=MockAsyncContextManager())
+        return connection
+
+    def test_listar_em_ordem_de_versao(self, diretorio):
+        """Testa que as migrações são listadas pela versão do nome do arquivo."""
+        migracoes = MigracaoManager(diretorio).listar()
+
+        assert [(versao, nome) for versao, nome, _ in migracoes] == [(1, "tabelas"), (2, "indices")]
+
+    def test_migracoes_do_projeto(self):
+        """Testa que as migrações do projeto criam os índices da fila e do histórico."""
+        migracoes = MigracaoManager().listar()
+        sql = "\n".join(sql for _, _, sql in migracoes)
+
+        assert [versao for versao, _, _ in migracoes] == sorted({versao for versao, _, _ in migracoes})
+        assert "WHERE status = 'EM_FILA'" in sql
+        assert "DROP INDEX IF EXISTS idx_cobrancas_fila" in sql
+        assert "INCLUDE (id, status, valor, hora_finalizacao)" in sql
+
+    @pytest.mark.asyncio
+    async def test_migrar_aplica_pendentes_com_lock(self, diretorio, connection):
+        """Testa que as migrações pendentes são aplicadas e registradas sob advisory lock."""
+        aplicadas = await MigracaoManager(diretorio).migrar(connection)
+
+        assert aplicadas == [1, 2]
+        comandos = [chamada.args for chamada in connection.execute.call_args_list]
+        assert connection.fetchval.call_args_list[0].args == ("SELECT pg_try_advisory_lock($1);", MIGRACAO_LOCK)
+        assert comandos[-1] == ("SELECT pg_advisory_unlock($1);", MIGRACAO_LOCK)
+        assert ("CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_a ON t(a)",) in comandos
+        assert ("DROP INDEX CONCURRENTLY IF EXISTS idx_b",) in comandos
+        assert sum(1 for comando in comandos if "INSERT INTO schema_migrations" in comando[0]) == 2
+
+    @pytest.mark.asyncio
+    async def test_migrar_aguarda_lock_sem_bloquear(self, diretorio, connection):
+        """Testa que o lock ocupado é tentado de novo após o intervalo, sem pg_advisory_lock."""
+        tentativas = iter([False, False, True])
+        connection.fetchval.side_effect = lambda query, *args: next(tentativas) if "pg_try_advisory_lock" in query else None
+
+        with patch("functions.database.migracao_manager.asyncio.sleep", AsyncMock()) as mock_sleep:
+            aplicadas = await MigracaoManager(diretorio).migrar(connection)
+
+        assert aplicadas == [1, 2]
+        assert mock_sleep.call_count == 2
+        assert not any("pg_advisory_lock(" in chamada.args[0] for chamada in connection.execute.call_args_list)
+
+    @pytest.mark.asyncio
+    async def test_migrar_recria_indice_invalido(self, diretorio, connection):
+        """Testa que um índice deixado INVALID por um CONCURRENTLY interrompido é removido antes de ser criado."""
+        connection.fetchval.side_effect = lambda query, *args: True if "pg_try_advisory_lock" in query or args == ("idx_a",) else None
+
+        await MigracaoManager(diretorio).migrar(connection)
+
+        comandos = [chamada.args for chamada in connection.execute.call_args_list]
+        remocao = comandos.index(("DROP INDEX CONCURRENTLY IF EXISTS idx_a;",))
+        assert comandos[remocao + 1] == ("CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_a ON t(a)",)
+
+    @pytest.mark.asyncio
+    async def test_migrar_ignora_aplicadas(self, diretorio, connection):
+        """Testa que migrações já registradas não são reaplicadas."""
+        connection.fetch.return_value = [{"versao": 1}, {"versao": 2}]
+
+        aplicadas = await MigracaoManager(diretorio).migrar(connection)
+
+        assert aplicadas == []
+        connection.transaction.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_migrar_libera_lock_em_erro(self, diretorio, connection):
+        """Testa que o advisory lock é liberado mesmo se uma migração falhar."""
+        connection.execute.side_effect = [None, Exception("syntax error"), None]
+
+        with pytest.raises(Exception):
+            await MigracaoManager(diretorio).migrar(connection)
+
+        assert connection.execute.call_args.args == ("SELECT pg_advisory_unlock($1);", MIGRACAO_LOCK)
+
+    @pytest.mark.asyncio
+    async def test_migrar_banco_fecha_conexao(self, diretorio, connection):
+        """Testa que a conexão dedicada é fechada ao final."""
+        with patch("functions.database.migracao_manager.asyncpg.connect", AsyncMock(return_value=connection)):
+            await MigracaoManager(diretorio).migrar_banco("postgresql://test")
+
+        connection.close.assert_called_once()
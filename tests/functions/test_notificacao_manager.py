@@ -0,0 +1,113 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from functions.email.notificacao_manager import NotificacaoManager
+
+
+class MockAsyncContextManager:
+    def __init__(self, return_value):
+        self.return_value = return_value
+
+    async def __aenter__(self):
+        return self.return_value
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        return None
+
+
+class TestNotificacaoManager:
+    """Testes para o NotificacaoManager."""
+
+    @pytest.fixture
+    def notificacao_manager(self):
+        """Instância do NotificacaoManager para testes."""
+        return NotificacaoManager()
+
+    @pytest.fixture
+    def mock_pool(self):
+        """Mock do pool de conexões com transação."""
+        connection = AsyncMock()
+        connection.transaction = MagicMock(return_value=MockAsyncContextManager(None))
+        pool = MagicMock()
+        pool.acquire.return_value = MockAsyncContextManager(connection)
+
+        with patch("functions.email.notificacao_manager.asyncpg_manager") as mock_manager:
+            mock_manager.pool = pool
+            yield connection
+
+    @pytest.fixture
+    def mock_fila(self):
+        """Mock da fila de emails."""
+        with patch("functions.email.notificacao_manager.fila_email_instance") as mock_fila:
+            mock_fila.inserir_emails = AsyncMock(return_value=[1])
+            yield mock_fila
+
+    @pytest.mark.asyncio
+    async def test_uma_notificacao_usa_template_da_cobranca(self, notificacao_manager, mock_pool, mock_fila):
+        """Testa que um ciclista com uma única cobrança recebe o email daquela cobrança."""
+        mock_pool.fetch.return_value = [{"id": 10, "ciclista": 1, "cobranca_id": 5, "status": "FINALIZADA", "valor": 15.5}]
+
+        with patch("functions.email.notificacao_manager.ciclista_instance") as mock_ciclista:
+            mock_ciclista.obter_ciclista = AsyncMock(return_value={"status": True, "data": {"nome": "Maria", "email": "maria@example.com"}})
+
+            enviados = await notificacao_manager.enviar_resumos()
+
+            assert enviados == 1
+            connection, emails = mock_fila.inserir_emails.call_args.args
+            assert connection is mock_pool
+            assert emails[0]["email"] == "maria@example.com"
+            assert emails[0]["assunto"] == "Cobrança confirmada"
+            assert mock_pool.execute.call_args.args[1] == [10]
+
+    @pytest.mark.asyncio
+    async def test_varias_notificacoes_viram_um_resumo(self, notificacao_manager, mock_pool, mock_fila):
+        """Testa que várias cobranças do mesmo ciclista geram um único email de resumo."""
+        mock_pool.fetch.return_value = [
+            {"id": 10, "ciclista": 1, "cobranca_id": 5, "status": "FINALIZADA", "valor": 15.5},
+            {"id": 11, "ciclista": 1, "cobranca_id": 6, "status": "FALHA", "valor": 7},
+        ]
+
+        with patch("functions.email.notificacao_manager.ciclista_instance") as mock_ciclista:
+            mock_ciclista.obter_ciclista = AsyncMock(return_value={"status": True, "data": {"nome": "Maria", "email": "maria@example.com"}})
+
+            await notificacao_manager.enviar_resumos()
+
+            mock_ciclista.obter_ciclista.assert_called_once_with(1)
+            _, emails = mock_fila.inserir_emails.call_args.args
+            assert len(emails) == 1
+            assert emails[0]["assunto"] == "Resumo das suas cobranças"
+            assert "#5" in emails[0]["mensagem"] and "#6" in emails[0]["mensagem"]
+            assert mock_pool.execute.call_args.args[1] == [10, 11]
+
+    @pytest.mark.asyncio
+    async def test_ciclista_sem_email_fica_para_proxima_rodada(self, notificacao_manager, mock_pool, mock_fila):
+        """Testa que notificações de ciclistas não resolvidos não são apagadas."""
+        mock_pool.fetch.return_value = [{"id": 10, "ciclista": 1, "cobranca_id": 5, "status": "FALHA", "valor": 15.5}]
+
+        with patch("functions.email.notificacao_manager.ciclista_instance") as mock_ciclista:
+            mock_ciclista.obter_ciclista = AsyncMock(return_value={"status": False, "mensagem": "Ciclista não encontrado"})
+
+            enviados = await notificacao_manager.enviar_resumos()
+
+            assert enviados == 0
+            mock_fila.inserir_emails.assert_not_called()
+            mock_pool.execute.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_sem_notificacoes(self, notificacao_manager, mock_pool, mock_fila):
+        """Testa que nada é feito sem notificações vencidas."""
+        mock_pool.fetch.return_value = []
+
+        assert await notificacao_manager.enviar_resumos() == 0
+        mock_fila.inserir_emails.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_start_e_stop(self, notificacao_manager):
+        """Testa que a tarefa em background é criada e cancelada."""
+        notificacao_manager.enviar_resumos = AsyncMock(return_value=0)
+
+        await notificacao_manager.start()
+        assert notificacao_manager._tarefa is not None
+
+        await notificacao_manager.stop()
+        assert notificacao_manager._tarefa is None
@@ -0,0 +1,35 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from functions.serializacao.serializador import OrjsonResponse, serializar
+
+
+class TestSerializador:
+    """Testes para o serializador JSON compartilhado."""
+
+    def test_serializa_datetime_e_decimal(self):
+        """Testa que datas saem em ISO 8601 e Decimal como número."""
+        cobranca = {"id": 1, "hora_solicitacao": datetime(2024, 1, 1, 10, 0, 0, 123456),
+                    "hora_finalizacao": None, "valor": Decimal("15.50")}
+
+        assert json.loads(serializar(cobranca)) == {"id": 1, "hora_solicitacao": "2024-01-01T10:00:00.123456",
+                                                    "hora_finalizacao": None, "valor": 15.5}
+
+    def test_mantem_utf8(self):
+        """Testa que caracteres não ASCII não são escapados."""
+        assert serializar({"mensagem": "Cobrança não encontrada"}) == '{"mensagem":"Cobrança não encontrada"}'.encode()
+
+    def test_tipo_desconhecido_falha(self):
+        """Testa que tipos sem representação JSON geram erro."""
+        with pytest.raises(TypeError):
+            serializar({"valor": object()})
+
+    def test_resposta_usa_serializador(self):
+        """Testa que a resposta padrão da aplicação serializa com o orjson."""
+        response = OrjsonResponse(status_code=200, content={"valor": Decimal("1.10"), "hora": datetime(2024, 1, 1)})
+
+        assert response.body == b'{"valor":1.1,"hora":"2024-01-01T00:00:00"}'
+        assert response.media_type == "application/json"
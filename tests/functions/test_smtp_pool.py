@@ -0,0 +1,226 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fastapi_mail import MessageSchema, MessageType
+
+from functions.email.email_manager import EmailManager
+from functions.email.smtp_pool import SMTPPool
+
+
+def criar_smtp_mock():
+    """Cria um mock de sessão aiosmtplib já conectada."""
+    smtp = MagicMock()
+    smtp.connect = AsyncMock()
+    smtp.login = AsyncMock()
+    smtp.noop = AsyncMock()
+    smtp.quit = AsyncMock()
+    smtp.send_message = AsyncMock()
+    smtp.is_connected = True
+    return smtp
+
+
+class TestSMTPPool:
+    """Testes para o SMTPPool."""
+
+    @pytest.fixture
+    def config(self):
+        """Configuração SMTP usada pelo EmailManager."""
+        return EmailManager().config
+
+    @pytest.fixture
+    def message(self):
+        """Mensagem de exemplo."""
+        return MessageSchema(
+            subject="Teste",
+            recipients=["test@example.com"],
+            body="<p>Mensagem</p>",
+            subtype=MessageType.html,
+        )
+
+    @pytest.mark.asyncio
+    async def test_reaproveita_sessao_entre_envios(self, config, message):
+        """Testa que dois envios seguidos usam a mesma sessão autenticada."""
+        smtp = criar_smtp_mock()
+
+        with patch("functions.email.smtp_pool.aiosmtplib.SMTP", return_value=smtp) as mock_smtp:
+            pool = SMTPPool(config)
+
+            await pool.send_message(message)
+            await pool.send_message(message)
+
+            mock_smtp.assert_called_once()
+            smtp.connect.assert_called_once()
+            smtp.login.assert_called_once()
+            assert smtp.send_message.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_recicla_sessao_apos_max_mensagens(self, config, message):
+        """Testa que a sessão é encerrada ao atingir o limite de mensagens."""
+        sessoes = [criar_smtp_mock(), criar_smtp_mock()]
+
+        with patch("functions.email.smtp_pool.aiosmtplib.SMTP", side_effect=sessoes):
+            pool = SMTPPool(config, max_mensagens=1)
+
+            await pool.send_message(message)
+            await pool.send_message(message)
+
+            sessoes[0].quit.assert_called_once()
+            sessoes[1].send_message.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_noop_em_sessao_ociosa(self, config, message):
+        """Testa que uma sessão ociosa recebe NOOP antes de ser reutilizada."""
+        smtp = criar_smtp_mock()
+
+        with patch("functions.email.smtp_pool.aiosmtplib.SMTP", return_value=smtp):
+            pool = SMTPPool(config, noop_apos=0)
+
+            await pool.send_message(message)
+            await pool.send_message(message)
+
+            smtp.noop.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_descarta_sessao_que_falha_no_noop(self, config, message):
+        """Testa que uma sessão que não responde ao NOOP é substituída."""
+        sessoes = [criar_smtp_mock(), criar_smtp_mock()]
+        sessoes[0].noop.side_effect = Exception("Conexão perdida")
+
+        with patch("functions.email.smtp_pool.aiosmtplib.SMTP", side_effect=sessoes):
+            pool = SMTPPool(config, noop_apos=0)
+
+            await pool.send_message(message)
+            await pool.send_message(message)
+
+            assert sessoes[0].send_message.call_count == 1
+            assert sessoes[1].send_message.call_count == 1
+
+    @pytest.mark.asyncio
+    async def test_descarta_sessao_ociosa_alem_do_timeout(self, config, message):
+        """Testa que sessões ociosas além do idle timeout não são reutilizadas."""
+        sessoes = [criar_smtp_mock(), criar_smtp_mock()]
+
+        with patch("functions.email.smtp_pool.aiosmtplib.SMTP", side_effect=sessoes):
+            pool = SMTPPool(config, idle_timeout=-1)
+
+            await pool.send_message(message)
+            await pool.send_message(message)
+
+            sessoes[0].quit.assert_called_once()
+            sessoes[0].noop.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_erro_no_envio_descarta_sessao(self, config, message):
+        """Testa que uma sessão com erro de envio não volta para o pool."""
+        smtp = criar_smtp_mock()
+        smtp.send_message.side_effect = Exception("SMTP Error")
+
+        with patch("functions.email.smtp_pool.aiosmtplib.SMTP", return_value=smtp):
+            pool = SMTPPool(config)
+
+            with pytest.raises(Exception):
+                await pool.send_message(message)
+
+            smtp.quit.assert_called_once()
+            assert pool._livres == []
+
+    @pytest.mark.asyncio
+    async def test_close_encerra_sessoes_livres(self, config, message):
+        """Testa que o close encerra as sessões ociosas."""
+        smtp = criar_smtp_mock()
+
+        with patch("functions.email.smtp_pool.aiosmtplib.SMTP", return_value=smtp):
+            pool = SMTPPool(config)
+
+            await pool.send_message(message)
+            await pool.close()
+
+            smtp.quit.assert_called_once()
+            assert pool._livres == []
+
+    @pytest.mark.asyncio
+    async def test_consumir_fila_reutiliza_sessoes(self, config, message):
+        """Testa que o consumo da fila usa poucas sessões para muitas mensagens."""
+        from collections import deque
+
+        sessoes = [criar_smtp_mock(), criar_smtp_mock()]
+
+        with patch("functions.email.smtp_pool.aiosmtplib.SMTP", side_effect=sessoes) as mock_smtp:
+            pool = SMTPPool(config, max_size=2)
+            fila = deque(enumerate([message] * 10))
+            erros = [None] * 10
+
+            erro_conexao = await pool.consumir_fila(fila, erros)
+
+            assert erro_conexao is None
+            assert erros == [None] * 10
+            assert mock_smtp.call_count <= 2
+            assert sum(smtp.send_message.call_count for smtp in sessoes) == 10
+
+    @pytest.mark.asyncio
+    async def test_consumir_fila_registra_erro_por_mensagem(self, config, message):
+        """Testa que uma mensagem recusada não impede o envio das demais."""
+        from collections import deque
+
+        smtp = criar_smtp_mock()
+        smtp.send_message.side_effect = [None, Exception("Destinatário recusado"), None]
+
+        with patch("functions.email.smtp_pool.aiosmtplib.SMTP", return_value=smtp):
+            pool = SMTPPool(config, max_size=1)
+            fila = deque(enumerate([message] * 3))
+            erros = [None] * 3
+
+            await pool.consumir_fila(fila, erros)
+
+            assert erros[0] is None and erros[2] is None
+            assert str(erros[1]) == "Destinatário recusado"
+
+    @pytest.mark.asyncio
+    async def test_consumir_fila_para_quando_servidor_cai(self, config, message):
+        """Testa que um servidor inacessível não consome itens da fila compartilhada."""
+        from collections import deque
+
+        smtp = criar_smtp_mock()
+        smtp.connect.side_effect = Exception("Connection refused")
+
+        with patch("functions.email.smtp_pool.aiosmtplib.SMTP", return_value=smtp):
+            pool = SMTPPool(config, max_size=2)
+            fila = deque(enumerate([message] * 3))
+            erros = [None] * 3
+
+            erro_conexao = await pool.consumir_fila(fila, erros)
+
+            assert str(erro_conexao) == "Connection refused"
+            assert len(fila) == 3
+            assert erros == [None] * 3
+
+    @pytest.mark.asyncio
+    async def test_send_message_respeita_limite_por_segundo(self, config, message):
+        """Testa que o pool com limite aguarda o token bucket antes de enviar."""
+        smtp = criar_smtp_mock()
+
+        with patch("functions.email.smtp_pool.aiosmtplib.SMTP", return_value=smtp):
+            pool = SMTPPool(config, limite_por_segundo=10)
+            pool.bucket.adquirir = AsyncMock()
+
+            await pool.send_message(message)
+
+            pool.bucket.adquirir.assert_called_once()
+            assert pool.pendentes == 0
+
+    def test_marcar_falha_torna_pool_indisponivel(self, config):
+        """Testa o cooldown de um servidor que falhou."""
+        pool = SMTPPool(config)
+        assert pool.saudavel is True
+
+        pool.marcar_falha(cooldown=60)
+
+        assert pool.saudavel is False
+
+    def test_carga_considera_espera_do_bucket(self, config):
+        """Testa que a carga reflete a espera estimada pelo limite de taxa."""
+        sem_limite = SMTPPool(config)
+        com_limite = SMTPPool(config, limite_por_segundo=1, rajada=1)
+        com_limite.bucket.tokens = -2
+
+        assert sem_limite.carga() < com_limite.carga()
@@ -0,0 +1,135 @@
+import pytest
+from unittest.mock import patch
+
+from functions.email.template_manager import TemplateInvalido, TemplateManager, formatar_moeda
+
+
+class TestTemplateManager:
+    """Testes para o TemplateManager."""
+
+    @pytest.fixture
+    def template_manager(self):
+        """Instância do TemplateManager com os templates carregados."""
+        manager = TemplateManager()
+        manager.carregar()
+        return manager
+
+    def test_carregar_compila_todos_os_templates(self, template_manager):
+        """Testa que todos os templates registrados são compilados no carregamento."""
+        assert set(template_manager._templates) == {"cobranca_confirmada", "cobranca_falha", "cartao_validado", "resumo_cobrancas"}
+
+    def test_renderizar_cobranca_confirmada(self, template_manager):
+        """Testa renderização do template de cobrança confirmada."""
+        html = template_manager.renderizar("cobranca_confirmada", {"nome": "Maria", "valor": 15.5, "cobranca_id": 10})
+
+        assert "Maria" in html
+        assert "R$ 15,50" in html
+        assert "#10" in html
+
+    def test_renderizar_resumo_cobrancas(self, template_manager):
+        """Testa renderização do resumo com várias cobranças."""
+        html = template_manager.renderizar("resumo_cobrancas", {"nome": "Maria", "cobrancas": [
+            {"cobranca_id": 1, "valor": 10, "status": "FINALIZADA"},
+            {"cobranca_id": 2, "valor": 5.5, "status": "FALHA"},
+        ]})
+
+        assert "#1" in html and "#2" in html
+        assert "R$ 5,50" in html
+        assert "Verifique os dados do seu cartão" in html
+
+    def test_renderizar_escapa_html_das_variaveis(self, template_manager):
+        """Testa que variáveis são escapadas no HTML."""
+        html = template_manager.renderizar("cartao_validado", {"nome": "<script>"})
+
+        assert "<script>" not in html
+        assert "&lt;script&gt;" in html
+
+    def test_renderizar_carrega_sob_demanda(self):
+        """Testa que renderizar compila os templates se o carregamento não ocorreu."""
+        manager = TemplateManager()
+
+        html = manager.renderizar("cobranca_falha", {"valor": 10, "motivo": "Saldo insuficiente"})
+
+        assert "Saldo insuficiente" in html
+
+    def test_renderizar_nao_recompila(self, template_manager):
+        """Testa que renderizações seguintes usam o template já compilado."""
+        with patch.object(template_manager.env, "get_template") as mock_get_template:
+            template_manager.renderizar("cobranca_confirmada", {"valor": 1})
+
+            mock_get_template.assert_not_called()
+
+    def test_aplicar_sem_template_mantem_email(self, template_manager):
+        """Testa que emails sem template não são alterados."""
+        email = {"email": "a@example.com", "assunto": "Teste", "mensagem": "Msg", "template": None}
+
+        assert template_manager.aplicar(email) == email
+
+    def test_aplicar_preenche_assunto_e_mensagem(self, template_manager):
+        """Testa que o template preenche assunto padrão e corpo."""
+        email = template_manager.aplicar({
+            "email": "a@example.com",
+            "assunto": None,
+            "template": "cobranca_confirmada",
+            "variaveis": {"valor": 20}
+        })
+
+        assert email["assunto"] == "Cobrança confirmada"
+        assert "R$ 20,00" in email["mensagem"]
+
+    def test_aplicar_respeita_assunto_informado(self, template_manager):
+        """Testa que o assunto enviado tem prioridade sobre o padrão do template."""
+        email = template_manager.aplicar({
+            "email": "a@example.com",
+            "assunto": "Seu recibo",
+            "template": "cobranca_confirmada",
+            "variaveis": {"valor": 20}
+        })
+
+        assert email["assunto"] == "Seu recibo"
+
+    def test_aplicar_lote_renderiza_uma_vez_por_variaveis(self, template_manager):
+        """Testa que o lote reaproveita o corpo renderizado entre destinatários."""
+        emails = [
+            {"email": f"c{i}@example.com", "template": "cobranca_falha", "variaveis": {"valor": 5}}
+            for i in range(100)
+        ]
+
+        with patch.object(template_manager, "renderizar", wraps=template_manager.renderizar) as mock_renderizar:
+            resultado, rejeitados = template_manager.aplicar_lote(emails)
+
+            mock_renderizar.assert_called_once()
+            assert rejeitados == []
+            assert len(resultado) == 100
+            assert resultado[99]["email"] == "c99@example.com"
+            assert "R$ 5,00" in resultado[99]["mensagem"]
+
+    def test_renderizar_sem_variavel_obrigatoria(self, template_manager):
+        """Testa que a falta de uma variável obrigatória é rejeitada."""
+        with pytest.raises(TemplateInvalido, match="valor"):
+            template_manager.renderizar("cobranca_falha", {"motivo": "Saldo insuficiente"})
+
+    def test_renderizar_variavel_invalida(self, template_manager):
+        """Testa que uma variável de tipo inválido é rejeitada."""
+        with pytest.raises(TemplateInvalido):
+            template_manager.renderizar("cobranca_confirmada", {"valor": "abc"})
+
+    def test_aplicar_lote_rejeita_apenas_os_invalidos(self, template_manager):
+        """Testa que um item com variáveis inválidas não impede os demais."""
+        emails = [
+            {"email": "a@example.com", "template": "cobranca_falha", "variaveis": {"valor": 5}},
+            {"email": "b@example.com", "template": "cobranca_falha", "variaveis": {"valor": "abc"}},
+            {"email": "c@example.com", "assunto": "Extrato", "mensagem": "Mensagem"},
+        ]
+
+        aplicados, rejeitados = template_manager.aplicar_lote(emails)
+
+        assert [email["email"] for email in aplicados] == ["a@example.com", "c@example.com"]
+        assert len(rejeitados) == 1
+        assert rejeitados[0]["indice"] == 1
+        assert rejeitados[0]["email"] == "b@example.com"
+
+    def test_formatar_moeda(self):
+        """Testa formatação de valores em reais."""
+        assert formatar_moeda(1234.5) == "R$ 1.234,50"
+        assert formatar_moeda(0) == "R$ 0,00"
@@ -0,0 +1,45 @@
+import asyncio
+import time
+
+import pytest
+
+from functions.email.token_bucket import TokenBucket
+
+
+class TestTokenBucket:
+    """Testes para o TokenBucket."""
+
+    @pytest.mark.asyncio
+    async def test_rajada_dentro_da_capacidade_nao_espera(self):
+        """Testa que tokens disponíveis são entregues imediatamente."""
+        bucket = TokenBucket(taxa=10, capacidade=5)
+
+        inicio = time.monotonic()
+        for _ in range(5):
+            await bucket.adquirir()
+
+        assert time.monotonic() - inicio < 0.05
+
+    @pytest.mark.asyncio
+    async def test_excesso_aguarda_na_taxa_configurada(self):
+        """Testa que pedidos acima da capacidade são enfileirados, não recusados."""
+        bucket = TokenBucket(taxa=50, capacidade=1)
+
+        inicio = time.monotonic()
+        await asyncio.gather(*(bucket.adquirir() for _ in range(6)))
+
+        # 1 token imediato + 5 tokens a 50/s
+        assert time.monotonic() - inicio >= 0.09
+
+    def test_espera_estimada(self):
+        """Testa a estimativa de espera usada para escolher o servidor."""
+        bucket = TokenBucket(taxa=10, capacidade=1)
+        assert bucket.espera_estimada() == 0.0
+
+        bucket.tokens = -1
+        assert bucket.espera_estimada() == pytest.approx(0.2, abs=0.01)
+
+    def test_capacidade_padrao(self):
+        """Testa que a capacidade padrão é de um segundo de taxa."""
+        assert TokenBucket(taxa=20).capacidade == 20
+        assert TokenBucket(taxa=0.5).capacidade == 1
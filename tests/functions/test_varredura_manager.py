@@ -0,0 +1,164 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from functions.database.asyncpg_manager import (FILA_COBRANCAS_MAX_TENTATIVAS, NOTIFICAR_COBRANCAS, QUERY_CONCLUIR_COBRANCA,
+                                                 QUERY_DESCARTAR_COBRANCA)
+from functions.database.varredura_manager import (VarreduraManager, COBRANCA_PENDENTE_TIMEOUT, QUERY_COBRANCAS_ESGOTADAS,
+                                                  QUERY_DEVOLVER_LEASES_EXPIRADOS, QUERY_ENCERRAR_PENDENTE,
+                                                  QUERY_PENDENTES_ANTIGAS, QUERY_PROMOVER_ATRASADAS,
+                                                  QUERY_REMOVER_CHAVES_EXPIRADAS, VARREDURA_LOTE_PENDENTES)
+
+
+class MockAsyncContextManager:
+    def __init__(self, return_value):
+        self.return_value = return_value
+
+    async def __aenter__(self):
+        return self.return_value
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        return None
+
+
+class TestVarreduraManager:
+    """Testes para o VarreduraManager."""
+
+    @pytest.fixture
+    def varredura_manager(self):
+        """Instância do VarreduraManager para testes."""
+        return VarreduraManager()
+
+    @pytest.fixture
+    def mock_pool(self):
+        """Mock do pool de conexões."""
+        connection = AsyncMock()
+        pool = MagicMock()
+        pool.acquire.return_value = MockAsyncContextManager(connection)
+
+        with patch("functions.database.varredura_manager.asyncpg_manager") as mock_manager:
+            mock_manager.pool = pool
+            yield connection
+
+    @pytest.fixture
+    def mock_invalidacao(self):
+        """Mock da invalidação de cache entre réplicas."""
+        with patch("functions.database.varredura_manager.invalidacao_instance") as mock_invalidacao:
+            mock_invalidacao.publicar = AsyncMock()
+            yield mock_invalidacao
+
+    @pytest.fixture
+    def mock_mercado_pago(self):
+        """Mock da consulta de pagamentos no gateway."""
+        with patch("functions.database.varredura_manager.mercado_pago_instance") as mock_mp:
+            mock_mp.consultar_pagamento = AsyncMock(return_value={"status": True, "data": "recusado"})
+            yield mock_mp
+
+    @pytest.mark.asyncio
+    async def test_varrer_recupera_cobrancas_interrompidas(self, varredura_manager, mock_pool, mock_invalidacao, mock_mercado_pago):
+        """Testa que a varredura descarta, devolve, encerra pendentes e remove chaves expiradas."""
+        resultados = {
+            QUERY_COBRANCAS_ESGOTADAS: [{"id": 1, "ciclista": 1, "valor": 10}],
+            QUERY_DEVOLVER_LEASES_EXPIRADOS: [{"id": 2}, {"id": 3}],
+            QUERY_PENDENTES_ANTIGAS: [{"id": 4}],
+            QUERY_REMOVER_CHAVES_EXPIRADAS: [],
+        }
+        mock_pool.fetch.side_effect = lambda query, *args: resultados[query]
+        mock_pool.fetchval.side_effect = lambda query, cobranca_id, *args: cobranca_id
+
+        resultado = await varredura_manager.varrer()
+
+        assert resultado == {"devolvidas": 2, "finalizadas": 0, "descartadas": 1, "pendentes_encerradas": 1,
+                             "chaves_removidas": 0, "promovidas": 0}
+        mock_pool.fetch.assert_any_call(QUERY_COBRANCAS_ESGOTADAS, FILA_COBRANCAS_MAX_TENTATIVAS, VARREDURA_LOTE_PENDENTES)
+        mock_pool.fetch.assert_any_call(QUERY_PENDENTES_ANTIGAS, COBRANCA_PENDENTE_TIMEOUT, VARREDURA_LOTE_PENDENTES)
+        mock_mercado_pago.consultar_pagamento.assert_any_call("cobranca-1")
+        mock_mercado_pago.consultar_pagamento.assert_any_call("cobranca-4")
+        mock_pool.fetchval.assert_any_call(QUERY_ENCERRAR_PENDENTE, 4, "FALHA")
+        mock_pool.fetchval.assert_any_call(QUERY_DESCARTAR_COBRANCA, 1, NOTIFICAR_COBRANCAS)
+        mock_invalidacao.publicar.assert_called_once_with("cobranca", [4, 1], mock_pool)
+
+    @pytest.mark.asyncio
+    async def test_varrer_confere_esgotadas_no_gateway(self, varredura_manager, mock_pool, mock_invalidacao, mock_mercado_pago):
+        """Testa que a cobrança esgotada aprovada no gateway é finalizada e a sem resposta definitiva fica na fila."""
+        esgotadas = [{"id": 1, "ciclista": 1, "valor": 10}, {"id": 2, "ciclista": 2, "valor": 20},
+                     {"id": 3, "ciclista": 3, "valor": 30}]
+        mock_pool.fetch.side_effect = lambda query, *args: esgotadas if query == QUERY_COBRANCAS_ESGOTADAS else []
+        mock_pool.fetchrow.return_value = {"id": 1}
+        mock_mercado_pago.consultar_pagamento.side_effect = [
+            {"status": True, "data": "aprovado"},
+            {"status": True, "data": "pendente"},
+            {"status": False, "codigo": 502, "mensagem": "Erro ao consultar o pagamento"},
+        ]
+
+        with patch("functions.database.varredura_manager.NOTIFICAR_COBRANCAS", True):
+            resultado = await varredura_manager.varrer()
+
+        assert resultado["finalizadas"] == 1 and resultado["descartadas"] == 0
+        # A notificação sai no mesmo comando que move a cobrança
+        mock_pool.fetchrow.assert_called_once_with(QUERY_CONCLUIR_COBRANCA, 1, True)
+        mock_pool.fetchval.assert_not_called()
+        mock_invalidacao.publicar.assert_called_once_with("cobranca", [1], mock_pool)
+
+    @pytest.mark.asyncio
+    async def test_varrer_confere_pendentes_no_gateway(self, varredura_manager, mock_pool, mock_invalidacao, mock_mercado_pago):
+        """Testa que a pendente aprovada no gateway é finalizada e a que não pôde ser conferida fica para depois."""
+        resultados = {QUERY_PENDENTES_ANTIGAS: [{"id": 4}, {"id": 5}, {"id": 6}]}
+        mock_pool.fetch.side_effect = lambda query, *args: resultados.get(query, [])
+        mock_pool.fetchval.side_effect = lambda query, cobranca_id, status: cobranca_id
+        mock_mercado_pago.consultar_pagamento.side_effect = [
+            {"status": True, "data": "aprovado"},
+            {"status": True, "data": "pendente"},
+            {"status": False, "mensagem": "Erro ao consultar o pagamento"},
+        ]
+
+        resultado = await varredura_manager.varrer()
+
+        assert resultado["pendentes_encerradas"] == 1
+        mock_pool.fetchval.assert_called_once_with(QUERY_ENCERRAR_PENDENTE, 4, "FINALIZADA")
+        assert "status = 'PENDENTE'" in QUERY_ENCERRAR_PENDENTE
+
+    @pytest.mark.asyncio
+    async def test_varrer_promove_cobrancas_atrasadas(self, varredura_manager, mock_pool, mock_invalidacao, mock_mercado_pago):
+        """Testa que, configurada, a varredura promove cobranças vencidas há muito tempo."""
+        mock_pool.fetch.return_value = [{"id": 7}]
+
+        with patch("functions.database.varredura_manager.FILA_COBRANCAS_ATRASO_PRIORITARIO", 600):
+            resultado = await varredura_manager.varrer()
+
+        assert resultado["promovidas"] == 1
+        mock_pool.fetch.assert_any_call(QUERY_PROMOVER_ATRASADAS, 600, 0, 1)
+
+    def test_esgotadas_so_sem_worker(self):
+        """Testa que só cobranças que esgotaram as recusas e sem lease vigente são conferidas."""
+        assert "recusas >= $1" in QUERY_COBRANCAS_ESGOTADAS
+        assert "lease_ate IS NULL OR lease_ate < NOW()" in QUERY_COBRANCAS_ESGOTADAS
+        assert "DELETE" not in QUERY_COBRANCAS_ESGOTADAS
+
+    @pytest.mark.asyncio
+    async def test_loop_continua_apos_erro(self, varredura_manager):
+        """Testa que um erro na varredura não encerra o loop."""
+        varredura_manager.varrer = AsyncMock(side_effect=[Exception("Banco indisponível"), {}])
+
+        with patch("functions.database.varredura_manager.asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
+            mock_sleep.side_effect = [None, Exception("fim")]
+
+            with pytest.raises(Exception, match="fim"):
+                await varredura_manager._loop()
+
+        assert varredura_manager.varrer.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_start_e_stop(self, varredura_manager):
+        """Testa que start cria uma única tarefa e stop a encerra."""
+        varredura_manager.varrer = AsyncMock(return_value={})
+
+        await varredura_manager.start()
+        tarefa = varredura_manager._tarefa
+        await varredura_manager.start()
+
+        assert varredura_manager._tarefa is tarefa
+
+        await varredura_manager.stop()
+
+        assert varredura_manager._tarefa is None
+        assert tarefa.cancelled()
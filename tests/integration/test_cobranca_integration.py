@@ -2,15 +2,22 @@
 Testes de integração para a API de cobrança.
 Testa o fluxo completo de cobrança através da API.
 """
+import json
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
 from datetime import datetime
 from fastapi.testclient import TestClient
 from fastapi import FastAPI
 
+from entities.cobranca.cobranca import Cobranca
 from routes.cobranca.router import router
 
 
+def serializada(cobranca: dict) -> Cobranca:
+    """Cobrança no formato devolvido pelo AsyncpgManager, com o JSON já montado pelo banco."""
+    return Cobranca(cobranca["id"], cobranca["status"], json.dumps(cobranca).encode())
+
+
 class MockAsyncContextManager:
     """Helper para simular async context manager."""
     def __init__(self, connection):
@@ -80,14 +87,14 @@ class TestCobrancaIntegration:
         with patch("routes.cobranca.router.asyncpg_manager") as mock_asyncpg:
             mock_asyncpg.realizar_cobranca = AsyncMock(return_value={
                 "status": True,
-                "data": {
+                "data": serializada({
                     "id": 1,
                     "status": "FINALIZADA",
                     "hora_solicitacao": "2024-01-01T10:00:00",
                     "hora_finalizacao": "2024-01-01T10:00:05",
                     "valor": 100.00,
                     "ciclista": 1
-                }
+                })
             })
 
             response = client.post("/cobranca", json=sample_cobranca)
@@ -143,14 +150,14 @@ class TestCobrancaIntegration:
         with patch("routes.cobranca.router.asyncpg_manager") as mock_asyncpg:
             mock_asyncpg.get_cobranca_by_id = AsyncMock(return_value={
                 "status": True,
-                "data": {
+                "data": serializada({
                     "id": 1,
                     "status": "FINALIZADA",
                     "hora_solicitacao": "2024-01-01T10:00:00",
                     "hora_finalizacao": "2024-01-01T10:00:05",
                     "valor": 100.00,
                     "ciclista": 1
-                }
+                })
             })
 
             response = client.get("/cobranca/1")
@@ -183,14 +190,14 @@ class TestCobrancaIntegration:
         with patch("routes.cobranca.router.asyncpg_manager") as mock_asyncpg:
             mock_asyncpg.colocar_cobranca_na_fila = AsyncMock(return_value={
                 "status": True,
-                "data": {
+                "data": serializada({
                     "id": 1,
                     "status": "EM_FILA",
                     "hora_solicitacao": "2024-01-01T10:00:00",
                     "hora_finalizacao": None,
                     "valor": 100.00,
                     "ciclista": 1
-                }
+                })
             })
 
             response = client.post("/filaCobranca", json=sample_cobranca)
@@ -207,7 +214,7 @@ class TestCobrancaIntegration:
         with patch("routes.cobranca.router.asyncpg_manager") as mock_asyncpg:
             mock_asyncpg.processar_fila_cobrancas = AsyncMock(return_value={
                 "status": True,
-                "data": [
+                "data": [serializada(cobranca) for cobranca in [
                     {
                         "id": 1,
                         "status": "FINALIZADA",
@@ -224,7 +231,7 @@ class TestCobrancaIntegration:
                         "valor": 50.00,
                         "ciclista": 2
                     }
-                ]
+                ]]
             })
 
             response = client.post("/processaCobrancasEmFila")
@@ -260,14 +267,14 @@ class TestCobrancaIntegration:
             for valor in valores:
                 mock_asyncpg.realizar_cobranca = AsyncMock(return_value={
                     "status": True,
-                    "data": {
+                    "data": serializada({
                         "id": 1,
                         "status": "FINALIZADA",
                         "hora_solicitacao": "2024-01-01T10:00:00",
                         "hora_finalizacao": "2024-01-01T10:00:05",
                         "valor": valor,
                         "ciclista": 1
-                    }
+                    })
                 })
 
                 response = client.post("/cobranca", json={"valor": valor, "ciclista": 1})
@@ -280,14 +287,14 @@ class TestCobrancaIntegration:
         with patch("routes.cobranca.router.asyncpg_manager") as mock_asyncpg:
             mock_asyncpg.realizar_cobranca = AsyncMock(return_value={
                 "status": True,
-                "data": {
+                "data": serializada({
                     "id": 1,
                     "status": "FINALIZADA",
                     "hora_solicitacao": "2024-01-01T10:00:00",
                     "hora_finalizacao": "2024-01-01T10:00:05",
                     "valor": 100.00,
                     "ciclista": 1
-                }
+                })
             })
 
             resultados = []
@@ -34,8 +34,8 @@ class TestEmailIntegration:
         Cenário: Sistema envia email de notificação ao ciclista
         Resultado esperado: Email enviado e registro criado
         """
-        with patch("routes.email.router.email_instance") as mock_email:
-            mock_email.send_email = AsyncMock(return_value={
+        with patch("routes.email.router.fila_email_instance") as mock_email:
+            mock_email.enfileirar_email = AsyncMock(return_value={
                 "status": True,
                 "data": {
                     "id": 123,
@@ -47,34 +47,34 @@ class TestEmailIntegration:
 
             response = client.post("/enviarEmail", json=sample_email)
 
-            assert response.status_code == 200
+            assert response.status_code == 202
             data = response.json()
             assert data["email"] == sample_email["email"]
             assert data["assunto"] == sample_email["assunto"]
             assert "id" in data
 
-    def test_fluxo_envio_email_falha_smtp(self, client, sample_email):
+    def test_fluxo_envio_email_falha_ao_enfileirar(self, client, sample_email):
         """
-        Testa comportamento quando servidor SMTP está indisponível.
+        Testa comportamento quando o email não pode ser gravado na fila.
         
-        Cenário: Servidor de email não responde
+        Cenário: Banco de dados não responde
         """
-        with patch("routes.email.router.email_instance") as mock_email:
-            mock_email.send_email = AsyncMock(return_value={
+        with patch("routes.email.router.fila_email_instance") as mock_email:
+            mock_email.enfileirar_email = AsyncMock(return_value={
                 "status": False,
-                "message": "SMTP connection failed"
+                "mensagem": "Erro ao enfileirar o email"
             })
 
             response = client.post("/enviarEmail", json=sample_email)
 
-            assert response.status_code == 404
+            assert response.status_code == 500
 
     def test_fluxo_envio_email_erro_interno(self, client, sample_email):
         """
         Testa comportamento quando ocorre erro interno.
         """
-        with patch("routes.email.router.email_instance") as mock_email:
-            mock_email.send_email = AsyncMock(
+        with patch("routes.email.router.fila_email_instance") as mock_email:
+            mock_email.enfileirar_email = AsyncMock(
                 side_effect=Exception("Internal error")
             )
 
@@ -106,8 +106,8 @@ class TestEmailIntegration:
             """
         }
 
-        with patch("routes.email.router.email_instance") as mock_email:
-            mock_email.send_email = AsyncMock(return_value={
+        with patch("routes.email.router.fila_email_instance") as mock_email:
+            mock_email.enfileirar_email = AsyncMock(return_value={
                 "status": True,
                 "data": {
                     "id": 456,
@@ -119,7 +119,7 @@ class TestEmailIntegration:
 
             response = client.post("/enviarEmail", json=email_cobranca)
 
-            assert response.status_code == 200
+            assert response.status_code == 202
             assert "Cobrança" in response.json()["assunto"]
 
     def test_fluxo_envio_email_boas_vindas(self, client):
@@ -136,8 +136,8 @@ class TestEmailIntegration:
             """
         }
 
-        with patch("routes.email.router.email_instance") as mock_email:
-            mock_email.send_email = AsyncMock(return_value={
+        with patch("routes.email.router.fila_email_instance") as mock_email:
+            mock_email.enfileirar_email = AsyncMock(return_value={
                 "status": True,
                 "data": {
                     "id": 789,
@@ -149,7 +149,7 @@ class TestEmailIntegration:
 
             response = client.post("/enviarEmail", json=email_boas_vindas)
 
-            assert response.status_code == 200
+            assert response.status_code == 202
 
     def test_fluxo_envio_emails_diferentes_dominios(self, client):
         """
@@ -165,8 +165,8 @@ class TestEmailIntegration:
             "usuario@universidade.edu.br"
         ]
 
-        with patch("routes.email.router.email_instance") as mock_email:
-            mock_email.send_email = AsyncMock(return_value={
+        with patch("routes.email.router.fila_email_instance") as mock_email:
+            mock_email.enfileirar_email = AsyncMock(return_value={
                 "status": True,
                 "data": {
                     "id": 1,
@@ -182,10 +182,10 @@ class TestEmailIntegration:
                     "assunto": "Teste de Domínio",
                     "mensagem": "Mensagem de teste"
                 }
-                mock_email.send_email.return_value["data"]["email"] = email_addr
+                mock_email.enfileirar_email.return_value["data"]["email"] = email_addr
                 
                 response = client.post("/enviarEmail", json=email_data)
-                assert response.status_code == 200, f"Falhou para: {email_addr}"
+                assert response.status_code == 202, f"Falhou para: {email_addr}"
 
     def test_fluxo_envio_email_com_caracteres_especiais(self, client):
         """
@@ -202,8 +202,8 @@ class TestEmailIntegration:
             """
         }
 
-        with patch("routes.email.router.email_instance") as mock_email:
-            mock_email.send_email = AsyncMock(return_value={
+        with patch("routes.email.router.fila_email_instance") as mock_email:
+            mock_email.enfileirar_email = AsyncMock(return_value={
                 "status": True,
                 "data": {
                     "id": 100,
@@ -215,14 +215,14 @@ class TestEmailIntegration:
 
             response = client.post("/enviarEmail", json=email_especial)
 
-            assert response.status_code == 200
+            assert response.status_code == 202
 
     def test_fluxo_envio_multiplos_emails_sequenciais(self, client, sample_email):
         """
         Testa envio de múltiplos emails em sequência.
         """
-        with patch("routes.email.router.email_instance") as mock_email:
-            mock_email.send_email = AsyncMock(return_value={
+        with patch("routes.email.router.fila_email_instance") as mock_email:
+            mock_email.enfileirar_email = AsyncMock(return_value={
                 "status": True,
                 "data": {
                     "id": 1,
@@ -237,8 +237,8 @@ class TestEmailIntegration:
                 response = client.post("/enviarEmail", json=sample_email)
                 resultados.append(response.status_code)
 
-            assert all(status == 200 for status in resultados)
-            assert mock_email.send_email.call_count == 10
+            assert all(status == 202 for status in resultados)
+            assert mock_email.enfileirar_email.call_count == 10
 
     def test_fluxo_validacao_email_invalido(self, client):
         """
@@ -2,17 +2,24 @@
 Testes de integração de fluxo completo (End-to-End).
 Testa cenários completos que envolvem múltiplos componentes do sistema.
 """
+import json
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
 from datetime import datetime
 from fastapi.testclient import TestClient
 from fastapi import FastAPI
 
+from entities.cobranca.cobranca import Cobranca
 from routes.cartao.router import router as cartao_router
 from routes.cobranca.router import router as cobranca_router
 from routes.email.router import router as email_router
 
 
+def serializada(cobranca: dict) -> Cobranca:
+    """Cobrança no formato devolvido pelo AsyncpgManager, com o JSON já montado pelo banco."""
+    return Cobranca(cobranca["id"], cobranca["status"], json.dumps(cobranca).encode())
+
+
 class MockAsyncContextManager:
     """Helper para simular async context manager."""
     def __init__(self, connection):
@@ -89,14 +96,14 @@ class TestFluxoAluguelBicicleta:
         with patch("routes.cobranca.router.asyncpg_manager") as mock_db:
             mock_db.realizar_cobranca = AsyncMock(return_value={
                 "status": True,
-                "data": {
+                "data": serializada({
                     "id": 1,
                     "status": "FINALIZADA",
                     "hora_solicitacao": "2024-01-01T10:00:00",
                     "hora_finalizacao": "2024-01-01T10:00:05",
                     "valor": 15.00,
                     "ciclista": 1
-                }
+                })
             })
 
             response_cobranca = client.post("/cobranca", json=cobranca)
@@ -104,8 +111,8 @@ class TestFluxoAluguelBicicleta:
             assert response_cobranca.json()["status"] == "FINALIZADA"
 
         # Passo 3: Enviar email de confirmação
-        with patch("routes.email.router.email_instance") as mock_email:
-            mock_email.send_email = AsyncMock(return_value={
+        with patch("routes.email.router.fila_email_instance") as mock_email:
+            mock_email.enfileirar_email = AsyncMock(return_value={
                 "status": True,
                 "data": {
                     "id": 123,
@@ -116,7 +123,7 @@ class TestFluxoAluguelBicicleta:
             })
 
             response_email = client.post("/enviarEmail", json=email)
-            assert response_email.status_code == 200
+            assert response_email.status_code == 202
 
     def test_fluxo_aluguel_cartao_invalido(self, client):
         """
@@ -198,14 +205,14 @@ class TestFluxoFilaCobrancas:
             for i, cobranca in enumerate(cobrancas):
                 mock_db.colocar_cobranca_na_fila = AsyncMock(return_value={
                     "status": True,
-                    "data": {
+                    "data": serializada({
                         "id": i + 1,
                         "status": "EM_FILA",
                         "hora_solicitacao": "2024-01-01T10:00:00",
                         "hora_finalizacao": None,
                         "valor": cobranca["valor"],
                         "ciclista": cobranca["ciclista"]
-                    }
+                    })
                 })
 
                 response = client.post("/filaCobranca", json=cobranca)
@@ -216,7 +223,7 @@ class TestFluxoFilaCobrancas:
         with patch("routes.cobranca.router.asyncpg_manager") as mock_db:
             mock_db.processar_fila_cobrancas = AsyncMock(return_value={
                 "status": True,
-                "data": [
+                "data": [serializada(cobranca) for cobranca in [
                     {
                         "id": i + 1,
                         "status": "FINALIZADA",
@@ -226,7 +233,7 @@ class TestFluxoFilaCobrancas:
                         "ciclista": c["ciclista"]
                     }
                     for i, c in enumerate(cobrancas)
-                ]
+                ]]
             })
 
             response = client.post("/processaCobrancasEmFila")
@@ -248,14 +255,14 @@ class TestFluxoNotificacoes:
         with patch("routes.cobranca.router.asyncpg_manager") as mock_db:
             mock_db.realizar_cobranca = AsyncMock(return_value={
                 "status": True,
-                "data": {
+                "data": serializada({
                     "id": 1,
                     "status": "FINALIZADA",
                     "hora_solicitacao": "2024-01-01T10:00:00",
                     "hora_finalizacao": "2024-01-01T10:00:05",
                     "valor": 25.50,
                     "ciclista": 1
-                }
+                })
             })
 
             response_cobranca = client.post(
@@ -277,8 +284,8 @@ class TestFluxoNotificacoes:
             """
         }
 
-        with patch("routes.email.router.email_instance") as mock_email:
-            mock_email.send_email = AsyncMock(return_value={
+        with patch("routes.email.router.fila_email_instance") as mock_email:
+            mock_email.enfileirar_email = AsyncMock(return_value={
                 "status": True,
                 "data": {
                     "id": 100,
@@ -289,7 +296,7 @@ class TestFluxoNotificacoes:
             })
 
             response_email = client.post("/enviarEmail", json=email_notificacao)
-            assert response_email.status_code == 200
+            assert response_email.status_code == 202
 
 
 class TestFluxoConsultas:
@@ -314,7 +321,7 @@ class TestFluxoConsultas:
         with patch("routes.cobranca.router.asyncpg_manager") as mock_db:
             mock_db.realizar_cobranca = AsyncMock(return_value={
                 "status": True,
-                "data": cobranca_criada
+                "data": serializada(cobranca_criada)
             })
 
             response_criar = client.post(
@@ -328,7 +335,7 @@ class TestFluxoConsultas:
         with patch("routes.cobranca.router.asyncpg_manager") as mock_db:
             mock_db.get_cobranca_by_id = AsyncMock(return_value={
                 "status": True,
-                "data": cobranca_criada
+                "data": serializada(cobranca_criada)
             })
 
             response_consultar = client.get(f"/cobranca/{id_cobranca}")
@@ -373,8 +380,8 @@ class TestFluxoErros:
             assert response.status_code == 500
 
         # Servidor de email indisponível
-        with patch("routes.email.router.email_instance") as mock_email:
-            mock_email.send_email = AsyncMock(
+        with patch("routes.email.router.fila_email_instance") as mock_email:
+            mock_email.enfileirar_email = AsyncMock(
                 side_effect=Exception("SMTP server unavailable")
             )
 
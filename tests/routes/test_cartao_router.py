@@ -143,3 +143,22 @@ class TestCartaoRouter:
 
         assert response.status_code == 422
 
+
+    def test_invalidar_cartao_sucesso(self, client):
+        """Testa a invalidação do cartão em cache."""
+        with patch("routes.cartao.router.ciclista_instance") as mock_ciclista:
+            mock_ciclista.invalidar_cartao = AsyncMock()
+
+            response = client.post("/invalidarCartao/1")
+
+            assert response.status_code == 200
+            mock_ciclista.invalidar_cartao.assert_called_once_with(1)
+
+    def test_invalidar_cartao_erro_interno(self, client):
+        """Testa invalidação com erro ao publicar."""
+        with patch("routes.cartao.router.ciclista_instance") as mock_ciclista:
+            mock_ciclista.invalidar_cartao = AsyncMock(side_effect=Exception("Erro"))
+
+            response = client.post("/invalidarCartao/1")
+
+            assert response.status_code == 500
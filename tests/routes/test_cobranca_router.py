@@ -1,11 +1,20 @@
+import gzip
+import json
+
 import pytest
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from fastapi.testclient import TestClient
 from fastapi import FastAPI
 
+from entities.cobranca.cobranca import Cobranca
 from routes.cobranca.router import router
 
 
+def serializada(cobranca: dict) -> Cobranca:
+    """Cobrança no formato devolvido pelo AsyncpgManager, com o JSON já montado pelo banco."""
+    return Cobranca(cobranca["id"], cobranca["status"], json.dumps(cobranca).encode())
+
+
 @pytest.fixture
 def app():
     """Cria uma aplicação FastAPI para testes."""
@@ -30,14 +39,14 @@ class TestCobrancaRouter:
         with patch("routes.cobranca.router.asyncpg_manager") as mock_manager:
             mock_manager.realizar_cobranca = AsyncMock(return_value={
                 "status": True,
-                "data": {
+                "data": serializada({
                     "id": 1,
                     "status": "FINALIZADA",
                     "hora_solicitacao": "2024-01-01T10:00:00",
                     "hora_finalizacao": "2024-01-01T10:00:01",
                     "valor": 100.00,
                     "ciclista": 1
-                }
+                })
             })
 
             response = client.post("/cobranca", json=cobranca_data)
@@ -70,6 +79,57 @@ class TestCobrancaRouter:
 
             assert response.status_code == 500
 
+    def test_realiza_cobranca_com_idempotency_key(self, client):
+        """Testa que a chave passa pelo IdempotenciaManager e chega ao gateway."""
+        cobranca_data = {"valor": 100.00, "ciclista": 1}
+
+        async def executar(rota, chave, requisicao, executar):
+            assert (rota, chave) == ("cobranca", "chave-1")
+            return await executar()
+
+        with patch("routes.cobranca.router.asyncpg_manager") as mock_manager, \
+                patch("routes.cobranca.router.idempotencia_instance") as mock_idempotencia:
+            mock_manager.realizar_cobranca = AsyncMock(return_value={
+                "status": True,
+                "data": serializada({"id": 1, "status": "FINALIZADA", "valor": 100.00, "ciclista": 1})
+            })
+            mock_idempotencia.executar = AsyncMock(side_effect=executar)
+            mock_idempotencia.chave_externa.return_value = "chave-gateway"
+
+            response = client.post("/cobranca", json=cobranca_data, headers={"Idempotency-Key": "chave-1"})
+
+            assert response.status_code == 200
+            mock_idempotencia.chave_externa.assert_called_once_with("cobranca", "chave-1", cobranca_data)
+            mock_manager.realizar_cobranca.assert_called_once_with(cobranca_data, "chave-gateway")
+
+    def test_realiza_cobranca_erro_transitorio_responde_5xx(self, client):
+        """Testa que um erro interno do manager vira 5xx, que não é gravado na chave de idempotência."""
+        with patch("routes.cobranca.router.asyncpg_manager") as mock_manager:
+            mock_manager.realizar_cobranca = AsyncMock(return_value={
+                "status": False,
+                "codigo": 500,
+                "mensagem": "Erro ao processar a cobrança"
+            })
+
+            response = client.post("/cobranca", json={"valor": 100.00, "ciclista": 1})
+
+            assert response.status_code == 500
+
+    def test_realiza_cobranca_idempotency_key_longa(self, client):
+        """Testa que chaves acima de 255 caracteres são recusadas."""
+        response = client.post("/cobranca", json={"valor": 100.00, "ciclista": 1}, headers={"Idempotency-Key": "x" * 256})
+
+        assert response.status_code == 422
+
+    def test_realiza_cobranca_erro_na_idempotencia(self, client):
+        """Testa erro interno quando a tabela de idempotência está indisponível."""
+        with patch("routes.cobranca.router.idempotencia_instance") as mock_idempotencia:
+            mock_idempotencia.executar = AsyncMock(side_effect=Exception("Banco indisponível"))
+
+            response = client.post("/cobranca", json={"valor": 100.00, "ciclista": 1}, headers={"Idempotency-Key": "chave-1"})
+
+            assert response.status_code == 500
+
     def test_realiza_cobranca_sem_valor(self, client):
         """Testa realização de cobrança sem valor."""
         cobranca_data = {"ciclista": 1}
@@ -91,14 +151,14 @@ class TestCobrancaRouter:
         with patch("routes.cobranca.router.asyncpg_manager") as mock_manager:
             mock_manager.get_cobranca_by_id = AsyncMock(return_value={
                 "status": True,
-                "data": {
+                "data": serializada({
                     "id": 1,
                     "status": "FINALIZADA",
                     "hora_solicitacao": "2024-01-01T10:00:00",
                     "hora_finalizacao": "2024-01-01T10:00:01",
                     "valor": 100.00,
                     "ciclista": 1
-                }
+                })
             })
 
             response = client.get("/cobranca/1")
@@ -106,6 +166,43 @@ class TestCobrancaRouter:
             assert response.status_code == 200
             assert response.json()["id"] == 1
 
+    def test_get_cobranca_finalizada_fica_em_cache(self, client):
+        """Testa que uma cobrança em estado final é servida do cache nas consultas seguintes."""
+        with patch("routes.cobranca.router.asyncpg_manager") as mock_manager:
+            mock_manager.get_cobranca_by_id = AsyncMock(return_value={"status": True, "data": serializada({
+                "id": 1, "status": "FINALIZADA", "hora_solicitacao": "2024-01-01T10:00:00",
+                "hora_finalizacao": "2024-01-01T10:00:05", "valor": 100.00, "ciclista": 1})})
+
+            primeira = client.get("/cobranca/1")
+            segunda = client.get("/cobranca/1")
+
+            assert primeira.content == segunda.content
+            assert segunda.json()["status"] == "FINALIZADA"
+            mock_manager.get_cobranca_by_id.assert_called_once()
+
+    def test_get_cobranca_falha_expira_do_cache(self, client):
+        """Testa que FALHA fica em cache só pelo TTL, já que ainda pode virar FINALIZADA."""
+        with patch("routes.cobranca.router.asyncpg_manager") as mock_manager:
+            mock_manager.get_cobranca_by_id = AsyncMock(return_value={"status": True, "data": serializada({
+                "id": 1, "status": "FALHA", "hora_solicitacao": "2024-01-01T10:00:00",
+                "hora_finalizacao": "2024-01-01T10:00:05", "valor": 100.00, "ciclista": 1})})
+
+            with patch("routes.cobranca.router.COBRANCA_CACHE_TTL", 0):
+                client.get("/cobranca/1")
+                client.get("/cobranca/1")
+
+            assert mock_manager.get_cobranca_by_id.call_count == 2
+
+    def test_get_cobranca_nao_encontrada_nao_fica_em_cache(self, client):
+        """Testa que uma cobrança inexistente é consultada de novo a cada requisição."""
+        with patch("routes.cobranca.router.asyncpg_manager") as mock_manager:
+            mock_manager.get_cobranca_by_id = AsyncMock(return_value={"status": False, "mensagem": "Cobrança não encontrada"})
+
+            client.get("/cobranca/999")
+            client.get("/cobranca/999")
+
+            assert mock_manager.get_cobranca_by_id.call_count == 2
+
     def test_get_cobranca_nao_encontrada(self, client):
         """Testa busca de cobrança não encontrada."""
         with patch("routes.cobranca.router.asyncpg_manager") as mock_manager:
@@ -134,6 +231,141 @@ class TestCobrancaRouter:
 
         assert response.status_code == 422
 
+    def test_consulta_cobrancas_em_lote(self, client):
+        """Testa a consulta em lote separando encontradas e não encontradas."""
+        with patch("routes.cobranca.router.asyncpg_manager") as mock_manager:
+            mock_manager.get_cobrancas_by_ids = AsyncMock(return_value={"status": True, "data": [serializada(cobranca) for cobranca in [
+                {"id": 2, "status": "FINALIZADA", "hora_solicitacao": "2024-01-01T10:00:00",
+                 "hora_finalizacao": "2024-01-01T10:00:05", "valor": 10.0, "ciclista": 1}]]})
+
+            response = client.post("/consultaCobrancasEmLote", json=[2, 3, 2])
+
+            assert response.status_code == 200
+            assert [cobranca["id"] for cobranca in response.json()["encontradas"]] == [2]
+            assert response.json()["nao_encontradas"] == [3]
+            mock_manager.get_cobrancas_by_ids.assert_called_once_with([2, 3])
+
+    def test_consulta_cobrancas_em_lote_usa_cache(self, client):
+        """Testa que cobranças finalizadas em cache não são consultadas de novo."""
+        with patch("routes.cobranca.router.asyncpg_manager") as mock_manager:
+            mock_manager.get_cobrancas_by_ids = AsyncMock(return_value={"status": True, "data": [serializada(cobranca) for cobranca in [
+                {"id": 2, "status": "FALHA", "hora_solicitacao": "2024-01-01T10:00:00",
+                 "hora_finalizacao": "2024-01-01T10:00:05", "valor": 10.0, "ciclista": 1}]]})
+
+            client.post("/consultaCobrancasEmLote", json=[2])
+            response = client.get("/cobranca/2")
+
+            assert response.json()["status"] == "FALHA"
+            mock_manager.get_cobrancas_by_ids.assert_called_once()
+
+    def test_consulta_cobrancas_em_lote_acima_do_limite(self, client):
+        """Testa que lotes acima do máximo são rejeitados."""
+        with patch("routes.cobranca.router.COBRANCA_LOTE_MAX", 2):
+            response = client.post("/consultaCobrancasEmLote", json=[1, 2, 3])
+
+            assert response.status_code == 400
+
+    def test_listar_cobrancas_sucesso(self, client):
+        """Testa a listagem paginada de cobranças."""
+        with patch("routes.cobranca.router.asyncpg_manager") as mock_manager:
+            mock_manager.listar_cobrancas = AsyncMock(return_value={"status": True, "data": {"cobrancas": [b'{"id":5}'], "proximo": 5}})
+
+            response = client.get("/cobrancas?ciclista=1&status=FINALIZADA&after_id=10&limite=1")
+
+            assert response.status_code == 200
+            assert response.json() == {"cobrancas": [{"id": 5}], "proximo": 5}
+            mock_manager.listar_cobrancas.assert_called_once_with(1, "FINALIZADA", None, None, 10, 1)
+
+    def test_listar_cobrancas_parametros_invalidos(self, client):
+        """Testa validação do status e do limite da listagem."""
+        assert client.get("/cobrancas?status=INVALIDO").status_code == 422
+        assert client.get("/cobrancas?limite=1000").status_code == 422
+
+    def test_listar_cobrancas_falha(self, client):
+        """Testa listagem com erro no banco."""
+        with patch("routes.cobranca.router.asyncpg_manager") as mock_manager:
+            mock_manager.listar_cobrancas = AsyncMock(return_value={"status": False, "mensagem": "Erro ao listar as cobranças"})
+
+            response = client.get("/cobrancas")
+
+            assert response.status_code == 500
+
+    def test_exportar_cobrancas_csv(self, client):
+        """Testa a exportação em CSV transmitida em pedaços."""
+        async def pedacos(*args):
+            yield b"id,status\n"
+            yield b"1,FINALIZADA\n"
+
+        with patch("routes.cobranca.router.asyncpg_manager") as mock_manager:
+            mock_manager.exportar_cobrancas = MagicMock(side_effect=pedacos)
+
+            response = client.get("/cobrancas/exportar?status=FINALIZADA&ciclista=1")
+
+            assert response.status_code == 200
+            assert response.headers["content-type"].startswith("text/csv")
+            assert response.content == b"id,status\n1,FINALIZADA\n"
+            mock_manager.exportar_cobrancas.assert_called_once_with("csv", 1, "FINALIZADA", None, None)
+
+    def test_exportar_cobrancas_ndjson_gzip(self, client):
+        """Testa a exportação em NDJSON comprimida com gzip."""
+        async def pedacos(*args):
+            yield b'{"id":1}\n'
+            yield b'{"id":2}\n'
+
+        with patch("routes.cobranca.router.asyncpg_manager") as mock_manager:
+            mock_manager.exportar_cobrancas = MagicMock(side_effect=pedacos)
+
+            response = client.get("/cobrancas/exportar?formato=ndjson&gzip=true")
+
+            assert response.status_code == 200
+            assert response.headers["content-type"] == "application/gzip"
+            assert "cobrancas.ndjson.gz" in response.headers["content-disposition"]
+            assert gzip.decompress(response.content) == b'{"id":1}\n{"id":2}\n'
+
+    @pytest.mark.asyncio
+    async def test_exportar_cobrancas_fecha_exportacao_ao_interromper(self):
+        """Testa que interromper a resposta fecha o gerador da exportação, devolvendo a conexão."""
+        from routes.cobranca.router import exportar_cobrancas
+
+        fechada = False
+
+        async def pedacos(*args):
+            nonlocal fechada
+            try:
+                yield b"id,status\n"
+                yield b"1,FINALIZADA\n"
+                yield b"2,FINALIZADA\n"
+            finally:
+                fechada = True
+
+        with patch("routes.cobranca.router.asyncpg_manager") as mock_manager:
+            mock_manager.exportar_cobrancas = MagicMock(side_effect=pedacos)
+
+            response = await exportar_cobrancas(formato="csv", ciclista=None, status=None, desde=None, ate=None, gzip=True)
+            await anext(response.body_iterator)
+            assert not fechada
+
+            await response.background()
+
+            assert fechada
+
+    def test_exportar_cobrancas_formato_invalido(self, client):
+        """Testa que formatos desconhecidos são rejeitados."""
+        assert client.get("/cobrancas/exportar?formato=xml").status_code == 422
+
+    def test_exportar_cobrancas_falha_antes_do_primeiro_pedaco(self, client):
+        """Testa que uma falha na consulta responde 500 em vez de um arquivo vazio."""
+        async def pedacos(*args):
+            raise Exception("Database error")
+            yield
+
+        with patch("routes.cobranca.router.asyncpg_manager") as mock_manager:
+            mock_manager.exportar_cobrancas = MagicMock(side_effect=pedacos)
+
+            response = client.get("/cobrancas/exportar")
+
+            assert response.status_code == 500
+
     def test_colocar_cobranca_na_fila_sucesso(self, client):
         """Testa colocação de cobrança na fila com sucesso."""
         cobranca_data = {"valor": 100.00, "ciclista": 1}
@@ -141,14 +373,14 @@ class TestCobrancaRouter:
         with patch("routes.cobranca.router.asyncpg_manager") as mock_manager:
             mock_manager.colocar_cobranca_na_fila = AsyncMock(return_value={
                 "status": True,
-                "data": {
+                "data": serializada({
                     "id": 1,
                     "status": "EM_FILA",
                     "hora_solicitacao": "2024-01-01T10:00:00",
                     "hora_finalizacao": None,
                     "valor": 100.00,
                     "ciclista": 1
-                }
+                })
             })
 
             response = client.post("/filaCobranca", json=cobranca_data)
@@ -156,6 +388,30 @@ class TestCobrancaRouter:
             assert response.status_code == 200
             assert response.json()["status"] == "EM_FILA"
 
+    def test_colocar_cobranca_na_fila_conclui_chave_na_transacao(self, client):
+        """Testa que, com Idempotency-Key, a resposta da chave é gravada pelo gancho do INSERT."""
+        cobranca_data = {"valor": 100.00, "ciclista": 1}
+        enfileirada = serializada({"id": 1, "status": "EM_FILA", "valor": 100.00, "ciclista": 1})
+        connection = object()
+
+        async def colocar_cobranca_na_fila(cobranca, ao_enfileirar):
+            await ao_enfileirar(connection, enfileirada)
+            return {"status": True, "data": enfileirada}
+
+        async def executar(rota, chave, requisicao, executar):
+            return await executar()
+
+        with patch("routes.cobranca.router.asyncpg_manager") as mock_manager, \
+                patch("routes.cobranca.router.idempotencia_instance") as mock_idempotencia:
+            mock_manager.colocar_cobranca_na_fila = AsyncMock(side_effect=colocar_cobranca_na_fila)
+            mock_idempotencia.executar = AsyncMock(side_effect=executar)
+            mock_idempotencia.concluir = AsyncMock()
+
+            response = client.post("/filaCobranca", json=cobranca_data, headers={"Idempotency-Key": "chave-1"})
+
+            assert response.status_code == 200
+            mock_idempotencia.concluir.assert_called_once_with(connection, "filaCobranca", "chave-1", 200, enfileirada.json)
+
     def test_colocar_cobranca_na_fila_falha(self, client):
         """Testa colocação de cobrança na fila com falha."""
         cobranca_data = {"valor": 100.00, "ciclista": 1}
@@ -170,6 +426,19 @@ class TestCobrancaRouter:
 
             assert response.status_code == 400
 
+    def test_colocar_cobranca_na_fila_servico_indisponivel(self, client):
+        """Testa que a falha ao consultar o serviço de ciclistas responde com o código do manager."""
+        with patch("routes.cobranca.router.asyncpg_manager") as mock_manager:
+            mock_manager.colocar_cobranca_na_fila = AsyncMock(return_value={
+                "status": False,
+                "codigo": 502,
+                "mensagem": "Erro ao conectar ao serviço de ciclistas"
+            })
+
+            response = client.post("/filaCobranca", json={"valor": 100.00, "ciclista": 1})
+
+            assert response.status_code == 502
+
     def test_colocar_cobranca_na_fila_erro_interno(self, client):
         """Testa colocação de cobrança na fila com erro interno."""
         cobranca_data = {"valor": 100.00, "ciclista": 1}
@@ -181,12 +450,48 @@ class TestCobrancaRouter:
 
             assert response.status_code == 500
 
+    def test_colocar_cobrancas_na_fila_em_lote(self, client):
+        """Testa o enfileiramento em lote."""
+        with patch("routes.cobranca.router.asyncpg_manager") as mock_manager:
+            mock_manager.colocar_cobrancas_na_fila = AsyncMock(return_value={
+                "status": True,
+                "data": {"enfileiradas": [{"id": 1, "status": "EM_FILA"}], "rejeitadas": []}
+            })
+
+            response = client.post("/filaCobrancaEmLote", json=[{"valor": 10.0, "ciclista": 1}])
+
+            assert response.status_code == 200
+            assert response.json()["enfileiradas"][0]["status"] == "EM_FILA"
+            mock_manager.colocar_cobrancas_na_fila.assert_called_once_with([{"valor": 10.0, "ciclista": 1}])
+
+    def test_colocar_cobrancas_na_fila_em_lote_invalido(self, client):
+        """Testa que um item inválido rejeita o lote inteiro."""
+        response = client.post("/filaCobrancaEmLote", json=[{"valor": 10.0, "ciclista": 1}, {"valor": 5.0}])
+
+        assert response.status_code == 422
+
+    def test_colocar_cobrancas_na_fila_em_lote_acima_do_limite(self, client):
+        """Testa que lotes acima do máximo são rejeitados."""
+        with patch("routes.cobranca.router.FILA_COBRANCA_LOTE_MAX", 1):
+            response = client.post("/filaCobrancaEmLote", json=[{"valor": 1.0, "ciclista": 1}] * 2)
+
+            assert response.status_code == 400
+
+    def test_colocar_cobrancas_na_fila_em_lote_falha(self, client):
+        """Testa o enfileiramento em lote com erro no banco."""
+        with patch("routes.cobranca.router.asyncpg_manager") as mock_manager:
+            mock_manager.colocar_cobrancas_na_fila = AsyncMock(return_value={"status": False, "mensagem": "Erro ao colocar as cobranças na fila"})
+
+            response = client.post("/filaCobrancaEmLote", json=[{"valor": 1.0, "ciclista": 1}])
+
+            assert response.status_code == 500
+
     def test_processa_cobrancas_em_fila_sucesso(self, client):
         """Testa processamento de cobranças na fila com sucesso."""
         with patch("routes.cobranca.router.asyncpg_manager") as mock_manager:
             mock_manager.processar_fila_cobrancas = AsyncMock(return_value={
                 "status": True,
-                "data": [
+                "data": [serializada(cobranca) for cobranca in [
                     {
                         "id": 1,
                         "status": "FINALIZADA",
@@ -195,7 +500,7 @@ class TestCobrancaRouter:
                         "valor": 100.00,
                         "ciclista": 1
                     }
-                ]
+                ]]
             })
 
             response = client.post("/processaCobrancasEmFila")
@@ -203,6 +508,16 @@ class TestCobrancaRouter:
             assert response.status_code == 200
             assert len(response.json()) == 1
 
+    def test_processa_cobrancas_em_fila_com_notificacao(self, client):
+        """Testa que o parâmetro notificar é repassado ao processamento."""
+        with patch("routes.cobranca.router.asyncpg_manager") as mock_manager:
+            mock_manager.processar_fila_cobrancas = AsyncMock(return_value={"status": True, "data": []})
+
+            response = client.post("/processaCobrancasEmFila?notificar=true")
+
+            assert response.status_code == 200
+            mock_manager.processar_fila_cobrancas.assert_called_once_with(True)
+
     def test_processa_cobrancas_em_fila_vazia(self, client):
         """Testa processamento de fila vazia."""
         with patch("routes.cobranca.router.asyncpg_manager") as mock_manager:
@@ -31,8 +31,8 @@ class TestEmailRouter:
             "mensagem": "Mensagem de teste"
         }
 
-        with patch("routes.email.router.email_instance") as mock_email:
-            mock_email.send_email = AsyncMock(return_value={
+        with patch("routes.email.router.fila_email_instance") as mock_email:
+            mock_email.enfileirar_email = AsyncMock(return_value={
                 "status": True,
                 "data": {
                     "id": 123,
@@ -44,26 +44,28 @@ class TestEmailRouter:
 
             response = client.post("/enviarEmail", json=email_data)
 
-            assert response.status_code == 200
+            assert response.status_code == 202
             assert response.json()["email"] == "test@example.com"
+            assert response.json()["id"] == 123
 
     def test_send_email_falha(self, client):
-        """Testa envio de email com falha."""
+        """Testa envio de email quando não é possível enfileirar."""
         email_data = {
             "email": "test@example.com",
             "assunto": "Teste",
             "mensagem": "Mensagem de teste"
         }
 
-        with patch("routes.email.router.email_instance") as mock_email:
-            mock_email.send_email = AsyncMock(return_value={
+        with patch("routes.email.router.fila_email_instance") as mock_email:
+            mock_email.enfileirar_email = AsyncMock(return_value={
                 "status": False,
-                "message": "Email não encontrado"
+                "mensagem": "Erro ao enfileirar o email"
             })
 
             response = client.post("/enviarEmail", json=email_data)
 
-            assert response.status_code == 404
+            assert response.status_code == 500
+            assert response.json()["mensagem"] == "Erro ao enfileirar o email"
 
     def test_send_email_erro_interno(self, client):
         """Testa envio de email com erro interno."""
@@ -73,8 +75,8 @@ class TestEmailRouter:
             "mensagem": "Mensagem de teste"
         }
 
-        with patch("routes.email.router.email_instance") as mock_email:
-            mock_email.send_email = AsyncMock(side_effect=Exception("Erro"))
+        with patch("routes.email.router.fila_email_instance") as mock_email:
+            mock_email.enfileirar_email = AsyncMock(side_effect=Exception("Erro"))
 
             response = client.post("/enviarEmail", json=email_data)
 
@@ -146,8 +148,8 @@ class TestEmailRouter:
             "mensagem": "<h1>Título</h1><p>Parágrafo</p>"
         }
 
-        with patch("routes.email.router.email_instance") as mock_email:
-            mock_email.send_email = AsyncMock(return_value={
+        with patch("routes.email.router.fila_email_instance") as mock_email:
+            mock_email.enfileirar_email = AsyncMock(return_value={
                 "status": True,
                 "data": {
                     "id": 123,
@@ -159,7 +161,7 @@ class TestEmailRouter:
 
             response = client.post("/enviarEmail", json=email_data)
 
-            assert response.status_code == 200
+            assert response.status_code == 202
 
     def test_send_email_assunto_longo(self, client):
         """Testa envio de email com assunto longo."""
@@ -169,8 +171,8 @@ class TestEmailRouter:
             "mensagem": "Mensagem"
         }
 
-        with patch("routes.email.router.email_instance") as mock_email:
-            mock_email.send_email = AsyncMock(return_value={
+        with patch("routes.email.router.fila_email_instance") as mock_email:
+            mock_email.enfileirar_email = AsyncMock(return_value={
                 "status": True,
                 "data": {
                     "id": 123,
@@ -182,5 +184,186 @@ class TestEmailRouter:
 
             response = client.post("/enviarEmail", json=email_data)
 
+            assert response.status_code == 202
+
+    def test_get_email_sucesso(self, client):
+        """Testa consulta do status de entrega de um email."""
+        with patch("routes.email.router.fila_email_instance") as mock_fila:
+            mock_fila.get_email_by_id = AsyncMock(return_value={
+                "status": True,
+                "data": {
+                    "id": 1,
+                    "email": "test@example.com",
+                    "assunto": "Teste",
+                    "status": "ENVIADO",
+                    "tentativas": 1,
+                    "ultimo_erro": None,
+                    "hora_solicitacao": "2024-01-01T10:00:00",
+                    "hora_envio": "2024-01-01T10:00:01"
+                }
+            })
+
+            response = client.get("/email/1")
+
             assert response.status_code == 200
+            assert response.json()["status"] == "ENVIADO"
+
+    def test_get_email_nao_encontrado(self, client):
+        """Testa consulta de email inexistente."""
+        with patch("routes.email.router.fila_email_instance") as mock_fila:
+            mock_fila.get_email_by_id = AsyncMock(return_value={
+                "status": False,
+                "mensagem": "Email não encontrado"
+            })
+
+            response = client.get("/email/999")
+
+            assert response.status_code == 404
+            assert "mensagem" in response.json()
+
+    def test_get_email_erro_interno(self, client):
+        """Testa consulta de email com erro interno."""
+        with patch("routes.email.router.fila_email_instance") as mock_fila:
+            mock_fila.get_email_by_id = AsyncMock(side_effect=Exception("Erro"))
+
+            response = client.get("/email/1")
+
+            assert response.status_code == 500
+
+    def test_get_email_id_invalido(self, client):
+        """Testa consulta de email com ID inválido."""
+        response = client.get("/email/abc")
+
+        assert response.status_code == 422
+
+    def test_send_emails_em_lote_sucesso(self, client):
+        """Testa envio em lote com resultados por destinatário."""
+        emails = [
+            {"email": "a@example.com", "assunto": "Extrato", "mensagem": "Mensagem"},
+            {"email": "b@example.com", "assunto": "Extrato", "mensagem": "Mensagem"}
+        ]
+
+        with patch("routes.email.router.email_instance") as mock_email:
+            mock_email.send_emails = AsyncMock(return_value={
+                "status": True,
+                "data": {
+                    "enviados": 2,
+                    "falhas": 0,
+                    "resultados": [
+                        {"email": "a@example.com", "status": True},
+                        {"email": "b@example.com", "status": True}
+                    ]
+                }
+            })
+
+            response = client.post("/enviarEmailsEmLote", json=emails)
+
+            assert response.status_code == 200
+            assert response.json()["enviados"] == 2
+            assert len(mock_email.send_emails.call_args.args[0]) == 2
+
+    def test_send_emails_em_lote_email_invalido(self, client):
+        """Testa que um email inválido no lote rejeita a requisição inteira."""
+        emails = [
+            {"email": "a@example.com", "assunto": "Extrato", "mensagem": "Mensagem"},
+            {"email": "invalido", "assunto": "Extrato", "mensagem": "Mensagem"}
+        ]
+
+        response = client.post("/enviarEmailsEmLote", json=emails)
 
+        assert response.status_code == 422
+
+    def test_send_emails_em_lote_acima_do_limite(self, client):
+        """Testa rejeição de lotes maiores que o máximo configurado."""
+        emails = [{"email": "a@example.com", "assunto": "Extrato", "mensagem": "Mensagem"}] * 3
+
+        with patch("routes.email.router.EMAIL_LOTE_MAX", 2):
+            response = client.post("/enviarEmailsEmLote", json=emails)
+
+            assert response.status_code == 400
+
+    def test_send_emails_em_lote_falha(self, client):
+        """Testa envio em lote quando o manager falha."""
+        emails = [{"email": "a@example.com", "assunto": "Extrato", "mensagem": "Mensagem"}]
+
+        with patch("routes.email.router.email_instance") as mock_email:
+            mock_email.send_emails = AsyncMock(return_value={
+                "status": False,
+                "mensagem": "Erro ao enviar os emails"
+            })
+
+            response = client.post("/enviarEmailsEmLote", json=emails)
+
+            assert response.status_code == 500
+
+    def test_send_emails_em_lote_erro_interno(self, client):
+        """Testa envio em lote com erro interno."""
+        emails = [{"email": "a@example.com", "assunto": "Extrato", "mensagem": "Mensagem"}]
+
+        with patch("routes.email.router.email_instance") as mock_email:
+            mock_email.send_emails = AsyncMock(side_effect=Exception("Erro"))
+
+            response = client.post("/enviarEmailsEmLote", json=emails)
+
+            assert response.status_code == 500
+
+    def test_send_email_com_template(self, client):
+        """Testa que o corpo do email é renderizado a partir do template."""
+        email_data = {
+            "email": "test@example.com",
+            "template": "cobranca_confirmada",
+            "variaveis": {"valor": 15.5}
+        }
+
+        with patch("routes.email.router.fila_email_instance") as mock_email:
+            mock_email.enfileirar_email = AsyncMock(return_value={
+                "status": True,
+                "data": {"id": 1, "email": "test@example.com", "assunto": "Cobrança confirmada", "mensagem": "", "status": "PENDENTE"}
+            })
+
+            response = client.post("/enviarEmail", json=email_data)
+
+            assert response.status_code == 202
+            enfileirado = mock_email.enfileirar_email.call_args.args[0]
+            assert enfileirado["assunto"] == "Cobrança confirmada"
+            assert "R$ 15,50" in enfileirado["mensagem"]
+
+    def test_send_email_template_inexistente(self, client):
+        """Testa rejeição de template desconhecido."""
+        response = client.post("/enviarEmail", json={"email": "test@example.com", "template": "inexistente"})
+
+        assert response.status_code == 422
+
+    def test_send_email_template_sem_variavel_obrigatoria(self, client):
+        """Testa que variáveis ausentes no template devolvem 422 sem enfileirar."""
+        with patch("routes.email.router.fila_email_instance") as mock_email:
+            mock_email.enfileirar_email = AsyncMock()
+
+            response = client.post("/enviarEmail", json={"email": "test@example.com", "template": "cobranca_falha"})
+
+            assert response.status_code == 422
+            assert "valor" in response.json()["mensagem"]
+            mock_email.enfileirar_email.assert_not_called()
+
+    def test_send_emails_em_lote_template_invalido(self, client):
+        """Testa que um item com variáveis inválidas falha sozinho no lote."""
+        emails = [
+            {"email": "a@example.com", "template": "cobranca_falha", "variaveis": {"valor": "abc"}},
+            {"email": "b@example.com", "assunto": "Extrato", "mensagem": "Mensagem"}
+        ]
+
+        with patch("routes.email.router.email_instance") as mock_email:
+            mock_email.send_emails = AsyncMock(return_value={
+                "status": True,
+                "data": {"enviados": 1, "falhas": 0, "resultados": [{"email": "b@example.com", "status": True}]}
+            })
+
+            response = client.post("/enviarEmailsEmLote", json=emails)
+
+            assert response.status_code == 200
+            data = response.json()
+            assert data["enviados"] == 1
+            assert data["falhas"] == 1
+            assert [resultado["email"] for resultado in data["resultados"]] == ["a@example.com", "b@example.com"]
+            assert data["resultados"][0]["status"] is False
+            assert len(mock_email.send_emails.call_args.args[0]) == 1
@@ -64,15 +64,28 @@ class TestMain:
             assert "/processaCobrancasEmFila" in routes
 
 
+    def test_app_usa_resposta_orjson(self):
+        """Testa que a resposta JSON padrão da aplicação é a serializada com orjson."""
+        from main import app
+        from functions.serializacao.serializador import OrjsonResponse
+
+        assert app.router.default_response_class is OrjsonResponse
+
+
 class TestLifespan:
     """Testes para o ciclo de vida da aplicação."""
 
     @pytest.mark.asyncio
     async def test_lifespan_connect_and_disconnect(self):
         """Testa que o lifespan conecta e desconecta corretamente."""
-        with patch("main.asyncpg_manager") as mock_manager:
+        with patch("main.asyncpg_manager") as mock_manager, patch("main.email_instance", new_callable=AsyncMock), patch("main.fila_email_instance") as mock_fila, \
+                patch("main.notificacao_instance", new_callable=AsyncMock) as mock_notificacao, \
+                patch("main.invalidacao_instance", new_callable=AsyncMock), \
+                patch("main.varredura_instance", new_callable=AsyncMock):
             mock_manager.connect = AsyncMock()
             mock_manager.disconnect = AsyncMock()
+            mock_fila.start = AsyncMock()
+            mock_fila.stop = AsyncMock()
             
             from main import lifespan, app
             
@@ -81,3 +94,113 @@ class TestLifespan:
             
             mock_manager.disconnect.assert_called_once()
 
+    @pytest.mark.asyncio
+    async def test_lifespan_abre_e_fecha_pool_smtp(self):
+        """Testa que o lifespan cria e encerra o pool SMTP."""
+        with patch("main.asyncpg_manager") as mock_manager, patch("main.email_instance") as mock_email, patch("main.fila_email_instance") as mock_fila, \
+                patch("main.notificacao_instance", new_callable=AsyncMock) as mock_notificacao, \
+                patch("main.invalidacao_instance", new_callable=AsyncMock), \
+                patch("main.varredura_instance", new_callable=AsyncMock):
+            mock_manager.connect = AsyncMock()
+            mock_manager.disconnect = AsyncMock()
+            mock_email.connect = AsyncMock()
+            mock_email.disconnect = AsyncMock()
+            mock_fila.start = AsyncMock()
+            mock_fila.stop = AsyncMock()
+
+            from main import lifespan, app
+
+            async with lifespan(app):
+                mock_email.connect.assert_called_once()
+
+            mock_email.disconnect.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_lifespan_inicia_e_para_envio_de_emails(self):
+        """Testa que o lifespan inicia e encerra os workers da fila de emails."""
+        with patch("main.asyncpg_manager") as mock_manager, patch("main.email_instance") as mock_email, patch("main.fila_email_instance") as mock_fila, \
+                patch("main.notificacao_instance", new_callable=AsyncMock) as mock_notificacao, \
+                patch("main.invalidacao_instance", new_callable=AsyncMock), \
+                patch("main.varredura_instance", new_callable=AsyncMock):
+            mock_manager.connect = AsyncMock()
+            mock_manager.disconnect = AsyncMock()
+            mock_email.connect = AsyncMock()
+            mock_email.disconnect = AsyncMock()
+            mock_fila.start = AsyncMock()
+            mock_fila.stop = AsyncMock()
+
+            from main import lifespan, app
+
+            async with lifespan(app):
+                mock_fila.start.assert_called_once()
+
+            mock_fila.stop.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_lifespan_inicia_e_para_notificacoes(self):
+        """Testa que o lifespan inicia e encerra o envio dos resumos de cobrança."""
+        with patch("main.asyncpg_manager") as mock_manager, patch("main.email_instance", new_callable=AsyncMock), \
+                patch("main.fila_email_instance", new_callable=AsyncMock), \
+                patch("main.notificacao_instance", new_callable=AsyncMock) as mock_notificacao, \
+                patch("main.invalidacao_instance", new_callable=AsyncMock), \
+                patch("main.varredura_instance", new_callable=AsyncMock):
+            mock_manager.connect = AsyncMock()
+            mock_manager.disconnect = AsyncMock()
+
+            from main import lifespan, app
+
+            async with lifespan(app):
+                mock_notificacao.start.assert_called_once()
+
+            mock_notificacao.stop.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_lifespan_aplica_migracoes_quando_ativado(self):
+        """Testa que as migrações rodam na inicialização quando configurado."""
+        with patch("main.asyncpg_manager", new_callable=AsyncMock), patch("main.email_instance", new_callable=AsyncMock), \
+                patch("main.fila_email_instance", new_callable=AsyncMock), \
+                patch("main.notificacao_instance", new_callable=AsyncMock), \
+                patch("main.invalidacao_instance", new_callable=AsyncMock), \
+                patch("main.varredura_instance", new_callable=AsyncMock), \
+                patch("main.migracao_instance", new_callable=AsyncMock) as mock_migracao, \
+                patch("main.DB_MIGRAR_NA_INICIALIZACAO", True):
+            from main import lifespan, app
+
+            async with lifespan(app):
+                mock_migracao.migrar_banco.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_lifespan_inicia_e_para_invalidacao_de_cache(self):
+        """Testa que o lifespan inicia a escuta de invalidações com o pool do banco."""
+        with patch("main.asyncpg_manager") as mock_manager, patch("main.email_instance", new_callable=AsyncMock), \
+                patch("main.fila_email_instance", new_callable=AsyncMock), \
+                patch("main.notificacao_instance", new_callable=AsyncMock), \
+                patch("main.invalidacao_instance", new_callable=AsyncMock) as mock_invalidacao, \
+                patch("main.varredura_instance", new_callable=AsyncMock):
+            mock_manager.connect = AsyncMock()
+            mock_manager.disconnect = AsyncMock()
+
+            from main import lifespan, app
+
+            async with lifespan(app):
+                mock_invalidacao.start.assert_called_once_with(mock_manager.pool)
+
+            mock_invalidacao.stop.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_lifespan_inicia_e_para_varredura(self):
+        """Testa que o lifespan inicia e encerra a varredura de cobranças interrompidas."""
+        with patch("main.asyncpg_manager") as mock_manager, patch("main.email_instance", new_callable=AsyncMock), \
+                patch("main.fila_email_instance", new_callable=AsyncMock), \
+                patch("main.notificacao_instance", new_callable=AsyncMock), \
+                patch("main.invalidacao_instance", new_callable=AsyncMock), \
+                patch("main.varredura_instance", new_callable=AsyncMock) as mock_varredura:
+            mock_manager.connect = AsyncMock()
+            mock_manager.disconnect = AsyncMock()
+
+            from main import lifespan, app
+
+            async with lifespan(app):
+                mock_varredura.start.assert_called_once()
+
+            mock_varredura.stop.assert_called_once()